@@ -1,6 +1,9 @@
 from flask import Flask
 from config import Config
-from db import get_conn
+from db import get_conn, init_db
+from cache import init_cache
+from profiler import init_profiler
+from metrics import init_metrics
 from blueprints.home import home
 from blueprints.options import bp_options
 from blueprints.templates import bp_templates
@@ -14,6 +17,11 @@ from blueprints.projects import bp_projects
 from blueprints.cables import bp_cables
 from blueprints.connect import bp_connect
 from blueprints.ports import bp_ports
+from blueprints.topology import bp_topology
+from blueprints.jobs import bp_jobs
+from blueprints.profiles import bp_profiles
+from blueprints.metrics import bp_metrics
+from services.job_service import init_jobs
 
 
 def create_app():
@@ -31,6 +39,15 @@ def create_app():
     app.register_blueprint(bp_projects)
     app.register_blueprint(bp_cables)
     app.register_blueprint(bp_ports)
+    app.register_blueprint(bp_topology)
+    app.register_blueprint(bp_jobs)
+    app.register_blueprint(bp_profiles)
+    app.register_blueprint(bp_metrics)
+    init_db(app)
+    init_cache(app)
+    init_profiler(app)
+    init_metrics(app)
+    init_jobs(app)
     return app
 
 app = create_app()
@@ -1,45 +1,21 @@
 # blueprints/cables.py
-from typing import Any, Dict, List
+from typing import List
 from io import BytesIO
-import csv
 
 from flask import Blueprint, render_template, request, send_file, jsonify, flash, redirect, url_for
 
 from services.project_service import get_project
 from services.link_service import (
     list_cables_paginated,
-    fetch_all_cables,
     fetch_cables_by_ids,
     mark_links_printed,
 )
+from services.export_service import build_cables_file, export_cables_job
+from services.job_service import submit_job
 
 bp_cables = Blueprint("cables_bp", __name__, url_prefix="/projects")
 
 
-def _make_labels(project_name: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """
-    为导出/打印补全标签与组合列。
-    不再依赖端口方向，直接：
-      FROM/TO = A_LABEL / B_LABEL
-      TO/FROM = B_LABEL / A_LABEL
-    其中  A_LABEL = <项目>-<设备A>-<端口A>
-         B_LABEL = <项目>-<设备B>-<端口B>
-    """
-    out: List[Dict[str, Any]] = []
-    for r in rows:
-        a_label = f"{project_name}-{r['a_device_name']}-{r['a_port_name']}"
-        b_label = f"{project_name}-{r['b_device_name']}-{r['b_port_name']}"
-        r2 = dict(r)
-        r2.update({
-            "a_label": a_label,
-            "b_label": b_label,
-            "from_to": f"{a_label} / {b_label}",
-            "to_from": f"{b_label} / {a_label}",
-        })
-        out.append(r2)
-    return out
-
-
 @bp_cables.route("/<int:pid>/cables", methods=["GET"])
 def cables_page(pid: int):
     p = get_project(pid)
@@ -50,32 +26,10 @@ def cables_page(pid: int):
     page = request.args.get("page", type=int, default=1)
     page_size = request.args.get("page_size", type=int, default=50)
     data = list_cables_paginated(pid, page, page_size)
-    items_raw = data["items"]
-
-    items = _make_labels(
-        p["name"],
-        [
-            {
-                "a_device_name": r["a_device_name"],
-                "a_port_name": r["a_port_name"],
-                "a_port_type_name": r["a_port_type_name"],
-                "b_device_name": r["b_device_name"],
-                "b_port_name": r["b_port_name"],
-                "b_port_type_name": r["b_port_type_name"],
-                "a_dir": r["a_dir"],
-                "b_dir": r["b_dir"],
-                "link_id": r["link_id"],
-                "printed": r["printed"],
-                "printed_at": r["printed_at"],
-            }
-            for r in items_raw
-        ],
-    )
-
     return render_template(
         "cables_list.html",
         project=p,
-        items=items,
+        items=data["items"],
         page=data["page"],
         page_size=data["page_size"],
         total=data["total"],
@@ -84,7 +38,10 @@ def cables_page(pid: int):
 
 @bp_cables.route("/<int:pid>/cables/export", methods=["POST", "GET"])
 def cables_export(pid: int):
-    """导出：all=1 导出全部；否则用 ids[]=... 导出选中"""
+    """
+    导出：ids[]=... 导出选中（同步下载）；
+    all=1 或未选 → 全量导出交给后台任务，返回 {"ok": true, "job_id": ...}，完成后经 /jobs/<id>/download 下载
+    """
     p = get_project(pid)
     if not p:
         flash("项目不存在", "err")
@@ -95,112 +52,14 @@ def cables_export(pid: int):
     ids_query: List[str] = [x for x in ids_query_raw.split(",") if x.strip()]
     ids: List[int] = [int(x) for x in (ids_form or ids_query) if str(x).strip().isdigit()]
 
-    rows = fetch_all_cables(pid) if (request.values.get("all") == "1" or not ids) else fetch_cables_by_ids(pid, ids)
-    rows = _make_labels(p["name"], rows)
-
-    # 优先导出 XLSX；若导入失败则回退 CSV
-    try:
-        try:
-            from openpyxl import Workbook  # 仅当环境有依赖时走 xlsx
-        except ImportError:
-            raise
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Cables"
-        headers = [
-            "A_PROJECT",
-            "A_DEVICE",
-            "PORT_TYPE",
-            "A_PORT",
-            "A_LABEL",
-            "FROM/TO",
-            "B_PROJECT",
-            "B_DEVICE",
-            "PORT_TYPE",
-            "B_PORT",
-            "B_LABEL",
-            "TO/FROM",
-            "PRINTED",
-            "LINK_ID",
-        ]
-        ws.append(headers)
-        for r in rows:
-            ws.append(
-                [
-                    p["name"],
-                    r["a_device_name"],
-                    r.get("a_port_type_name") or "",
-                    r["a_port_name"],
-                    r["a_label"],
-                    r["from_to"],
-                    p["name"],
-                    r["b_device_name"],
-                    r.get("b_port_type_name") or "",
-                    r["b_port_name"],
-                    r["b_label"],
-                    r["to_from"],
-                    "YES" if r.get("printed") else "NO",
-                    r["link_id"],
-                ]
-            )
-        bio = BytesIO()
-        wb.save(bio)
-        bio.seek(0)
-        return send_file(
-            bio,
-            as_attachment=True,
-            download_name=f"{p['name']}_cables.xlsx",
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-    except ImportError:
-        # CSV 回退（你若已决定只保留 xlsx，也可以删除这一分支）
-        bio = BytesIO()
-        writer = csv.writer(bio)
-        writer.writerow(
-            [
-                "A_PROJECT",
-                "A_DEVICE",
-                "PORT_TYPE",
-                "A_PORT",
-                "A_LABEL",
-                "FROM/TO",
-                "B_PROJECT",
-                "B_DEVICE",
-                "PORT_TYPE",
-                "B_PORT",
-                "B_LABEL",
-                "TO/FROM",
-                "PRINTED",
-                "LINK_ID",
-            ]
-        )
-        for r in rows:
-            writer.writerow(
-                [
-                    p["name"],
-                    r["a_device_name"],
-                    r.get("a_port_type_name") or "",
-                    r["a_port_name"],
-                    r["a_label"],
-                    r["from_to"],
-                    p["name"],
-                    r["b_device_name"],
-                    r.get("b_port_type_name") or "",
-                    r["b_port_name"],
-                    r["b_label"],
-                    r["to_from"],
-                    "YES" if r.get("printed") else "NO",
-                    r["link_id"],
-                ]
-            )
-        bio.seek(0)
-        return send_file(
-            bio,
-            as_attachment=True,
-            download_name=f"{p['name']}_cables.csv",
-            mimetype="text/csv; charset=utf-8",
-        )
+    if request.values.get("all") == "1" or not ids:
+        job_id = submit_job("export_cables", export_cables_job, pid, project_id=pid)
+        return jsonify({"ok": True, "job_id": job_id,
+                        "status_url": url_for("jobs_bp.job_status", job_id=job_id),
+                        "download_url": url_for("jobs_bp.job_download", job_id=job_id)})
+
+    f = build_cables_file(p, ids)
+    return send_file(BytesIO(f.data), as_attachment=True, download_name=f.name, mimetype=f.mimetype)
 
 
 @bp_cables.route("/<int:pid>/cables/printed", methods=["POST"])
@@ -223,5 +82,4 @@ def cables_print(pid: int):
     ids_raw = request.args.get("ids", "").strip()
     link_ids: List[int] = [int(x) for x in ids_raw.split(",") if x.isdigit()]
     rows = fetch_cables_by_ids(pid, link_ids)
-    rows = _make_labels(p["name"], rows)
     return render_template("cables_print.html", project=p, items=rows)
@@ -8,6 +8,11 @@ from services.link_service import (
     delete_link,
     list_links_in_project,
     list_ports_with_links,
+    plan_auto_pairs,
+    create_links_bulk,
+    plan_port_allocation,
+    promote_plan,
+    discard_plan,
 )
 
 bp_connect = Blueprint("connect_bp", __name__, url_prefix="/projects")
@@ -80,3 +85,61 @@ def api_delete_link(pid, link_id):
 def api_list_links(pid):
     rows = list_links_in_project(pid)
     return jsonify({"ok": True, "data": rows})
+
+# --- AJAX: 自动配对预览（设备 A → 一台或多台目标设备，b=1,2,3） ---
+@bp_connect.route("/<int:pid>/api/auto-pair")
+def api_auto_pair_preview(pid):
+    a_id = request.args.get("a", type=int)
+    b_ids = [int(x) for x in (request.args.get("b") or "").split(",") if x.strip().isdigit()]
+    if not a_id or not b_ids:
+        return jsonify({"ok": False, "err": "参数缺失"})
+    try:
+        for did in [a_id] + b_ids:
+            d = get_device(did)
+            if not d or d.get("project_id") != pid:
+                return jsonify({"ok": False, "err": "设备不在该项目"})
+        return jsonify({"ok": True, "data": plan_auto_pairs(pid, a_id, b_ids)})
+    except Exception as e:
+        return jsonify({"ok": False, "err": str(e)})
+
+# --- AJAX: 自动配对提交（一次事务批量建连） ---
+@bp_connect.route("/<int:pid>/api/auto-pair", methods=["POST"])
+def api_auto_pair_commit(pid):
+    data = request.get_json(silent=True) or {}
+    pairs = [(p[0], p[1]) for p in (data.get("pairs") or []) if len(p) == 2]
+    if not pairs:
+        return jsonify({"ok": False, "err": "参数缺失"})
+    try:
+        n = create_links_bulk(pid, pairs)
+        return jsonify({"ok": True, "created": n})
+    except Exception as e:
+        return jsonify({"ok": False, "err": str(e)})
+
+# --- AJAX: 机群端口分配规划（{"sources": [...], "targets": [...], "commit": 0/1}） ---
+@bp_connect.route("/<int:pid>/api/plan", methods=["POST"])
+def api_plan(pid):
+    data = request.get_json(silent=True) or {}
+    sources = [int(x) for x in data.get("sources") or []]
+    targets = [int(x) for x in data.get("targets") or []]
+    if not sources or not targets:
+        return jsonify({"ok": False, "err": "参数缺失"})
+    try:
+        res = plan_port_allocation(pid, sources, targets, commit=bool(data.get("commit")))
+        return jsonify({"ok": True, "data": res})
+    except Exception as e:
+        return jsonify({"ok": False, "err": str(e)})
+
+# --- AJAX: 规划转正 / 作废 ---
+@bp_connect.route("/<int:pid>/api/plan/<plan_batch>/promote", methods=["POST"])
+def api_plan_promote(pid, plan_batch):
+    try:
+        return jsonify({"ok": True, "promoted": promote_plan(pid, plan_batch)})
+    except Exception as e:
+        return jsonify({"ok": False, "err": str(e)})
+
+@bp_connect.route("/<int:pid>/api/plan/<plan_batch>/discard", methods=["POST"])
+def api_plan_discard(pid, plan_batch):
+    try:
+        return jsonify({"ok": True, "deleted": discard_plan(pid, plan_batch)})
+    except Exception as e:
+        return jsonify({"ok": False, "err": str(e)})
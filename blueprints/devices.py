@@ -7,10 +7,13 @@ from services.device_service import (
     create_device_basic,  # 用于新增设备
     delete_device,
     update_device_basic,  # 用于更新设备
-    _ensure_ports_for_device,  #
+    _ensure_ports_for_device,  # 规则变更后按需补齐
     get_device_preview_data,
     create_child_port,
+    breakout_ports,
+    migrate_device_template,
 )
+from services.job_service import submit_job
 from services.template_service import list_templates
 from services.option_service import list_children
 
@@ -56,7 +59,7 @@ def edit_device(device_id):
     """
     编辑设备基本信息（名称、型号、模板）
     GET：渲染编辑表单（自己已有 UI 的话可复用；这里不提供模板代码）
-    POST：提交更新；若切模板，联动清理并重建端口实例
+    POST：提交更新；若切模板，按新模板就地迁移端口（保留仍匹配的端口与连线）
     """
     device = get_device(device_id)
     if not device:
@@ -72,8 +75,14 @@ def edit_device(device_id):
             return redirect(url_for("devices_bp.edit_device", device_id=device_id))
 
         try:
-            update_device_basic(device_id, name, model_code, new_template_id)
-            flash("设备已更新", "success")
+            update_device_basic(device_id, name, model_code, None)
+            if new_template_id and int(new_template_id) != int(device["template_id"]):
+                # 切换模板（删改端口、属性值）交给后台任务
+                job_id = submit_job("migrate_template", migrate_device_template, device_id, int(new_template_id),
+                                    project_id=device.get("project_id"))
+                flash(f"设备已更新，模板切换在后台进行（任务 {job_id}）", "success")
+            else:
+                flash("设备已更新", "success")
             return redirect(url_for("devices_bp.list_page"))
         except Exception as e:
             flash(f"更新失败：{e}", "error")
@@ -84,14 +93,27 @@ def edit_device(device_id):
     return render_template("device_edit.html", device=device, templates=templates)
 
 
+@bp_devices.route("/<int:device_id>/template-migration", methods=["GET"])
+def template_migration_preview(device_id):
+    """切换模板预演（dry-run）：返回将保留/新增/删除的端口及受影响的连线、属性值数量。"""
+    template_id = request.args.get("template_id", type=int)
+    if not template_id:
+        return jsonify({"ok": False, "msg": "template_id required"}), 400
+    try:
+        report = migrate_device_template(device_id, template_id, dry_run=True)
+        return jsonify({"ok": True, "data": report})
+    except Exception as e:
+        return jsonify({"ok": False, "msg": str(e)})
+
+
 @bp_devices.route("/<int:device_id>/delete", methods=["POST"])
 def delete_device_route(device_id):
     """
     删除设备（POST 提交）
     """
     try:
-        delete_device(device_id)
-        flash("设备已删除", "success")
+        job_id = delete_device(device_id)
+        flash(f"设备已删除（后台清理端口数据，任务 {job_id}）", "success")
     except Exception as e:
         flash(f"删除失败：{e}", "error")
     return redirect(url_for("devices_bp.list_page"))
@@ -108,11 +130,13 @@ def edit_attrs(device_id):
         flash("该设备未绑定模板，无法编辑属性", "err")
         return redirect(url_for("projects_bp.project_detail", pid=device.get("project_id")))
 
-    # 每次进入做一次端口对账/补齐
-    try:
-        _ensure_ports_for_device(template_id, device_id)
-    except Exception as e:
-        flash(f"端口同步失败：{e}", "err")
+    # 端口由“创建设备 / 切换模板 / 模板规则变更后的批量对账”负责生成；
+    # 仅当同步标记显示规则已变（如批量对账尚未覆盖到本设备）时才在这里补齐
+    if device.get("port_sync_needed"):
+        try:
+            _ensure_ports_for_device(template_id, device_id)
+        except Exception as e:
+            flash(f"端口同步失败：{e}", "err")
 
     if request.method == "POST":
         form_model = get_template_attrs_for_form(template_id, device_id)
@@ -142,6 +166,19 @@ def create_child_port_api(device_id, parent_port_id):
     except Exception as e:
         return jsonify({"ok": False, "msg": str(e)})
 
+@bp_devices.route("/<int:device_id>/ports/breakout", methods=["POST"])
+def breakout_ports_api(device_id):
+    """批量拆分：{"port_ids": [...], "fanout": 4, "naming_rule": "{parent}/{1..4}"}"""
+    payload = request.get_json(silent=True) or {}
+    port_ids = payload.get("port_ids") or request.form.getlist("port_ids", type=int)
+    fanout = payload.get("fanout") or request.form.get("fanout", type=int)
+    naming_rule = (payload.get("naming_rule") or request.form.get("naming_rule") or "").strip() or None
+    try:
+        res = breakout_ports(device_id, port_ids, int(fanout) if fanout else None, naming_rule)
+        return jsonify({"ok": True, "data": res})
+    except Exception as e:
+        return jsonify({"ok": False, "msg": str(e)})
+
 # --------- AJAX API：按父子关系返回直接子项 ---------
 @bp_devices.route("/options-children")
 def api_options_children():
@@ -0,0 +1,39 @@
+# blueprints/jobs.py
+from flask import Blueprint, jsonify, request, send_file
+
+from services.job_service import get_job, list_jobs, cancel_job, get_job_file
+
+bp_jobs = Blueprint("jobs_bp", __name__, url_prefix="/jobs")
+
+
+# --- AJAX: 后台任务列表（可按 kind / project_id 过滤） ---
+@bp_jobs.route("/", methods=["GET"])
+def jobs_list():
+    data = list_jobs(request.args.get("kind") or None, request.args.get("project_id", type=int))
+    return jsonify({"ok": True, "data": data})
+
+
+# --- AJAX: 单个后台任务的状态与进度 ---
+@bp_jobs.route("/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"ok": False, "msg": "任务不存在"}), 404
+    return jsonify({"ok": True, "data": job})
+
+
+# --- AJAX: 请求取消 ---
+@bp_jobs.route("/<job_id>/cancel", methods=["POST"])
+def job_cancel(job_id):
+    if not cancel_job(job_id):
+        return jsonify({"ok": False, "msg": "任务不存在或已结束"})
+    return jsonify({"ok": True})
+
+
+# --- 下载任务产出文件（如全量导出） ---
+@bp_jobs.route("/<job_id>/download", methods=["GET"])
+def job_download(job_id):
+    f = get_job_file(job_id)
+    if not f:
+        return jsonify({"ok": False, "msg": "任务未完成或没有可下载的文件"}), 404
+    return send_file(f["path"], as_attachment=True, download_name=f["name"], mimetype=f["mimetype"])
@@ -0,0 +1,12 @@
+# blueprints/metrics.py
+from flask import Blueprint, Response
+
+from metrics import render
+
+bp_metrics = Blueprint("metrics_bp", __name__)
+
+
+# --- Prometheus 抓取入口 ---
+@bp_metrics.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
@@ -5,7 +5,11 @@ from services.device_service import (
     list_port_templates,
     create_port_template,
     delete_port_template,
+    reconcile_template_ports,
+    build_ports_preview,
 )
+from services.naming_rule import compile_rule
+from services.job_service import submit_job
 
 tpl_bp = Blueprint("tpl_bp", __name__, url_prefix="/templates")
 
@@ -28,6 +32,14 @@ def port_tpl_manage(template_id):
         port_type_id = request.form.get("port_type_id", type=int) or None  # 新增
         max_links = request.form.get("max_links", type=int) or 1
 
+        if naming_rule:
+            # 先编译校验；数量以规则实际生成的端口数为准
+            try:
+                qty = compile_rule(naming_rule, code=code).size
+            except ValueError as e:
+                flash(f"命名规则无效：{e}", "error")
+                return redirect(url_for("tpl_bp.port_tpl_manage", template_id=template_id))
+
         if not code or (qty <= 1 and not name and not naming_rule):
             flash("请至少填写 code；若 qty=1，需要填写 name 或 naming_rule", "error")
         else:
@@ -36,23 +48,16 @@ def port_tpl_manage(template_id):
                 flash("已新增端口规则", "success")
             except Exception as e:
                 flash(f"新增失败：{e}", "error")
+            else:
+                _reconcile_and_flash(template_id)
 
         return redirect(url_for("tpl_bp.port_tpl_manage", template_id=template_id))
 
     rows = list_port_templates(template_id)
     port_types = list_port_types()  # 供下拉选择
 
-    # 构建预览树：端口类型 -> 属性 -> [端口名...]
-    ports_tree = {}
-    for r in rows:
-        ptype = r.get("port_type_name") or "未分类"
-        attr = r.get("name") or "（未命名属性）"
-        code = (r.get("code") or "").strip()
-        qty = int(r.get("qty") or 1)
-        if qty < 1:
-            continue
-        names = [f"{code}{i}" for i in range(1, qty + 1)]
-        ports_tree.setdefault(ptype, {}).setdefault(attr, []).extend(names)
+    # 构建预览树：端口类型 -> 属性 -> [端口名...]（与设备预览共用命名规则引擎）
+    ports_tree = build_ports_preview(rows)
 
     return render_template(
         "port_template_manage.html",
@@ -63,6 +68,31 @@ def port_tpl_manage(template_id):
     )
 
 
+def _reconcile_and_flash(template_id: int, force: bool = False):
+    """规则变更后把新规则同步到该模板下的已有设备（默认只处理标记过期的设备）。"""
+    try:
+        res = reconcile_template_ports(template_id, force=force)
+        flash(f"已对账 {res['devices']} 台设备，补齐 {res['inserted']} 个端口", "success")
+    except Exception as e:
+        flash(f"端口对账失败：{e}", "error")
+
+
+def _reconcile_job(template_id: int, progress=None):
+    return reconcile_template_ports(
+        template_id, force=True,
+        progress=(lambda done, total, inserted: progress(done=done, total=total, inserted=inserted))
+        if progress else None,
+    )
+
+
+@tpl_bp.route("/<int:template_id>/port-templates/reconcile", methods=["POST"])
+def port_tpl_reconcile(template_id):
+    """手动触发：按当前规则为该模板下全部设备补齐端口（忽略同步标记），在后台执行。"""
+    job_id = submit_job("reconcile_ports", _reconcile_job, template_id)
+    flash(f"端口对账已在后台进行（任务 {job_id}）", "success")
+    return redirect(url_for("tpl_bp.port_tpl_manage", template_id=template_id))
+
+
 @tpl_bp.route("/port-templates/<int:pt_id>/delete", methods=["POST"])
 def port_tpl_delete(pt_id):
     try:
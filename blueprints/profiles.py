@@ -0,0 +1,35 @@
+# blueprints/profiles.py
+from flask import Blueprint, Response, flash, redirect, render_template, url_for
+
+from config import Config
+from profiler import folded_text, get_profile, list_profiles, top_frames
+
+bp_profiles = Blueprint("profiles_bp", __name__, url_prefix="/admin/profiles")
+
+
+# --- 近期剖析记录（按耗时倒序） ---
+@bp_profiles.route("/", methods=["GET"])
+def profile_list():
+    enabled = bool(Config.PROFILE_TOKEN) or Config.PROFILE_SAMPLE_RATE > 0
+    return render_template("profiles_list.html", rows=list_profiles(), enabled=enabled,
+                           header=Config.PROFILE_HEADER, rate=Config.PROFILE_SAMPLE_RATE)
+
+
+# --- 单个请求：热点函数 ---
+@bp_profiles.route("/<profile_id>", methods=["GET"])
+def profile_detail(profile_id):
+    prof = get_profile(profile_id)
+    if not prof:
+        flash("剖析记录不存在或已清理", "err")
+        return redirect(url_for("profiles_bp.profile_list"))
+    return render_template("profile_detail.html", prof=prof, frames=top_frames(prof))
+
+
+# --- 下载折叠栈（flamegraph.pl / speedscope 可直接读取） ---
+@bp_profiles.route("/<profile_id>/folded", methods=["GET"])
+def profile_folded(profile_id):
+    prof = get_profile(profile_id)
+    if not prof:
+        return Response("not found\n", status=404, mimetype="text/plain")
+    return Response(folded_text(prof), mimetype="text/plain; charset=utf-8",
+                    headers={"Content-Disposition": f"attachment; filename={profile_id}.folded"})
@@ -2,7 +2,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from services.project_service import list_projects, get_project, create_project, update_project, delete_project
 from services.device_service import list_devices_by_project, create_device_in_project, get_device, update_device_basic,delete_device, get_device
+from services.device_service import duplicate_device
 from services.template_service import list_templates
+from services.dashboard_service import get_project_summary
+from services.clone_service import clone_project
+from services.job_service import submit_job
 
 
 bp_projects = Blueprint("projects_bp", __name__, url_prefix="/projects")
@@ -34,15 +38,40 @@ def project_detail(pid):
     devices = list_devices_by_project(pid)
     return render_template("project_detail.html", project=p, devices=devices)
 
+@bp_projects.route("/<int:pid>/dashboard", methods=["GET"])
+def project_dashboard(pid):
+    p = get_project(pid)
+    if not p:
+        flash("项目不存在", "err")
+        return redirect(url_for("projects_bp.project_list"))
+    try:
+        summary = get_project_summary(pid, refresh=request.args.get("refresh") == "1")
+    except Exception as e:
+        flash(f"统计失败：{e}", "err")
+        return redirect(url_for("projects_bp.project_detail", pid=pid))
+    return render_template("project_dashboard.html", project=p, s=summary)
+
 @bp_projects.route("/<int:pid>/delete", methods=["POST"])
 def project_delete(pid):
     try:
-        delete_project(pid)
-        flash("已删除项目", "ok")
+        job_id = delete_project(pid)
+        flash(f"已删除项目（后台分批清理设备、端口与连线，任务 {job_id}）", "ok")
     except Exception as e:
         flash(f"删除失败：{e}", "err")
     return redirect(url_for("projects_bp.project_list"))
 
+@bp_projects.route("/<int:pid>/clone", methods=["POST"])
+def project_clone(pid):
+    p = get_project(pid)
+    if not p:
+        flash("项目不存在", "err")
+        return redirect(url_for("projects_bp.project_list"))
+    name = (request.form.get("name") or "").strip() or f"{p['name']}-副本"
+    with_links = request.form.get("with_links") == "1"
+    job_id = submit_job("clone_project", clone_project, pid, name, with_links, project_id=pid)
+    flash(f"正在后台复制项目为「{name}」，完成后出现在列表中（任务 {job_id}）", "ok")
+    return redirect(url_for("projects_bp.project_list"))
+
 # ========== 项目内设备（迁移设备入口到项目下） ==========
 @bp_projects.route("/<int:pid>/devices/new", methods=["GET","POST"])
 def device_new_in_project(pid):
@@ -92,6 +121,22 @@ def device_edit_in_project(pid, device_id):
     return render_template("device_form_in_project.html", project=p, device=device, templates=None)
 
 
+@bp_projects.route("/<int:pid>/devices/<int:device_id>/duplicate", methods=["POST"])
+def device_duplicate_in_project(pid, device_id):
+    dev = get_device(device_id)
+    if not dev or dev.get("project_id") != pid:
+        flash("设备不存在于该项目", "err")
+        return redirect(url_for("projects_bp.project_detail", pid=pid))
+    count = request.form.get("count", type=int) or 0
+    pattern = (request.form.get("pattern") or "").strip() or None
+    try:
+        ids = duplicate_device(device_id, count, pattern)
+        flash(f"已复制 {len(ids)} 台设备（含端口与属性）", "ok")
+    except Exception as e:
+        flash(f"复制失败：{e}", "err")
+    return redirect(url_for("projects_bp.project_detail", pid=pid))
+
+
 @bp_projects.route("/<int:pid>/devices/<int:device_id>/delete", methods=["POST"])
 def device_delete_in_project(pid, device_id):
     dev = get_device(device_id)
@@ -99,8 +144,8 @@ def device_delete_in_project(pid, device_id):
         flash("设备不存在于该项目", "err")
         return redirect(url_for("projects_bp.project_detail", pid=pid))
     try:
-        delete_device(device_id)
-        flash("已删除设备", "ok")
+        job_id = delete_device(device_id)
+        flash(f"已删除设备（后台清理端口数据，任务 {job_id}）", "ok")
     except Exception as e:
         flash(f"删除失败：{e}", "err")
     return redirect(url_for("projects_bp.project_detail", pid=pid))
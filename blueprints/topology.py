@@ -0,0 +1,95 @@
+# blueprints/topology.py
+from io import BytesIO, StringIO
+import csv
+
+from flask import Blueprint, request, jsonify, send_file, flash, redirect, url_for
+from services.project_service import get_project
+from services.topology_service import trace_circuit, analyze_redundancy
+
+bp_topology = Blueprint("topology_bp", __name__, url_prefix="/projects")
+
+
+# --- AJAX: 端到端电路追踪（服务器网卡 → 配线架 … → 交换机端口） ---
+@bp_topology.route("/<int:pid>/api/trace")
+def api_trace(pid):
+    port_id = request.args.get("port_id", type=int)
+    if not port_id:
+        return jsonify({"ok": False, "msg": "port_id required"}), 400
+    try:
+        data = trace_circuit(pid, port_id)
+        if data is None:
+            return jsonify({"ok": False, "msg": "端口不存在于该项目"}), 404
+        return jsonify({"ok": True, "data": data})
+    except Exception as e:
+        return jsonify({"ok": False, "msg": str(e)})
+
+
+# --- AJAX: 冗余 / 单点故障分析 ---
+@bp_topology.route("/<int:pid>/api/redundancy")
+def api_redundancy(pid):
+    try:
+        return jsonify({"ok": True, "data": analyze_redundancy(pid)})
+    except Exception as e:
+        return jsonify({"ok": False, "msg": str(e)})
+
+
+def _redundancy_sheets(res):
+    """报表内容：[(sheet 名, 表头, 行...)]，XLSX 与 CSV 共用。"""
+    return [
+        ("单点设备", ["DEVICE_ID", "DEVICE", "DEVICE_TYPE", "ISOLATED_DEVICES"],
+         [[r["device_id"], r["device_name"], r["device_type"], r["isolated"]]
+          for r in res["articulation_points"]]),
+        ("单点链路", ["LINK_ID", "A_DEVICE", "A_TYPE", "B_DEVICE", "B_TYPE", "ISOLATED_DEVICES"],
+         [[r["link_id"], r["a_device_name"], r["a_device_type"], r["b_device_name"], r["b_device_type"], r["isolated"]]
+          for r in res["bridges"]]),
+        ("连通分量", ["COMPONENT", "DEVICES", "TYPES"],
+         [[c["id"], c["size"], "; ".join(f"{k}×{v}" for k, v in sorted(c["types"].items()))]
+          for c in res["components"]]),
+        ("按设备类型", ["DEVICE_TYPE", "DEVICES", "COMPONENTS"],
+         [[k, v["devices"], v["components"]] for k, v in sorted(res["by_type"].items())]),
+    ]
+
+
+@bp_topology.route("/<int:pid>/redundancy/export")
+def redundancy_export(pid):
+    p = get_project(pid)
+    if not p:
+        flash("项目不存在", "err")
+        return redirect(url_for("projects_bp.project_list"))
+    sheets = _redundancy_sheets(analyze_redundancy(pid))
+
+    # 优先导出 XLSX；缺少 openpyxl 时回退 CSV（各表依次排列）
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        sio = StringIO()
+        writer = csv.writer(sio)
+        for title, headers, rows in sheets:
+            writer.writerow([title])
+            writer.writerow(headers)
+            writer.writerows(rows)
+            writer.writerow([])
+        bio = BytesIO(sio.getvalue().encode("utf-8-sig"))
+        return send_file(
+            bio,
+            as_attachment=True,
+            download_name=f"{p['name']}_redundancy.csv",
+            mimetype="text/csv; charset=utf-8",
+        )
+
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, headers, rows in sheets:
+        ws = wb.create_sheet(title)
+        ws.append(headers)
+        for r in rows:
+            ws.append(r)
+    bio = BytesIO()
+    wb.save(bio)
+    bio.seek(0)
+    return send_file(
+        bio,
+        as_attachment=True,
+        download_name=f"{p['name']}_redundancy.xlsx",
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
@@ -0,0 +1,295 @@
+"""
+参考数据缓存（模板、端口类型、属性定义与选项、项目基本信息等很少变动、却几乎每页都查的数据）。
+
+两级结构：
+  - 本进程 LRU（CACHE_LOCAL_MAX 条）
+  - 可选共享层：配置 CACHE_REDIS_URL 且装有 redis 包时启用（任何 Redis 协议服务均可），
+    也可用 configure(RedisTier(client)) 注入任意兼容客户端（如本地替身服务）
+  - 单飞加载：同一键并发未命中时只执行一次查询，其余调用等待其结果
+
+失效：
+  - 条目带命名空间版本号（cache_version 表），版本变化后旧值自动作废；
+    共享层的键里含版本号，旧值无需删除，过期自然淘汰
+  - invalidate(ns, ...) 递增版本号、清本进程条目，并经 Redis 发布失效消息，
+    其他进程收到后立即清理；未启用共享层时最迟 CACHE_VERSION_CHECK_SECONDS 秒感知
+  - 版本号读取失败（库不可用等）时直接穿透查询，不使用缓存
+
+命中率等计数见 cache_stats()。命名空间须先在 cache_version 表登记（见 sql_migrate.txt）。
+"""
+import copy
+import functools
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from config import Config
+from db import get_conn
+
+_LOCK = threading.Lock()
+_VERSIONS = {}       # 命名空间 -> 版本号
+_CHECKED_AT = [0.0]  # 上次读取 cache_version 的时间（monotonic）
+_STATS = Counter()   # (命名空间, 计数项) -> 次数
+
+
+class LocalLRU:
+    """本进程 LRU：键为 (命名空间, 函数名, 参数)，值为 (版本号, 值)。"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None:
+                self._data.move_to_end(key)
+            return hit
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def drop(self, namespaces):
+        with self._lock:
+            for key in [k for k in self._data if k[0] in namespaces]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisTier:
+    """
+    共享层：client 需提供 get / set(ex=) / publish / pubsub（redis-py 接口）。
+    值以 pickle 存放，键含命名空间版本号。
+    """
+
+    def __init__(self, client, prefix: str = None, ttl: int = None):
+        self.client = client
+        self.prefix = prefix if prefix is not None else Config.CACHE_KEY_PREFIX
+        self.ttl = ttl if ttl is not None else Config.CACHE_SHARED_TTL
+        self.channel = f"{self.prefix}invalidate"
+
+    def _key(self, key, version) -> str:
+        ns, name, args, kwargs = key
+        digest = hashlib.sha1(repr((name, args, kwargs)).encode("utf-8")).hexdigest()
+        return f"{self.prefix}{ns}:{version}:{digest}"
+
+    def get(self, key, version):
+        raw = self.client.get(self._key(key, version))
+        return None if raw is None else (pickle.loads(raw),)
+
+    def set(self, key, version, value):
+        self.client.set(self._key(key, version), pickle.dumps(value), ex=self.ttl)
+
+    def publish(self, namespaces):
+        self.client.publish(self.channel, json.dumps(list(namespaces)))
+
+    def listen(self, callback):
+        """后台线程订阅失效频道，收到消息调用 callback(命名空间列表)。"""
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.channel)
+
+        def loop():
+            for msg in pubsub.listen():
+                if msg.get("type") != "message":
+                    continue
+                data = msg.get("data")
+                try:
+                    callback(json.loads(data.decode("utf-8") if isinstance(data, bytes) else data))
+                except Exception:
+                    pass
+
+        t = threading.Thread(target=loop, name="cache-invalidate", daemon=True)
+        t.start()
+        return t
+
+
+_LOCAL = LocalLRU(Config.CACHE_LOCAL_MAX)
+_SHARED = [None]        # RedisTier 或 None
+_LISTENER_PID = [None]  # 订阅线程所属进程（fork 后需在子进程重新订阅）
+_INFLIGHT = {}          # (键, 版本号) -> _Flight
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value, self.error = None, None
+
+
+def configure(shared=None):
+    """设置共享层（None 表示只用本进程 LRU），并清空本进程缓存。"""
+    with _LOCK:
+        _SHARED[0] = shared
+        _LISTENER_PID[0] = None
+        _VERSIONS.clear()
+        _CHECKED_AT[0] = 0.0
+    _LOCAL.clear()
+
+
+def init_cache(app):
+    """应用启动时调用：按 CACHE_REDIS_URL 启用共享层；缺少 redis 包或连不上时只用本进程 LRU。"""
+    if not Config.CACHE_REDIS_URL:
+        return
+    try:
+        import redis
+    except ImportError:
+        app.logger.warning("CACHE_REDIS_URL set but redis package not installed; shared cache disabled")
+        return
+    try:
+        client = redis.Redis.from_url(Config.CACHE_REDIS_URL)
+        client.ping()
+    except Exception as e:
+        app.logger.warning("shared cache disabled: %s", e)
+        return
+    configure(RedisTier(client))
+
+
+def _on_invalidate(namespaces):
+    _LOCAL.drop(set(namespaces))
+    _CHECKED_AT[0] = 0.0
+
+
+def _shared():
+    """当前共享层；本进程首次使用时启动失效订阅。"""
+    tier = _SHARED[0]
+    if tier is not None and _LISTENER_PID[0] != os.getpid():
+        with _LOCK:
+            if _LISTENER_PID[0] != os.getpid():
+                _LISTENER_PID[0] = os.getpid()
+                try:
+                    tier.listen(_on_invalidate)
+                except Exception:
+                    _STATS[("*", "shared_error")] += 1
+    return tier
+
+
+def _versions():
+    """返回各命名空间当前版本号；超过检查间隔则整体重读一次 cache_version。"""
+    now = time.monotonic()
+    if now - _CHECKED_AT[0] < Config.CACHE_VERSION_CHECK_SECONDS:
+        return _VERSIONS
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT name, version FROM cache_version")
+        fresh = {r["name"]: int(r["version"]) for r in cur.fetchall() or []}
+    with _LOCK:
+        _VERSIONS.clear()
+        _VERSIONS.update(fresh)
+        _CHECKED_AT[0] = now
+    return fresh
+
+
+def _load(key, version, fn, args, kwargs):
+    """未命中：查共享层，再查库；同一键同一时刻只有一个线程执行，其余等待结果。"""
+    ns, fkey = key[0], (key, version)
+    with _LOCK:
+        flight = _INFLIGHT.get(fkey)
+        leader = flight is None
+        if leader:
+            flight = _INFLIGHT[fkey] = _Flight()
+    if not leader:
+        _STATS[(ns, "coalesced")] += 1
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    try:
+        tier, found = _shared(), None
+        if tier is not None:
+            try:
+                found = tier.get(key, version)
+            except Exception:
+                _STATS[(ns, "shared_error")] += 1
+        if found is not None:
+            _STATS[(ns, "hit_shared")] += 1
+            value = found[0]
+        else:
+            _STATS[(ns, "miss")] += 1
+            # 先取版本号再查数据：查询期间若有变更，版本随之递增，不会把新版本号配旧数据
+            value = fn(*args, **kwargs)
+            if tier is not None:
+                try:
+                    tier.set(key, version, value)
+                except Exception:
+                    _STATS[(ns, "shared_error")] += 1
+        _LOCAL.set(key, (version, value))
+        flight.value = value
+        return value
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _LOCK:
+            _INFLIGHT.pop(fkey, None)
+        flight.done.set()
+
+
+def cached(namespace: str):
+    """缓存装饰器：参数须可哈希，返回值须可 pickle（启用共享层时）；取出时深拷贝，调用方可放心修改。"""
+    def deco(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                version = _versions().get(namespace)
+            except Exception:
+                version = None
+            if version is None:
+                _STATS[(namespace, "bypass")] += 1
+                return fn(*args, **kwargs)
+            key = (namespace, name, args, tuple(sorted(kwargs.items())))
+            hit = _LOCAL.get(key)
+            if hit is not None and hit[0] == version:
+                _STATS[(namespace, "hit_local")] += 1
+                return copy.deepcopy(hit[1])
+            return copy.deepcopy(_load(key, version, fn, args, kwargs))
+        return wrapper
+    return deco
+
+
+def invalidate(*namespaces: str, cur=None):
+    """
+    失效命名空间：递增 cache_version，清掉本进程对应条目，并通知其他进程。
+    传入 cur 时在调用方的连接执行（须在其提交后才对其他进程可见），否则自取连接。
+    """
+    if not namespaces:
+        return
+    sql = f"UPDATE cache_version SET version=version+1 WHERE name IN ({','.join(['%s'] * len(namespaces))})"
+    if cur is not None:
+        cur.execute(sql, namespaces)
+    else:
+        with get_conn() as conn, conn.cursor() as c:
+            c.execute(sql, namespaces)
+    _on_invalidate(namespaces)
+    for ns in namespaces:
+        _STATS[(ns, "invalidate")] += 1
+    tier = _shared()
+    if tier is not None:
+        try:
+            tier.publish(namespaces)
+        except Exception:
+            _STATS[("*", "shared_error")] += 1
+
+
+def cache_stats():
+    """各命名空间计数：hit_local / hit_shared / miss / coalesced / bypass / invalidate / shared_error。"""
+    out = {}
+    for (ns, item), n in list(_STATS.items()):
+        out.setdefault(ns, {})[item] = n
+    return {"local_size": len(_LOCAL), "shared": _SHARED[0] is not None, "namespaces": out}
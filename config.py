@@ -9,3 +9,45 @@ class Config:
     DB_PASSWORD = os.getenv("DB_PASSWORD", "")
     DB_NAME = os.getenv("DB_NAME", "eam")
     FLASK_SECRET = os.getenv("FLASK_SECRET", "dev-secret")
+    # 拓扑：哪些设备类型（device_template.device_type）视为配线架，以及前后端口的名称前缀配对
+    PATCH_PANEL_TYPES = [t.strip() for t in os.getenv("PATCH_PANEL_TYPES", "配线架,ODF,Patch Panel").split(",") if t.strip()]
+    PASS_THROUGH_PAIRS = [tuple(p.split(":", 1)) for p in os.getenv("PASS_THROUGH_PAIRS", "F:R,前:后").split(",") if ":" in p]
+    # 软删除后的后台分批清理：每批删除行数、批间休眠毫秒数
+    PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "2000"))
+    PURGE_THROTTLE_MS = int(os.getenv("PURGE_THROTTLE_MS", "50"))
+    # 后台任务：线程池大小、导出等结果文件目录、任务记录保留天数
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_RESULT_DIR = os.getenv("JOB_RESULT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "jobs"))
+    JOB_KEEP_DAYS = int(os.getenv("JOB_KEEP_DAYS", "7"))
+    # 多进程部署：执行中任务的心跳间隔，以及多久没有心跳视为执行进程已退出（秒）
+    JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+    JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "90"))
+    # 读写分离：从库列表 "host:port,host:port"（账号与库名同主库），留空则全部走主库；
+    # 复制延迟上限与检查间隔（秒，后台线程检查）、连从库超时（秒）；写请求后会话内只读查询仍走主库的时长（秒）
+    DB_REPLICAS = [(h.strip(), int(p or 3306)) for h, _, p in
+                   (s.strip().partition(":") for s in os.getenv("DB_REPLICAS", "").split(",") if s.strip())]
+    REPLICA_MAX_LAG = int(os.getenv("REPLICA_MAX_LAG", "5"))
+    REPLICA_LAG_CHECK_SECONDS = int(os.getenv("REPLICA_LAG_CHECK_SECONDS", "10"))
+    REPLICA_CONNECT_TIMEOUT = int(os.getenv("REPLICA_CONNECT_TIMEOUT", "2"))
+    READ_STICKY_SECONDS = int(os.getenv("READ_STICKY_SECONDS", "5"))
+    # 参考数据缓存：多久重读一次 cache_version 版本号（秒），即其他进程的修改最迟多久可见
+    CACHE_VERSION_CHECK_SECONDS = float(os.getenv("CACHE_VERSION_CHECK_SECONDS", "2"))
+    # 缓存分层：本进程 LRU 条数；共享层 Redis 地址（留空只用本进程缓存）、共享条目存活秒数、键前缀
+    CACHE_LOCAL_MAX = int(os.getenv("CACHE_LOCAL_MAX", "2048"))
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+    CACHE_SHARED_TTL = int(os.getenv("CACHE_SHARED_TTL", "3600"))
+    CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "eam:cache:")
+    # 请求剖析：口令（请求头 PROFILE_HEADER 等于口令时剖析该请求）、随机抽样比例（0~1），两者都空则完全关闭；
+    # 采样间隔毫秒、结果目录、最多保留条数
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+    PROFILE_HEADER = os.getenv("PROFILE_HEADER", "X-Profile")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "profiles"))
+    PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+    # 指标：多进程部署时各 worker 的快照目录（留空只输出本进程数据）、快照写盘间隔（秒）
+    METRICS_DIR = os.getenv("METRICS_DIR", "")
+    METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+    # 执行计划采集（仅开发 / 预发）：每种语句形状首次执行时 EXPLAIN 一次，结果目录供 tools.explain_report 汇总
+    EXPLAIN_CAPTURE = os.getenv("EXPLAIN_CAPTURE", "0") == "1"
+    EXPLAIN_DIR = os.getenv("EXPLAIN_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "explain"))
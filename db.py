@@ -1,10 +1,59 @@
+import contextvars
+import functools
+import itertools
+import os
+import threading
+import time
+
 import pymysql
 from config import Config
+import sql_explain
+from metrics import note_connection, note_query, DB_ROWS
+
+# ===== 读写分离 =====
+# 只读查询（@read_only 标记的服务函数，或 get_conn(readonly=True)）走从库，其余一律走主库：
+#   - 从库按 Config.DB_REPLICAS 轮询；复制延迟由每进程一个后台线程按 REPLICA_LAG_CHECK_SECONDS 间隔检查，
+#     请求线程只读缓存的结果、从不等待检查；超过 REPLICA_MAX_LAG 秒、复制中断或无法连接
+#     （REPLICA_CONNECT_TIMEOUT 秒）的从库暂不使用，全部不可用时回落主库；首次检查完成前只读也走主库
+#   - 读己之写：写请求（非 GET/HEAD/OPTIONS）本身及之后 READ_STICKY_SECONDS 秒内，
+#     该会话的只读查询仍走主库（init_db 注册钩子）
+
+_READONLY = contextvars.ContextVar("db_readonly", default=False)
+_STICKY_KEY = "_db_sticky_until"
+_READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class _Connection(pymysql.connections.Connection):
+    """
+    带指标的连接：按角色（primary / replica）统计 SQL 条数、耗时与返回行数；
+    开启 EXPLAIN_CAPTURE 时先为新出现的语句形状采集执行计划（见 sql_explain）。
+    """
+    role = "primary"
 
-def get_conn():
-    return pymysql.connect(
-        host=Config.DB_HOST,
-        port=Config.DB_PORT,
+    def _raw_rows(self, sql):
+        super().query(sql)
+        return self._result.rows
+
+    def query(self, sql, unbuffered=False):
+        fp = sql_explain.capture(sql, self._raw_rows) if Config.EXPLAIN_CAPTURE else None
+        t0, rows = time.perf_counter(), 0
+        try:
+            n = super().query(sql, unbuffered)
+            if not unbuffered and self._result is not None and self._result.rows:
+                rows = len(self._result.rows)
+            return n
+        finally:
+            elapsed = time.perf_counter() - t0
+            note_query(self.role, elapsed, rows)
+            if fp is not None:
+                sql_explain.note(fp, elapsed)
+
+
+def _connect(host: str, port: int, role: str = "primary", connect_timeout: int = 10):
+    conn = _Connection(
+        host=host,
+        port=port,
+        connect_timeout=connect_timeout,
         user=Config.DB_USER,
         password=Config.DB_PASSWORD,
         database=Config.DB_NAME,
@@ -12,3 +61,174 @@ def get_conn():
         cursorclass=pymysql.cursors.DictCursor,
         autocommit=True,
     )
+    conn.role = role
+    note_connection(role)
+    return conn
+
+
+class _Replica:
+    __slots__ = ("host", "port", "healthy", "lag", "checked_at")
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.healthy, self.lag, self.checked_at = False, None, 0.0
+
+    def check(self):
+        """读复制延迟（Seconds_Behind_Source / Master），失败或复制中断视为不可用。"""
+        self.checked_at = time.monotonic()
+        try:
+            conn = _connect(self.host, self.port, "replica", Config.REPLICA_CONNECT_TIMEOUT)
+            try:
+                with conn.cursor() as cur:
+                    try:
+                        cur.execute("SHOW REPLICA STATUS")
+                    except pymysql.MySQLError:
+                        cur.execute("SHOW SLAVE STATUS")
+                    row = cur.fetchone() or {}
+            finally:
+                conn.close()
+            lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+            self.lag = None if lag is None else int(lag)
+            self.healthy = self.lag is not None and self.lag <= Config.REPLICA_MAX_LAG
+        except Exception:
+            self.lag, self.healthy = None, False
+
+
+_REPLICAS = [_Replica(h, p) for h, p in Config.DB_REPLICAS]
+_RR = itertools.count()
+_CHECKER_LOCK = threading.Lock()
+_CHECKER_PID = [None]
+
+
+def _check_loop():
+    while True:
+        for r in _REPLICAS:
+            r.check()
+        time.sleep(Config.REPLICA_LAG_CHECK_SECONDS)
+
+
+def _ensure_checker():
+    """每个进程（含 fork 出的 worker）启动一个检查线程。"""
+    if _CHECKER_PID[0] == os.getpid():
+        return
+    with _CHECKER_LOCK:
+        if _CHECKER_PID[0] != os.getpid():
+            _CHECKER_PID[0] = os.getpid()
+            threading.Thread(target=_check_loop, name="replica-check", daemon=True).start()
+
+
+def _pick_replica():
+    if not _REPLICAS:
+        return None
+    _ensure_checker()
+    healthy = [r for r in _REPLICAS if r.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_RR) % len(healthy)]
+
+
+def _sticky() -> bool:
+    """当前请求是否需读主库：写请求本身，或会话处于写后窗口内（无请求上下文时视为否）。"""
+    try:
+        from flask import has_request_context, request, session
+    except ImportError:
+        return False
+    if not has_request_context():
+        return False
+    return request.method not in _READ_METHODS or session.get(_STICKY_KEY, 0) > time.time()
+
+
+def get_conn(readonly: bool = None):
+    """
+    取数据库连接（DictCursor，autocommit）。
+    readonly=None 时沿用调用链上 @read_only 的标记；只读且有可用从库时连从库，否则连主库。
+    """
+    if readonly is None:
+        readonly = _READONLY.get()
+    if readonly and not _sticky():
+        replica = _pick_replica()
+        if replica is not None:
+            try:
+                return _connect(replica.host, replica.port, "replica", Config.REPLICA_CONNECT_TIMEOUT)
+            except pymysql.MySQLError:
+                replica.healthy = False
+    return _connect(Config.DB_HOST, Config.DB_PORT)
+
+
+STREAM_CHUNK = 2000  # 流式读取每次从套接字取的行数
+
+
+def iter_rows(cur, row=None, chunk: int = STREAM_CHUNK):
+    """
+    逐批取出已执行游标的结果并逐行产出（配合元组游标 / SSCursor，整表不驻留内存）。
+    row 给定时（NamedTuple 类等）用 row._make 映射每行。
+    """
+    make = row._make if row is not None else None
+    # 无缓冲游标的行数在执行时未知，边读边计
+    streamed = isinstance(cur, pymysql.cursors.SSCursor)
+    role = getattr(cur.connection, "role", "primary")
+    while True:
+        batch = cur.fetchmany(chunk)
+        if not batch:
+            return
+        if streamed:
+            DB_ROWS.inc(role, amount=len(batch))
+        if make is None:
+            yield from batch
+        else:
+            yield from map(make, batch)
+
+
+def stream_rows(sql: str, params=(), row=None, readonly: bool = None, chunk: int = STREAM_CHUNK):
+    """
+    大结果集流式读取：独立连接 + 无缓冲元组游标（SSCursor），返回逐行生成器。
+    连接在调用时即建立（沿用调用方的 @read_only 标记），生成器耗尽或关闭时释放；
+    消费期间不要在同一生成器外再依赖该连接。
+    """
+    conn = get_conn(readonly)
+    cur = conn.cursor(pymysql.cursors.SSCursor)
+    try:
+        cur.execute(sql, params)
+    except Exception:
+        conn.close()
+        raise
+
+    def gen():
+        try:
+            yield from iter_rows(cur, row, chunk)
+        finally:
+            try:
+                cur.close()
+            finally:
+                conn.close()
+    return gen()
+
+
+def read_only(fn):
+    """标记服务函数只读：函数内（含其调用的函数）的 get_conn() 默认走从库。"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _READONLY.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _READONLY.reset(token)
+    return wrapper
+
+
+def replica_status():
+    """各从库最近一次检查结果（用于排障）。"""
+    return [{"host": r.host, "port": r.port, "healthy": r.healthy, "lag": r.lag} for r in _REPLICAS]
+
+
+def init_db(app):
+    """注册读己之写钩子：非 GET/HEAD/OPTIONS 请求之后，会话在 READ_STICKY_SECONDS 秒内只读也走主库。"""
+    if not _REPLICAS:
+        return
+
+    @app.after_request
+    def _mark_sticky(response):
+        from flask import request, session
+        if request.method not in _READ_METHODS:
+            session[_STICKY_KEY] = time.time() + Config.READ_STICKY_SECONDS
+        return response
@@ -0,0 +1,267 @@
+"""
+Prometheus 文本格式指标（不依赖 prometheus_client）。
+
+  - Counter / Histogram 在本进程内累加；带标签，标签值按声明顺序传入
+  - 多进程（gunicorn 多 worker）：配置 METRICS_DIR 后，各进程每 METRICS_FLUSH_SECONDS 秒
+    把快照原子写入 <METRICS_DIR>/<pid>.json，/metrics 汇总目录下全部快照（计数直接相加）；
+    已退出进程的快照保留，计数不回退。部署重启时应清空该目录（如 gunicorn on_starting 钩子）
+  - 未配置 METRICS_DIR 时只输出本进程数据
+  - 请求级统计（本请求的查询数、开连接数）记在线程局部变量里，由 init_metrics 注册的钩子收尾
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from config import Config
+
+_LOCK = threading.Lock()
+_REGISTRY: Dict[str, "_Metric"] = {}
+_COLLECTORS: List[Callable[[], None]] = []   # 快照前调用，用于把外部统计（如缓存计数）同步进来
+_LOCAL = threading.local()
+_LAST_FLUSH = [0.0]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()):
+        self.name, self.doc, self.labels = name, doc, tuple(labels)
+        self.values: Dict[Tuple, object] = {}
+        _REGISTRY[name] = self
+
+    def _key(self, labelvalues) -> Tuple:
+        if len(labelvalues) != len(self.labels):
+            raise ValueError(f"{self.name} 需要标签 {self.labels}")
+        return tuple(str(v) for v in labelvalues)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues, amount: float = 1):
+        key = self._key(labelvalues)
+        with _LOCK:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set_total(self, *labelvalues, value: float):
+        """同步外部已累计的计数（只用于收集器）。"""
+        key = self._key(labelvalues)
+        with _LOCK:
+            self.values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        key = self._key(labelvalues)
+        with _LOCK:
+            h = self.values.get(key)
+            if h is None:
+                h = self.values[key] = [0] * (len(self.buckets) + 2)   # 各桶（非累计）、sum、count
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    h[i] += 1
+                    break
+            h[-2] += value
+            h[-1] += 1
+
+
+# ===== 指标定义 =====
+
+HTTP_SECONDS = Histogram("eam_http_request_duration_seconds", "请求耗时（秒）",
+                         ("endpoint", "method", "status"))
+HTTP_DB_QUERIES = Histogram("eam_http_db_queries_per_request", "单个请求执行的 SQL 条数",
+                            ("endpoint",), COUNT_BUCKETS)
+HTTP_DB_CONNECTIONS = Histogram("eam_http_db_connections_per_request", "单个请求新开的数据库连接数",
+                                ("endpoint",), COUNT_BUCKETS)
+DB_CONNECTIONS = Counter("eam_db_connections_opened_total", "get_conn 新开连接数（无连接池，每次调用都新开）",
+                         ("role",))
+DB_QUERIES = Counter("eam_db_queries_total", "执行的 SQL 条数", ("role",))
+DB_QUERY_SECONDS = Histogram("eam_db_query_duration_seconds", "单条 SQL 耗时（秒，不含流式读取）", ("role",))
+DB_ROWS = Counter("eam_db_rows_returned_total", "查询返回行数", ("role",))
+EXPORT_BYTES = Histogram("eam_export_bytes", "导出文件大小（字节）", ("format", "scope"), SIZE_BUCKETS)
+EXPORT_SECONDS = Histogram("eam_export_duration_seconds", "导出生成耗时（秒）", ("format", "scope"))
+CACHE_EVENTS = Counter("eam_cache_events_total",
+                       "参考数据缓存事件（hit_local / hit_shared / miss / coalesced / bypass / invalidate / shared_error）",
+                       ("namespace", "event"))
+
+
+# ===== 请求级统计 =====
+
+def request_counts():
+    """当前线程正在统计的请求计数（不在请求内时为 None）。"""
+    return getattr(_LOCAL, "req", None)
+
+
+def note_connection(role: str):
+    DB_CONNECTIONS.inc(role)
+    req = request_counts()
+    if req is not None:
+        req["connections"] += 1
+
+
+def note_query(role: str, seconds: float, rows: int):
+    DB_QUERIES.inc(role)
+    DB_QUERY_SECONDS.observe(seconds, role)
+    if rows:
+        DB_ROWS.inc(role, amount=rows)
+    req = request_counts()
+    if req is not None:
+        req["queries"] += 1
+
+
+def register_collector(fn: Callable[[], None]):
+    _COLLECTORS.append(fn)
+
+
+def _collect_cache():
+    from cache import cache_stats
+    for ns, events in cache_stats()["namespaces"].items():
+        for event, n in events.items():
+            CACHE_EVENTS.set_total(ns, event, value=n)
+
+
+register_collector(_collect_cache)
+
+
+# ===== 快照与输出 =====
+
+def _snapshot() -> Dict[str, dict]:
+    for fn in _COLLECTORS:
+        try:
+            fn()
+        except Exception:
+            pass
+    with _LOCK:
+        return {
+            m.name: {
+                "kind": m.kind, "doc": m.doc, "labels": list(m.labels),
+                "buckets": list(getattr(m, "buckets", ())),
+                "values": [[list(k), (list(v) if isinstance(v, list) else v)] for k, v in m.values.items()],
+            }
+            for m in _REGISTRY.values()
+        }
+
+
+def flush(force: bool = False):
+    """多进程模式下把本进程快照写入 METRICS_DIR（按间隔节流）。"""
+    if not Config.METRICS_DIR:
+        return
+    now = time.monotonic()
+    if not force and now - _LAST_FLUSH[0] < Config.METRICS_FLUSH_SECONDS:
+        return
+    _LAST_FLUSH[0] = now
+    os.makedirs(Config.METRICS_DIR, exist_ok=True)
+    path = os.path.join(Config.METRICS_DIR, f"{os.getpid()}.json")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fp:
+        json.dump(_snapshot(), fp)
+    os.replace(tmp, path)
+
+
+def _merge(snapshots) -> Dict[str, dict]:
+    out: Dict[str, dict] = {}
+    for snap in snapshots:
+        for name, m in snap.items():
+            agg = out.setdefault(name, {**m, "values": {}})
+            for labels, v in m["values"]:
+                key = tuple(labels)
+                if isinstance(v, list):
+                    cur = agg["values"].get(key)
+                    agg["values"][key] = v if cur is None else [a + b for a, b in zip(cur, v)]
+                else:
+                    agg["values"][key] = agg["values"].get(key, 0) + v
+    return out
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) and not float(v).is_integer() else str(int(v))
+
+
+def render() -> str:
+    """Prometheus 文本格式（0.0.4）。"""
+    if Config.METRICS_DIR:
+        flush(force=True)
+        snaps = []
+        for n in os.listdir(Config.METRICS_DIR):
+            if n.endswith(".json"):
+                try:
+                    with open(os.path.join(Config.METRICS_DIR, n), encoding="utf-8") as fp:
+                        snaps.append(json.load(fp))
+                except (OSError, ValueError):
+                    continue
+    else:
+        snaps = [_snapshot()]
+
+    lines: List[str] = []
+    for name, m in sorted(_merge(snaps).items()):
+        lines.append(f"# HELP {name} {m['doc']}")
+        lines.append(f"# TYPE {name} {m['kind']}")
+        for labels, v in sorted(m["values"].items()):
+            if m["kind"] == "histogram":
+                names, acc = m["labels"], 0
+                for b, c in zip(m["buckets"], v):
+                    acc += c
+                    lines.append(f"{name}_bucket{_fmt_labels(names, labels, 'le=%s' % json.dumps(_num(b)))} {acc}")
+                lines.append(f"{name}_bucket{_fmt_labels(names, labels, 'le=%s' % json.dumps('+Inf'))} {v[-1]}")
+                lines.append(f"{name}_sum{_fmt_labels(names, labels)} {_num(v[-2])}")
+                lines.append(f"{name}_count{_fmt_labels(names, labels)} {v[-1]}")
+            else:
+                lines.append(f"{name}{_fmt_labels(m['labels'], labels)} {_num(v)}")
+    return "\n".join(lines) + "\n"
+
+
+def init_metrics(app):
+    """注册请求计时钩子；/metrics 与静态文件不计入。"""
+    from flask import request
+
+    @app.before_request
+    def _metrics_start():
+        if request.endpoint in ("metrics_bp.metrics", "static"):
+            _LOCAL.req = None
+            return
+        _LOCAL.req = {"t0": time.perf_counter(), "queries": 0, "connections": 0, "status": 500}
+
+    @app.after_request
+    def _metrics_status(response):
+        req = request_counts()
+        if req is not None:
+            req["status"] = response.status_code
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        req = request_counts()
+        _LOCAL.req = None
+        if req is None:
+            return
+        endpoint = request.endpoint or "none"
+        HTTP_SECONDS.observe(time.perf_counter() - req["t0"], endpoint, request.method, req["status"])
+        HTTP_DB_QUERIES.observe(req["queries"], endpoint)
+        HTTP_DB_CONNECTIONS.observe(req["connections"], endpoint)
+        try:
+            flush()
+        except OSError as e:
+            app.logger.warning("metrics flush failed: %s", e)
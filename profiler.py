@@ -0,0 +1,210 @@
+"""
+按需请求剖析（采样式）：
+  - 触发：请求头 Config.PROFILE_HEADER 的值等于 Config.PROFILE_TOKEN，或按 PROFILE_SAMPLE_RATE 随机抽样
+  - 剖析期间由后台线程每 PROFILE_INTERVAL_MS 毫秒读一次请求线程的调用栈，累计成折叠栈
+    （"根;…;叶 次数"，flamegraph.pl / speedscope 可直接读取），请求本身不插桩
+  - 每个请求一个 JSON 存入 PROFILE_DIR，最多保留 PROFILE_KEEP 个，超出删最旧
+  - 两项都未配置时 init_profiler 不注册任何钩子，零开销
+查看：/admin/profiles/（近期最慢的请求）
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from config import Config
+
+_ID_RE = re.compile(r"^[0-9a-f]{16}$")
+_SKIP_PREFIXES = ("/static/", "/admin/profiles")
+
+
+class _Sampler:
+    """单个后台线程轮流采样所有正在剖析的请求线程；无剖析请求时阻塞等待。"""
+
+    def __init__(self):
+        self._active: Dict[int, Counter] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._labels: Dict[Any, str] = {}
+
+    def start(self, tid: int):
+        with self._lock:
+            self._active[tid] = Counter()
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._loop, name="profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, tid: int) -> Counter:
+        with self._lock:
+            return self._active.pop(tid, None) or Counter()
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+            self._labels[code] = label
+        return label
+
+    def _fold(self, frame) -> str:
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                idle = not self._active
+                if idle:
+                    self._wake.clear()
+            if idle:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            with self._lock:
+                for tid, counter in self._active.items():
+                    f = frames.get(tid)
+                    if f is not None:
+                        counter[self._fold(f)] += 1
+            del frames
+            time.sleep(Config.PROFILE_INTERVAL_MS / 1000.0)
+
+
+_SAMPLER = _Sampler()
+
+
+def _path(profile_id: str) -> str:
+    return os.path.join(Config.PROFILE_DIR, f"{profile_id}.json")
+
+
+def _prune():
+    names = [n for n in os.listdir(Config.PROFILE_DIR) if n.endswith(".json")]
+    if len(names) <= Config.PROFILE_KEEP:
+        return
+    paths = sorted((os.path.join(Config.PROFILE_DIR, n) for n in names), key=os.path.getmtime)
+    for p in paths[:len(paths) - Config.PROFILE_KEEP]:
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+
+def _save(meta: Dict[str, Any], stacks: Counter):
+    os.makedirs(Config.PROFILE_DIR, exist_ok=True)
+    with open(_path(meta["id"]), "w", encoding="utf-8") as fp:
+        json.dump({**meta, "stacks": dict(stacks)}, fp, ensure_ascii=False)
+    _prune()
+
+
+def init_profiler(app):
+    """应用启动时调用：未配置口令与抽样率时什么也不注册。"""
+    token, rate = Config.PROFILE_TOKEN, Config.PROFILE_SAMPLE_RATE
+    if not token and rate <= 0:
+        return
+    from flask import g, request
+
+    @app.before_request
+    def _profile_start():
+        if request.path.startswith(_SKIP_PREFIXES):
+            return
+        by_header = bool(token) and request.headers.get(Config.PROFILE_HEADER) == token
+        if not by_header and not (rate > 0 and random.random() < rate):
+            return
+        g._profile = {
+            "id": uuid.uuid4().hex[:16],
+            "tid": threading.get_ident(),
+            "t0": time.perf_counter(),
+            "started_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "trigger": "header" if by_header else "sample",
+        }
+        _SAMPLER.start(g._profile["tid"])
+
+    @app.after_request
+    def _profile_mark(response):
+        prof = g.get("_profile")
+        if prof is not None:
+            prof["status"] = response.status_code
+            response.headers["X-Profile-Id"] = prof["id"]
+        return response
+
+    @app.teardown_request
+    def _profile_stop(exc):
+        prof = g.pop("_profile", None)
+        if prof is None:
+            return
+        stacks = _SAMPLER.stop(prof["tid"])
+        meta = {
+            "id": prof["id"],
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "status": prof.get("status", 500 if exc else None),
+            "duration_ms": round((time.perf_counter() - prof["t0"]) * 1000, 1),
+            "samples": sum(stacks.values()),
+            "interval_ms": Config.PROFILE_INTERVAL_MS,
+            "started_at": prof["started_at"],
+            "trigger": prof["trigger"],
+        }
+        try:
+            _save(meta, stacks)
+        except Exception as e:
+            app.logger.warning("profile save failed: %s", e)
+
+
+# ===== 查看 =====
+
+def get_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    if not _ID_RE.match(profile_id or ""):
+        return None
+    try:
+        with open(_path(profile_id), encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def list_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    """近期剖析记录（不含调用栈），按耗时从高到低。"""
+    if not os.path.isdir(Config.PROFILE_DIR):
+        return []
+    out = []
+    for n in os.listdir(Config.PROFILE_DIR):
+        if n.endswith(".json"):
+            prof = get_profile(n[:-5])
+            if prof:
+                prof.pop("stacks", None)
+                out.append(prof)
+    out.sort(key=lambda p: p.get("duration_ms") or 0, reverse=True)
+    return out[:limit]
+
+
+def folded_text(profile: Dict[str, Any]) -> str:
+    """折叠栈文本：每行 "根;…;叶 采样数"。"""
+    stacks = profile.get("stacks") or {}
+    return "\n".join(f"{k} {v}" for k, v in sorted(stacks.items(), key=lambda kv: -kv[1])) + "\n"
+
+
+def top_frames(profile: Dict[str, Any], n: int = 30) -> List[Dict[str, Any]]:
+    """按函数汇总：self = 位于栈顶的采样数，total = 出现在栈中的采样数（同栈重复只计一次）。"""
+    self_c, total_c = Counter(), Counter()
+    for stack, cnt in (profile.get("stacks") or {}).items():
+        frames = stack.split(";")
+        self_c[frames[-1]] += cnt
+        for f in set(frames):
+            total_c[f] += cnt
+    samples = profile.get("samples") or 1
+    return [
+        {"frame": f, "self": self_c.get(f, 0), "total": t, "total_pct": round(100.0 * t / samples, 1)}
+        for f, t in sorted(total_c.items(), key=lambda kv: (-self_c.get(kv[0], 0), -kv[1]))[:n]
+    ]
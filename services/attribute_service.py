@@ -1,5 +1,6 @@
 # services/attribute_service.py
 from db import get_conn  # 引入数据库连接函数
+from cache import cached, invalidate  # 参考数据缓存
 
 # 允许的属性作用域列表
 ALLOWED_SCOPES = ["device", "port"]
@@ -7,6 +8,7 @@ ALLOWED_SCOPES = ["device", "port"]
 ALLOWED_DTYPES = ["text", "int", "decimal", "bool", "date", "enum", "json"]
 
 # 列出所有属性，根据提供的作用域过滤
+@cached("attribute")
 def list_attributes(scope=None):
     sql = "SELECT id, code, name, scope, data_type, allow_multi FROM attribute_def"  # 基础SQL查询语句
     args = []  # 参数列表
@@ -52,6 +54,7 @@ def list_attributes_paged(q="", scope="", data_type="", page=1, page_size=10):
             return rows, total  # 返回查询结果和总记录数
 
 # 根据属性ID获取单个属性的详细信息
+@cached("attribute")
 def get_attribute(attr_id):
     with get_conn() as conn:  # 获取数据库连接
         with conn.cursor() as cur:  # 创建游标对象
@@ -66,6 +69,7 @@ def create_attribute(code, name, scope, data_type, unit, min_value, max_value, a
     with get_conn() as conn:  # 获取数据库连接
         with conn.cursor() as cur:  # 创建游标对象
             cur.execute(sql, (code, name, scope, data_type, unit, min_value, max_value, allow_multi, description))  # 执行插入操作
+            invalidate("attribute", cur=cur)  # 失效属性缓存
             return cur.lastrowid  # 返回新插入记录的ID
 
 # 更新现有属性的信息
@@ -77,9 +81,11 @@ def update_attribute(attr_id, code, name, scope, data_type, unit, min_value, max
     with get_conn() as conn:  # 获取数据库连接
         with conn.cursor() as cur:  # 创建游标对象
             cur.execute(sql, (code, name, scope, data_type, unit, min_value, max_value, allow_multi, description, attr_id))  # 执行更新操作
+            invalidate("attribute", cur=cur)  # 失效属性缓存
 
 # 根据属性ID删除属性
 def delete_attribute(attr_id):
     with get_conn() as conn:  # 获取数据库连接
         with conn.cursor() as cur:  # 创建游标对象
             cur.execute("DELETE FROM attribute_def WHERE id=%s", (attr_id,))  # 执行删除操作
+            invalidate("attribute", "option", cur=cur)  # 失效属性缓存（选项随外键级联删除）
@@ -0,0 +1,138 @@
+# services/cable_view_service.py
+"""
+线缆清册读模型 cable_view：每条 CONNECTED 连线一行，冗余两端的设备/端口/类型名称、标签与排序键。
+清册列表、打印、导出只读这一张表（按 (project_id, sort_key) 索引分页），不再做六表联接。
+
+维护方式：写入方在同一事务里调用 sync_*，按条件用 INSERT ... SELECT 重算受影响的行：
+  - 建连 / 批量建连 / 规划转正 → sync_links / sync_ports / sync_plan
+  - 设备改名 → sync_devices；端口类型改名 → sync_port_type；项目改名（标签含项目名）→ sync_project
+  - 删除连线（含端口、设备、项目级联删除）由外键 ON DELETE CASCADE 自动清理
+  - 打印标记随 link 同步更新（mark_links_printed）
+全量重建：rebuild_cable_view() 或 python -m tools.rebuild_cable_view
+"""
+from typing import Any, NamedTuple, Optional, Sequence
+
+from db import get_conn
+
+_PROJECTION = """
+    INSERT INTO cable_view (
+        link_id, project_id,
+        a_device_id, a_device_name, a_port_id, a_port_name, a_port_type_id, a_port_type_name, a_label,
+        b_device_id, b_device_name, b_port_id, b_port_name, b_port_type_id, b_port_type_name, b_label,
+        sort_key, printed, printed_at
+    )
+    SELECT l.id, l.project_id,
+           da.id, da.name, pa.id, pa.name, ta.id, ta.name, CONCAT(pr.name, '-', da.name, '-', pa.name),
+           db.id, db.name, pb.id, pb.name, tb.id, tb.name, CONCAT(pr.name, '-', db.name, '-', pb.name),
+           LEFT(CONCAT_WS(' ', LEFT(COALESCE(da.sort_key, da.name), 255), COALESCE(ta.name, ''),
+                          LEFT(COALESCE(pa.sort_key, pa.name), 255)), 700),
+           l.printed, l.printed_at
+    FROM link l
+    JOIN project pr ON pr.id = l.project_id
+    JOIN port pa ON pa.id = l.a_port_id
+    JOIN device da ON da.id = l.a_device_id
+    LEFT JOIN port_type ta ON ta.id = pa.port_type_id
+    JOIN port pb ON pb.id = l.b_port_id
+    JOIN device db ON db.id = l.b_device_id
+    LEFT JOIN port_type tb ON tb.id = pb.port_type_id
+    WHERE l.status = 'CONNECTED' AND ({where})
+    ON DUPLICATE KEY UPDATE
+        a_device_name=VALUES(a_device_name), a_port_name=VALUES(a_port_name),
+        a_port_type_id=VALUES(a_port_type_id), a_port_type_name=VALUES(a_port_type_name), a_label=VALUES(a_label),
+        b_device_name=VALUES(b_device_name), b_port_name=VALUES(b_port_name),
+        b_port_type_id=VALUES(b_port_type_id), b_port_type_name=VALUES(b_port_type_name), b_label=VALUES(b_label),
+        sort_key=VALUES(sort_key), printed=VALUES(printed), printed_at=VALUES(printed_at)
+"""
+
+class CableRow(NamedTuple):
+    """清册一行（清册 / 打印 / 导出共用）；按列序从元组游标映射，不为每行建 dict。"""
+    link_id: int
+    printed: int
+    printed_at: Any
+    a_device_id: int
+    a_device_name: str
+    a_port_id: int
+    a_port_name: str
+    a_port_type_id: Optional[int]
+    a_port_type_name: Optional[str]
+    a_label: str
+    b_device_id: int
+    b_device_name: str
+    b_port_id: int
+    b_port_name: str
+    b_port_type_id: Optional[int]
+    b_port_type_name: Optional[str]
+    b_label: str
+
+    @property
+    def from_to(self) -> str:
+        return f"{self.a_label} / {self.b_label}"
+
+    @property
+    def to_from(self) -> str:
+        return f"{self.b_label} / {self.a_label}"
+
+
+# 读模型列（与 CableRow 字段同序）
+CABLE_COLUMNS = ", ".join(CableRow._fields)
+
+
+def _sync(cur, where: str, params: Sequence) -> int:
+    cur.execute(_PROJECTION.format(where=where), tuple(params))
+    return int(cur.rowcount or 0)
+
+
+def _in(ids: Sequence[int]) -> str:
+    return ",".join(["%s"] * len(ids))
+
+
+def sync_links(cur, link_ids: Sequence[int]) -> int:
+    ids = [int(x) for x in link_ids]
+    return _sync(cur, f"l.id IN ({_in(ids)})", ids) if ids else 0
+
+
+def sync_ports(cur, project_id: int, a_port_ids: Sequence[int]) -> int:
+    """按 A 端端口刷新（link 上 (project_id, a_port_id) 唯一，走索引）。"""
+    ids = [int(x) for x in a_port_ids]
+    if not ids:
+        return 0
+    return _sync(cur, f"l.project_id=%s AND l.a_port_id IN ({_in(ids)})", [project_id, *ids])
+
+
+def sync_plan(cur, project_id: int, plan_batch: str) -> int:
+    return _sync(cur, "l.project_id=%s AND l.plan_batch=%s", (project_id, plan_batch))
+
+
+def sync_devices(cur, device_ids: Sequence[int]) -> int:
+    ids = [int(x) for x in device_ids]
+    if not ids:
+        return 0
+    n = _sync(cur, f"l.a_device_id IN ({_in(ids)})", ids)
+    return n + _sync(cur, f"l.b_device_id IN ({_in(ids)})", ids)
+
+
+def sync_port_type(cur, port_type_id: int) -> int:
+    n = _sync(cur, "pa.port_type_id=%s", (port_type_id,))
+    return n + _sync(cur, "pb.port_type_id=%s", (port_type_id,))
+
+
+def sync_project(cur, project_id: int) -> int:
+    return _sync(cur, "l.project_id=%s", (project_id,))
+
+
+def rebuild_cable_view(project_id: int = None) -> int:
+    """清空并重建读模型（单项目或全部），返回写入行数。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        conn.begin()
+        try:
+            if project_id is None:
+                cur.execute("DELETE FROM cable_view")
+                n = _sync(cur, "1=1", ())
+            else:
+                cur.execute("DELETE FROM cable_view WHERE project_id=%s", (project_id,))
+                n = sync_project(cur, project_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return n
@@ -0,0 +1,180 @@
+# services/clone_service.py
+"""
+项目深拷贝：设备、端口（含拆分端口树）、设备/端口属性值，可选连线。
+
+全部用集合化 INSERT ... SELECT 完成，新旧 id 的对应关系写入 clone_id_map：
+  1) 新建项目（state='CLONING' 并打 deleted_at 标记：拷贝完成前不可见，续删任务也不会动它；
+     失败则交给 purge_project 清理）
+  2) 设备 INSERT ... SELECT → 按 (项目, 设备名) 唯一键回填设备映射
+  3) 端口 INSERT ... SELECT → 按 (设备, 端口名) 唯一键回填端口映射
+  4) 经端口映射改写 parent_port_id，逐层补物化路径（层数 = 端口树深度）
+  5) 属性值、连线（经映射换成新 id），按新项目连线设置连接计数、刷新清册读模型
+语句数与数据量无关，只与端口树深度有关。
+"""
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from cache import invalidate
+from db import get_conn
+from services.cable_view_service import sync_project
+from services.device_service import PATH_SEG_WIDTH
+from services.purge_service import purge_project
+
+
+def _map_rows(cur, clone_id: str, entity: str, select_sql: str, params) -> int:
+    cur.execute(
+        f"INSERT INTO clone_id_map (clone_id, entity, old_id, new_id) SELECT %s, %s, x.old_id, x.new_id FROM ({select_sql}) x",
+        (clone_id, entity, *params),
+    )
+    return int(cur.rowcount or 0)
+
+
+def clone_project(src_pid: int, name: str, with_links: bool = True,
+                  progress: Optional[Callable] = None) -> Dict[str, Any]:
+    """
+    复制项目 src_pid 为新项目 name；with_links=False 时只复制设备与端口。
+    返回 {"project_id": 新项目 id, "devices": n, "ports": n, "links": n, ...}
+    """
+    name = (name or "").strip()
+    if not name:
+        raise ValueError("项目名称必填")
+    clone_id = uuid.uuid4().hex[:16]
+    counts: Dict[str, Any] = {}
+
+    def step(key: str, n: int):
+        counts[key] = n
+        if progress:
+            progress(**counts)
+
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, remark FROM project WHERE id=%s AND deleted_at IS NULL", (src_pid,))
+        src = cur.fetchone()
+        if not src:
+            raise ValueError("源项目不存在")
+        cur.execute("INSERT INTO project (name, remark, deleted_at, state) VALUES (%s, %s, NOW(), 'CLONING')",
+                    (name, src.get("remark")))
+        new_pid = int(cur.lastrowid)
+        counts["project_id"] = new_pid
+
+        try:
+            # ---- 设备 ----
+            cur.execute("""
+                INSERT INTO device (project_id, template_id, name, model_code, serial_no, created_by,
+                                    port_sync_rev, port_sync_sum, sort_key)
+                SELECT %s, template_id, name, model_code, serial_no, created_by,
+                       port_sync_rev, port_sync_sum, sort_key
+                FROM device
+                WHERE project_id=%s AND deleted_at IS NULL
+            """, (new_pid, src_pid))
+            step("devices", int(cur.rowcount or 0))
+            _map_rows(cur, clone_id, "device", """
+                SELECT s.id AS old_id, n.id AS new_id
+                FROM device s JOIN device n ON n.project_id=%s AND n.name = s.name
+                WHERE s.project_id=%s AND s.deleted_at IS NULL
+            """, (new_pid, src_pid))
+
+            # ---- 端口（link_count 先置 0，连线复制后统一重算） ----
+            cur.execute("""
+                INSERT INTO port (device_id, name, port_template_id, port_type_id, index_no,
+                                  is_active, max_links, sort_key)
+                SELECT m.new_id, p.name, p.port_template_id, p.port_type_id, p.index_no,
+                       p.is_active, p.max_links, p.sort_key
+                FROM clone_id_map m
+                JOIN port p ON p.device_id = m.old_id
+                WHERE m.clone_id=%s AND m.entity='device'
+            """, (clone_id,))
+            step("ports", int(cur.rowcount or 0))
+            _map_rows(cur, clone_id, "port", """
+                SELECT o.id AS old_id, n.id AS new_id
+                FROM clone_id_map m
+                JOIN port o ON o.device_id = m.old_id
+                JOIN port n ON n.device_id = m.new_id AND n.name = o.name
+                WHERE m.clone_id=%s AND m.entity='device'
+            """, (clone_id,))
+
+            # ---- 端口树：父端口改指新 id，再自根向下逐层补路径 ----
+            cur.execute("""
+                UPDATE clone_id_map m
+                JOIN port o ON o.id = m.old_id
+                JOIN clone_id_map mp ON mp.clone_id = m.clone_id AND mp.entity='port' AND mp.old_id = o.parent_port_id
+                JOIN port n ON n.id = m.new_id
+                SET n.parent_port_id = mp.new_id
+                WHERE m.clone_id=%s AND m.entity='port'
+            """, (clone_id,))
+            cur.execute(f"""
+                UPDATE clone_id_map m
+                JOIN port n ON n.id = m.new_id
+                SET n.path = LPAD(n.id, {PATH_SEG_WIDTH}, '0')
+                WHERE m.clone_id=%s AND m.entity='port' AND n.parent_port_id IS NULL
+            """, (clone_id,))
+            depth = 0
+            while True:
+                cur.execute(f"""
+                    UPDATE clone_id_map m
+                    JOIN port c ON c.id = m.new_id
+                    JOIN port p ON p.id = c.parent_port_id
+                    SET c.path = CONCAT(p.path, '/', LPAD(c.id, {PATH_SEG_WIDTH}, '0'))
+                    WHERE m.clone_id=%s AND m.entity='port' AND c.path IS NULL AND p.path IS NOT NULL
+                """, (clone_id,))
+                if not cur.rowcount:
+                    break
+                depth += 1
+            step("tree_depth", depth)
+
+            # ---- 属性值 ----
+            cur.execute("""
+                INSERT INTO device_attr_value (device_id, attribute_id, option_id, value_text)
+                SELECT m.new_id, v.attribute_id, v.option_id, v.value_text
+                FROM clone_id_map m
+                JOIN device_attr_value v ON v.device_id = m.old_id
+                WHERE m.clone_id=%s AND m.entity='device'
+            """, (clone_id,))
+            step("device_values", int(cur.rowcount or 0))
+            cur.execute("""
+                INSERT INTO port_attr_value (port_id, attribute_id, option_id, value_text)
+                SELECT m.new_id, v.attribute_id, v.option_id, v.value_text
+                FROM clone_id_map m
+                JOIN port_attr_value v ON v.port_id = m.old_id
+                WHERE m.clone_id=%s AND m.entity='port'
+            """, (clone_id,))
+            step("port_values", int(cur.rowcount or 0))
+
+            # ---- 连线（打印状态不复制） ----
+            if with_links:
+                cur.execute("""
+                    INSERT INTO link (project_id, a_device_id, a_port_id, b_device_id, b_port_id,
+                                      status, remark, plan_batch, created_at)
+                    SELECT %s, da.new_id, pa.new_id, db.new_id, pb.new_id,
+                           l.status, l.remark, l.plan_batch, NOW()
+                    FROM link l
+                    JOIN clone_id_map pa ON pa.clone_id=%s AND pa.entity='port' AND pa.old_id = l.a_port_id
+                    JOIN clone_id_map pb ON pb.clone_id=%s AND pb.entity='port' AND pb.old_id = l.b_port_id
+                    JOIN clone_id_map da ON da.clone_id=%s AND da.entity='device' AND da.old_id = l.a_device_id
+                    JOIN clone_id_map db ON db.clone_id=%s AND db.entity='device' AND db.old_id = l.b_device_id
+                    WHERE l.project_id=%s
+                """, (new_pid, clone_id, clone_id, clone_id, clone_id, src_pid))
+                step("links", int(cur.rowcount or 0))
+                cur.execute("""
+                    UPDATE port p
+                    JOIN (
+                        SELECT port_id, COUNT(*) AS c
+                        FROM (
+                            SELECT a_port_id AS port_id FROM link WHERE project_id=%s AND status='CONNECTED'
+                            UNION ALL
+                            SELECT b_port_id FROM link WHERE project_id=%s AND status='CONNECTED'
+                        ) x
+                        GROUP BY port_id
+                    ) y ON y.port_id = p.id
+                    SET p.link_count = y.c
+                """, (new_pid, new_pid))
+                sync_project(cur, new_pid)
+        except Exception:
+            cur.execute("DELETE FROM clone_id_map WHERE clone_id=%s", (clone_id,))
+            purge_project(new_pid)
+            raise
+
+        cur.execute("DELETE FROM clone_id_map WHERE clone_id=%s", (clone_id,))
+        # 拷贝完成才对外可见
+        cur.execute("UPDATE project SET deleted_at=NULL, state='READY' WHERE id=%s", (new_pid,))
+        invalidate("project", cur=cur)
+    return counts
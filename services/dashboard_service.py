@@ -0,0 +1,146 @@
+# services/dashboard_service.py
+"""
+项目看板：端口使用率（按设备 / 端口类型 / 端口规则属性）与连线统计。
+
+  - 端口统计一条 GROUP BY（设备 × 端口类型 × 规则属性）得到细粒度计数，再在内存中汇总成三个维度；
+  - 连线统计一条 GROUP BY（状态 × 是否已打印）；
+  - 结果以 JSON 存入 project_summary，按 project.rev 判断是否过期（连线、端口、设备变化都会 +1）。
+"""
+import json
+from typing import Any, Dict
+
+from db import get_conn
+
+
+def _port_usage_rows(cur, project_id: int):
+    """
+    每个 (设备, 端口类型, 规则属性) 的端口总数 / 已用 / 停用。
+    已用 = 启用且至少有一条 CONNECTED 连线（读 port.link_count）。
+    """
+    cur.execute("""
+        SELECT p.device_id,
+               p.port_type_id,
+               COALESCE(pt.name, '') AS attr_name,
+               COUNT(*) AS total,
+               SUM(p.is_active = 0) AS inactive,
+               SUM(p.is_active = 1 AND p.link_count > 0) AS used
+        FROM port p
+        JOIN device d ON d.id = p.device_id
+        LEFT JOIN port_template pt ON pt.id = p.port_template_id
+        WHERE d.project_id=%s AND d.deleted_at IS NULL
+        GROUP BY p.device_id, p.port_type_id, COALESCE(pt.name, '')
+    """, (project_id,))
+    return cur.fetchall() or []
+
+
+def _link_stats(cur, project_id: int) -> Dict[str, Any]:
+    cur.execute("""
+        SELECT status, printed, COUNT(*) AS c
+        FROM link
+        WHERE project_id=%s
+        GROUP BY status, printed
+    """, (project_id,))
+    by_status: Dict[str, int] = {}
+    printed = unprinted = 0
+    for r in cur.fetchall() or []:
+        c = int(r["c"])
+        by_status[r["status"]] = by_status.get(r["status"], 0) + c
+        if r["status"] == "CONNECTED":
+            if r["printed"]:
+                printed += c
+            else:
+                unprinted += c
+    return {"by_status": by_status, "printed": printed, "unprinted": unprinted}
+
+
+def _bucket(d: Dict, key, label: str) -> Dict[str, Any]:
+    b = d.get(key)
+    if b is None:
+        b = d[key] = {"key": key, "label": label, "total": 0, "used": 0, "inactive": 0, "free": 0}
+    return b
+
+
+def build_project_summary(project_id: int) -> Dict[str, Any]:
+    """现算看板数据（不读缓存）。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT d.id, d.name, d.model_code, dt.device_type
+            FROM device d
+            LEFT JOIN device_template dt ON dt.id = d.template_id
+            WHERE d.project_id=%s AND d.deleted_at IS NULL
+            ORDER BY d.sort_key, d.id
+        """, (project_id,))
+        devices = cur.fetchall() or []
+        cur.execute("SELECT id, name FROM port_type")
+        type_names = {r["id"]: r["name"] for r in cur.fetchall() or []}
+        rows = _port_usage_rows(cur, project_id)
+        links = _link_stats(cur, project_id)
+
+    by_device: Dict[Any, Dict[str, Any]] = {}
+    for d in devices:
+        b = _bucket(by_device, d["id"], d["name"])
+        b.update({"model_code": d.get("model_code") or "", "device_type": d.get("device_type") or ""})
+    by_type: Dict[Any, Dict[str, Any]] = {}
+    by_attr: Dict[Any, Dict[str, Any]] = {}
+    totals = {"total": 0, "used": 0, "inactive": 0, "free": 0}
+
+    for r in rows:
+        total, used, inactive = int(r["total"]), int(r["used"] or 0), int(r["inactive"] or 0)
+        buckets = (
+            _bucket(by_device, r["device_id"], str(r["device_id"])),
+            _bucket(by_type, r["port_type_id"] or 0, type_names.get(r["port_type_id"]) or "未分类"),
+            _bucket(by_attr, r["attr_name"], r["attr_name"] or "（未命名属性）"),
+            totals,
+        )
+        for b in buckets:
+            b["total"] += total
+            b["used"] += used
+            b["inactive"] += inactive
+            b["free"] += total - used - inactive
+
+    def ordered(d):
+        return sorted(d.values(), key=lambda b: (-b["total"], b["label"]))
+
+    return {
+        "devices": len(devices),
+        "ports": totals,
+        "by_device": list(by_device.values()),
+        "by_port_type": ordered(by_type),
+        "by_attr": ordered(by_attr),
+        "links": links,
+    }
+
+
+def get_project_summary(project_id: int, refresh: bool = False) -> Dict[str, Any]:
+    """
+    读看板缓存：project_summary.rev 与 project.rev 一致时直接返回，否则现算并回写。
+    返回的数据额外带 rev / built_at。
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT p.rev, s.rev AS cached_rev, s.payload, s.built_at
+            FROM project p
+            LEFT JOIN project_summary s ON s.project_id = p.id
+            WHERE p.id=%s
+        """, (project_id,))
+        row = cur.fetchone()
+    if not row:
+        raise ValueError("项目不存在")
+    if not refresh and row["payload"] and row["cached_rev"] == row["rev"]:
+        data = json.loads(row["payload"])
+        data.update({"rev": row["rev"], "built_at": row["built_at"]})
+        return data
+
+    # 版本号取在计算之前：计算期间若有写入，下次读取仍会判定过期
+    rev = row["rev"]
+    data = build_project_summary(project_id)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO project_summary (project_id, rev, payload, built_at)
+            VALUES (%s, %s, %s, NOW())
+            ON DUPLICATE KEY UPDATE rev=VALUES(rev), payload=VALUES(payload), built_at=VALUES(built_at)
+        """, (project_id, rev, json.dumps(data, ensure_ascii=False)))
+        cur.execute("SELECT built_at FROM project_summary WHERE project_id=%s", (project_id,))
+        built = cur.fetchone()
+    data.update({"rev": rev, "built_at": built["built_at"] if built else None})
+    return data
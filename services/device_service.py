@@ -1,8 +1,15 @@
 # services/device_service.py
 import re
-from db import get_conn
-from typing import Dict, List
+from db import get_conn, read_only
+from cache import cached, invalidate
+from typing import Dict, List, Optional
 from services.option_service import list_options
+from services.naming_rule import NamingRule, RuleMatcher, compile_rule, escape_literal, sort_key, SORT_KEY_MAX
+from services.project_service import bump_project_rev, bump_project_rev_for_devices
+from services.link_service import release_far_ends
+from services.cable_view_service import sync_devices
+from services.job_service import submit_job
+from services.purge_service import purge_device
 
 # -------- 设备基础 --------
 
@@ -12,6 +19,7 @@ def list_devices():
            dt.name AS template_name, dt.device_type
     FROM device d
     LEFT JOIN device_template dt ON dt.id = d.template_id
+    WHERE d.deleted_at IS NULL
     ORDER BY d.id DESC
     """
     with get_conn() as conn:
@@ -19,12 +27,28 @@ def list_devices():
             cur.execute(sql)
             return cur.fetchall()
 
+# 模板端口规则校验和：规则条数 + 各条规则内容 CRC32 的异或（不受 GROUP_CONCAT 长度限制）
+_PORT_RULES_SUM_SQL = """
+    SELECT CONCAT(COUNT(*), '-', BIT_XOR(CRC32(CONCAT_WS('|',
+               id, code, name, qty, port_type_id, naming_rule, max_links, sort_order))))
+    FROM port_template
+    WHERE template_id = {template_id}
+"""
+
+
 def get_device(device_id: int):
-    sql = """
-    SELECT d.*, dt.name AS template_name, dt.device_type
+    """
+    设备 + 模板信息；port_sync_needed 表示模板端口规则（版本号/校验和）
+    自上次对账后已变化，需要补齐端口。同一条查询返回，无需额外往返。
+    """
+    sql = f"""
+    SELECT d.*, dt.name AS template_name, dt.device_type,
+           NOT (d.port_sync_rev <=> dt.port_rev
+                AND d.port_sync_sum <=> ({_PORT_RULES_SUM_SQL.format(template_id="d.template_id")})
+           ) AS port_sync_needed
     FROM device d
     LEFT JOIN device_template dt ON dt.id = d.template_id
-    WHERE d.id=%s
+    WHERE d.id=%s AND d.deleted_at IS NULL
     """
     with get_conn() as conn:
         with conn.cursor() as cur:
@@ -35,7 +59,8 @@ def update_device_basic(device_id: int, name: str, model_code: str, new_template
     """
     修改设备基本信息；
     - 仅改名称/型号：更新 device 表即可；
-    - 若切换模板：需要清理设备/端口的属性值与端口实例，再按新模板重建端口实例。
+    - 若切换模板：按新模板就地迁移端口（见 migrate_device_template），
+      仍匹配的端口连同连线、属性值一并保留，只增删差异部分。
     """
     with get_conn() as conn:
         with conn.cursor() as cur:
@@ -47,88 +72,246 @@ def update_device_basic(device_id: int, name: str, model_code: str, new_template
             old_template_id = row["template_id"]
 
             # 先更新名称/型号
-            cur.execute("UPDATE device SET name=%s, model_code=%s WHERE id=%s",
-                        (name, model_code, device_id))
-
-            # 若不换模板，结束
-            if new_template_id is None or int(new_template_id) == int(old_template_id):
-                return True
-
-            # 切换模板：清理旧数据
-            # 1) 清设备属性值
-            cur.execute("DELETE FROM device_attr_value WHERE device_id=%s", (device_id,))
-            # 2) 找出端口
-            cur.execute("SELECT id FROM port WHERE device_id=%s", (device_id,))
-            port_rows = cur.fetchall()
-            port_ids = [r["id"] for r in port_rows] if port_rows else []
-            if port_ids:
-                # 2.1) 清端口属性值
-                cur.execute(
-                    "DELETE FROM port_attr_value WHERE port_id IN (%s)" % (
-                        ",".join(["%s"] * len(port_ids))
-                    ),
-                    tuple(port_ids)
-                )
-                # 2.2) 删端口
-                cur.execute(
-                    "DELETE FROM port WHERE id IN (%s)" % (
-                        ",".join(["%s"] * len(port_ids))
-                    ),
-                    tuple(port_ids)
-                )
+            cur.execute("UPDATE device SET name=%s, model_code=%s, sort_key=%s WHERE id=%s",
+                        (name, model_code, sort_key(name), device_id))
+            sync_devices(cur, [device_id])
+            # 改名不影响拓扑（冗余分析每次现取名称）
+            bump_project_rev_for_devices(cur, [device_id], topology=False)
+
+    # 若不换模板，结束
+    if new_template_id is None or int(new_template_id) == int(old_template_id):
+        return True
 
-            # 3) 更新设备模板
-            cur.execute("UPDATE device SET template_id=%s WHERE id=%s",
-                        (new_template_id, device_id))
+    migrate_device_template(device_id, int(new_template_id))
+    return True
 
-        # 4) 按新模板生成端口实例
-        _ensure_ports_for_device(new_template_id, device_id)
 
-    return True
+REPORT_NAME_LIMIT = 200  # 迁移报告中列出的端口名上限
 
 
-def delete_device(device_id: int):
+def _plan_template_migration(cur, device_id: int, new_template_id: int):
     """
-    删除设备（含：端口属性值 -> 端口 -> 设备属性值 -> 设备）
+    计算设备切换到新模板的端口差异（只读）：
+      - 根端口按新模板规则解析名字，且端口类型一致（任一方未设类型视为一致）→ 保留，改挂到新规则
+      - 其余根端口连同其拆分出的子端口 → 删除
+      - 新规则中未被占用的序号 → 新增（与端口补齐同一套计划）
+    返回 (plan, marker, keep_by_rule, remove_ports, add_rows)
+    """
+    marker = _port_rules_marker(cur, new_template_id)
+    plan = _prepare_port_plan(_load_port_rules(cur, new_template_id))
+    compiled, matcher = plan
+
+    cur.execute("""
+        SELECT id, name, port_type_id, port_template_id, parent_port_id, path
+        FROM port WHERE device_id=%s
+        ORDER BY path, id
+    """, (device_id,))
+    ports = cur.fetchall() or []
+
+    claimed = set()
+    keep_by_rule: Dict[int, List[int]] = {}   # 新规则 id → 保留端口 id
+    removed_paths, remove_ports = [], []
+    for p in ports:
+        path = p.get("path") or ""
+        if p.get("parent_port_id"):
+            # 子端口随父端口去留
+            if any(path.startswith(rp + "/") for rp in removed_paths):
+                remove_ports.append(p)
+            continue
+        hit = None
+        for pos, idx in matcher.match(p["name"]):
+            r = compiled[pos][0]
+            if (pos, idx) in claimed:
+                continue
+            if r.get("port_type_id") and p.get("port_type_id") and r["port_type_id"] != p["port_type_id"]:
+                continue
+            hit = (pos, idx)
+            break
+        if hit is None:
+            remove_ports.append(p)
+            removed_paths.append(path)
+            continue
+        claimed.add(hit)
+        keep_by_rule.setdefault(compiled[hit[0]][0]["id"], []).append(p["id"])
+
+    removed_ids = {p["id"] for p in remove_ports}
+    kept_names = [p["name"] for p in ports if p["id"] not in removed_ids]
+    add_rows = _plan_missing_ports(plan, kept_names) if compiled else []
+    return plan, marker, keep_by_rule, remove_ports, add_rows
+
+
+def _count_dropped_values(cur, device_id: int, new_template_id: int):
+    """新模板未绑定的属性值条数：(设备属性值, 端口属性值)。"""
+    cur.execute("""
+        SELECT COUNT(*) AS n
+        FROM device_attr_value v
+        LEFT JOIN template_attribute ta ON ta.template_id=%s AND ta.attribute_id=v.attribute_id
+        WHERE v.device_id=%s AND ta.attribute_id IS NULL
+    """, (new_template_id, device_id))
+    dev_n = cur.fetchone()["n"]
+    cur.execute("""
+        SELECT COUNT(*) AS n
+        FROM port_attr_value v
+        JOIN port p ON p.id = v.port_id
+        LEFT JOIN template_attribute ta ON ta.template_id=%s AND ta.attribute_id=v.attribute_id
+        WHERE p.device_id=%s AND ta.attribute_id IS NULL
+    """, (new_template_id, device_id))
+    return dev_n, cur.fetchone()["n"]
+
+
+def migrate_device_template(device_id: int, new_template_id: int, dry_run: bool = False) -> Dict:
+    """
+    设备就地切换模板：
+      - 名字能按新模板规则解析、类型一致的端口原样保留（连线、属性值不动），改挂到新规则
+      - 不再匹配的端口（含其子端口）删除，其连线随外键级联删除
+      - 新模板中缺少的端口批量补齐
+      - 只清理新模板未绑定的设备/端口属性值
+    dry_run=True 时只返回报告、不落库。
+    返回 {"keep", "add", "remove", "links_dropped", "device_values_dropped",
+          "port_values_dropped", "add_names", "remove_names"}
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM device WHERE id=%s", (device_id,))
+        if not cur.fetchone():
+            raise ValueError("设备不存在")
+        cur.execute("SELECT id FROM device_template WHERE id=%s", (new_template_id,))
+        if not cur.fetchone():
+            raise ValueError("模板不存在")
+
+        if not dry_run:
+            conn.begin()
+        try:
+            if not dry_run:
+                # 锁住设备行，避免与补齐/对账并发
+                cur.execute("SELECT id FROM device WHERE id=%s FOR UPDATE", (device_id,))
+            plan, marker, keep_by_rule, remove_ports, add_rows = \
+                _plan_template_migration(cur, device_id, new_template_id)
+            remove_ids = [p["id"] for p in remove_ports]
+
+            links_dropped = 0
+            if remove_ids:
+                in_clause = ",".join(["%s"] * len(remove_ids))
+                # 两端分别走各自的端口索引（OR 会退化为全表扫描或 index_merge）；第二段排除两端都被删的连线
+                cur.execute(
+                    f"""
+                    SELECT (SELECT COUNT(*) FROM link WHERE a_port_id IN ({in_clause}))
+                         + (SELECT COUNT(*) FROM link WHERE b_port_id IN ({in_clause})
+                                                        AND a_port_id NOT IN ({in_clause})) AS n
+                    """,
+                    (*remove_ids, *remove_ids, *remove_ids),
+                )
+                links_dropped = cur.fetchone()["n"]
+            dev_values, port_values = _count_dropped_values(cur, device_id, new_template_id)
+
+            report = {
+                "keep": sum(len(v) for v in keep_by_rule.values()),
+                "add": len(add_rows),
+                "remove": len(remove_ids),
+                "links_dropped": links_dropped,
+                "device_values_dropped": dev_values,
+                "port_values_dropped": port_values,
+                "add_names": [r[0] for r in add_rows[:REPORT_NAME_LIMIT]],
+                "remove_names": [p["name"] for p in remove_ports[:REPORT_NAME_LIMIT]],
+            }
+            if dry_run:
+                return report
+
+            # 1) 删除不再匹配的端口（端口属性值、连线随外键级联；先扣减对端连接数）
+            if remove_ids:
+                release_far_ends(cur, remove_ids)
+                in_clause = ",".join(["%s"] * len(remove_ids))
+                cur.execute(f"DELETE FROM port WHERE device_id=%s AND id IN ({in_clause})",
+                            (device_id, *remove_ids))
+
+            # 2) 保留端口改挂到新规则（每条规则一条 UPDATE）
+            rule_by_id = {r["id"]: r for r, _ in plan[0] if r["id"] is not None}
+            for rule_id, ids in keep_by_rule.items():
+                in_clause = ",".join(["%s"] * len(ids))
+                cur.execute(f"""
+                    UPDATE port
+                    SET port_template_id=%s, port_type_id=COALESCE(port_type_id, %s)
+                    WHERE id IN ({in_clause})
+                """, (rule_id, rule_by_id[rule_id].get("port_type_id") if rule_id else None, *ids))
+
+            # 3) 清理新模板未绑定的属性值
+            cur.execute("""
+                DELETE v FROM device_attr_value v
+                LEFT JOIN template_attribute ta ON ta.template_id=%s AND ta.attribute_id=v.attribute_id
+                WHERE v.device_id=%s AND ta.attribute_id IS NULL
+            """, (new_template_id, device_id))
+            cur.execute("""
+                DELETE v FROM port_attr_value v
+                JOIN port p ON p.id = v.port_id
+                LEFT JOIN template_attribute ta ON ta.template_id=%s AND ta.attribute_id=v.attribute_id
+                WHERE p.device_id=%s AND ta.attribute_id IS NULL
+            """, (new_template_id, device_id))
+
+            # 4) 换模板 → 补齐缺口并记录同步标记
+            cur.execute("UPDATE device SET template_id=%s WHERE id=%s", (new_template_id, device_id))
+            bump_project_rev_for_devices(cur, [device_id])
+            _reconcile_devices(cur, new_template_id, plan, [device_id], marker)
+            # 保留端口的 port_type_id 可能变化：重投影本设备端口上的连线行（类型名、排序键）
+            sync_devices(cur, [device_id])
+            conn.commit()
+        except Exception:
+            if not dry_run:
+                conn.rollback()
+            raise
+    return report
+
+
+DEVICE_NAME_MAX = 255   # device.name 列宽
+
+
+def delete_device(device_id: int) -> str:
+    """
+    删除设备：同一事务内扣减对端端口连接数、删除该设备上的连线并打 deleted_at 标记（立即不可见），
+    端口、属性值与设备行交给后台任务分批清理。返回清理任务 id。
+    名称同时改为 “原名#del<id>”，清理完成前同名设备即可重新创建（uk_device_project_name）。
     """
     with get_conn() as conn:
         with conn.cursor() as cur:
-            # 找端口
             cur.execute("SELECT id FROM port WHERE device_id=%s", (device_id,))
-            port_rows = cur.fetchall()
-            port_ids = [r["id"] for r in port_rows] if port_rows else []
-
-            if port_ids:
-                # 先删端口属性值
-                cur.execute(
-                    "DELETE FROM port_attr_value WHERE port_id IN (%s)" % (
-                        ",".join(["%s"] * len(port_ids))
-                    ),
-                    tuple(port_ids)
-                )
-                # 再删端口
+            port_ids = [r["id"] for r in cur.fetchall() or []]
+
+            conn.begin()
+            try:
+                for i in range(0, len(port_ids), PORT_INSERT_BATCH):
+                    chunk = port_ids[i:i + PORT_INSERT_BATCH]
+                    in_clause = ",".join(["%s"] * len(chunk))
+                    release_far_ends(cur, chunk)
+                    cur.execute(f"DELETE FROM link WHERE a_port_id IN ({in_clause})", tuple(chunk))
+                    cur.execute(f"DELETE FROM link WHERE b_port_id IN ({in_clause})", tuple(chunk))
                 cur.execute(
-                    "DELETE FROM port WHERE id IN (%s)" % (
-                        ",".join(["%s"] * len(port_ids))
-                    ),
-                    tuple(port_ids)
+                    f"""
+                    UPDATE device
+                    SET deleted_at=NOW(),
+                        name=CONCAT(LEFT(name, {DEVICE_NAME_MAX} - CHAR_LENGTH(CONCAT('#del', id))), '#del', id)
+                    WHERE id=%s AND deleted_at IS NULL
+                    """,
+                    (device_id,),
                 )
-
-            # 删设备属性值
-            cur.execute("DELETE FROM device_attr_value WHERE device_id=%s", (device_id,))
-
-            # 删设备
-            cur.execute("DELETE FROM device WHERE id=%s", (device_id,))
-
-    return True
+                marked = cur.rowcount
+                bump_project_rev_for_devices(cur, [device_id])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+    if not marked:
+        raise ValueError("设备不存在或已删除")
+    return submit_job("purge_device", purge_device, device_id)
 
 
 def create_device_basic(template_id: int, name: str, model_code: str):
-    sql = "INSERT INTO device (template_id, name, model_code) VALUES (%s, %s, %s)"
+    sql = "INSERT INTO device (template_id, name, model_code, sort_key) VALUES (%s, %s, %s, %s)"
     with get_conn() as conn:
         with conn.cursor() as cur:
-            cur.execute(sql, (template_id, name, model_code))
-            return cur.lastrowid
+            cur.execute(sql, (template_id, name, model_code, sort_key(name)))
+            device_id = cur.lastrowid
+            bump_project_rev_for_devices(cur, [device_id])
+    # 创建即按模板生成端口，编辑属性页不再逐次补齐
+    _ensure_ports_for_device(template_id, device_id)
+    return device_id
 
 # -------- 表单模型构建（设备级） --------
 
@@ -372,6 +555,7 @@ def get_template_attrs_for_form(template_id: int, device_id: int):
                 "id": pid,
                 "name": p.get("name") or f"Port-{pid}",
                 "parent_port_id": p.get("parent_port_id"),
+                "depth": (p.get("path") or "").count("/"),
                 "max_links": p.get("max_links") or 1,
                 "is_active": p.get("is_active", 1),
             },
@@ -422,10 +606,10 @@ def _list_device_ports(device_id: int):
                     # 注意：col 来自受控白名单，非用户输入
                     cur.execute(
                         f"""
-                        SELECT id, {col} AS name, parent_port_id, max_links, is_active
+                        SELECT id, {col} AS name, parent_port_id, path, max_links, is_active
                         FROM port
                         WHERE device_id=%s
-                        ORDER BY COALESCE(parent_port_id, id), (parent_port_id IS NULL) DESC, id
+                        ORDER BY sort_key, id
                         """,
                         (device_id,),
                     )
@@ -439,10 +623,10 @@ def _list_device_ports(device_id: int):
             # 兜底：只取 id，自造一个 name
             cur.execute(
                 """
-                SELECT id, parent_port_id, max_links, is_active
+                SELECT id, parent_port_id, path, max_links, is_active
                 FROM port
                 WHERE device_id=%s
-                ORDER BY COALESCE(parent_port_id, id), (parent_port_id IS NULL) DESC, id
+                ORDER BY sort_key, id
             """,
             (device_id,),
         )
@@ -453,51 +637,30 @@ def _list_device_ports(device_id: int):
 
 
 def create_child_port(device_id: int, parent_port_id: int, name: str) -> int:
-    """在设备下为某端口新增子端口（仅允许一层）。"""
+    """在设备下为某端口新增一个子端口（父端口本身也可以是子端口），继承父端口属性。"""
     if not name or not str(name).strip():
         raise ValueError("name required")
     name = str(name).strip()
     with get_conn() as conn, conn.cursor() as cur:
         # 检查父端口合法性
         cur.execute(
-            "SELECT id, port_type_id, parent_port_id FROM port WHERE id=%s AND device_id=%s",
+            "SELECT id, port_type_id, is_active FROM port WHERE id=%s AND device_id=%s",
             (parent_port_id, device_id),
         )
         parent = cur.fetchone()
         if not parent:
             raise ValueError("parent port not found")
-        if parent.get("parent_port_id"):
-            raise ValueError("only one level of nesting allowed")
-
-        # 名称冲突检查（同设备内）
-        cur.execute(
-            "SELECT 1 FROM port WHERE device_id=%s AND name=%s",
-            (device_id, name),
-        )
-        if cur.fetchone():
-            raise ValueError("port name already exists")
-
-        # 插入子端口
-        cur.execute(
-            "INSERT INTO port (device_id, name, parent_port_id, port_type_id) VALUES (%s,%s,%s,%s)",
-            (device_id, name, parent_port_id, parent.get("port_type_id")),
-        )
-        new_id = cur.lastrowid
 
-        # 继承属性
-        cur.execute(
-            "SELECT attribute_id, option_id, value_text FROM port_attr_value WHERE port_id=%s",
-            (parent_port_id,),
-        )
-        rows = cur.fetchall() or []
-        for r in rows:
-            cur.execute(
-                "INSERT INTO port_attr_value (port_id, attribute_id, option_id, value_text) VALUES (%s,%s,%s,%s)",
-                (new_id, r["attribute_id"], r["option_id"], r["value_text"]),
-            )
+        conn.begin()
+        try:
+            _create_child_ports(cur, device_id, [parent], {parent["id"]: [name]})
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
-        conn.commit()
-        return new_id
+        cur.execute("SELECT id FROM port WHERE device_id=%s AND name=%s", (device_id, name))
+        return cur.fetchone()["id"]
 
 
 def _list_template_port_attrs(template_id: int):
@@ -630,9 +793,7 @@ def save_device_attributes(device_id: int, form_model: dict, payload: dict):
                 # 更新端口最大连接数
                 raw_ml = payload.get(f"port_{port_id}_max_links")
                 try:
-                    ml = int(raw_ml)
-                    if ml < 1:
-                        ml = 1
+                    ml = min(max(int(raw_ml), 1), PORT_MAX_LINKS)
                 except Exception:
                     ml = 1
                 cur.execute("UPDATE port SET max_links=%s WHERE id=%s", (ml, port_id))
@@ -716,119 +877,400 @@ def _ensure_ports_for_device(template_id: int, device_id: int):
     """
     将设备端口与模板端口规则进行“增量同步”：
       - 模板无规则：不生成
-      - 对每条规则：
-          * 标签不空：目标是 标签+1..标签+qty
-            - 统计设备中已有 ^标签(\d+)$ 的最大序号与数量，若不足则从 (max+1) 开始补齐到 qty
-          * 标签为空：目标是 纯数字 1..qty（所有空标签规则共用一条递增序列）
-            - 统计设备中已有 ^(\d+)$ 的最大序号与数量，按总量缺多少补多少（共享序列）
+      - 每条规则编译成命名规则（见 services/naming_rule.py）：
+          * 填了 naming_rule：按规则展开，如 GE{1..2}/0/{1..48}
+          * 未填 naming_rule：等价于 标签{1..qty}
+          * 标签与 naming_rule 都为空：所有此类规则共用一条纯数字序列 1..sum(qty)
+      - 现有端口名一次性解析回“规则 + 序号”，只补规则中缺失的序号
       - 不删除、不改名，只有“缺口补齐”
+    与模板级批量对账（reconcile_template_ports）共用同一套查询与补齐计划；
+    完成后在设备上记录同步标记（规则版本号 + 校验和），见 get_device().port_sync_needed。
+    返回新增端口数。
     """
     with get_conn() as conn, conn.cursor() as cur:
-        # 取模板规则
-        cur.execute("""
-            SELECT id, code, qty, port_type_id, max_links
-            FROM port_template
-            WHERE template_id=%s
-            ORDER BY sort_order, id
-        """, (template_id,))
-        rules = cur.fetchall() or []
-        if not rules:
-            return  # 无规则不生成
-
-        # 读取设备现有端口（名字集合 + 为前缀/纯数字准备的统计）
-        cur.execute("SELECT name FROM port WHERE device_id=%s", (device_id,))
-        existing = [ (r["name"] or "").strip() for r in (cur.fetchall() or []) ]
-        used_names = set(existing)
-
-        # 预统计：各前缀当前最大序号、纯数字当前最大序号，以及当前计数
-        prefix_max = {}   # 非空标签：code -> max_num
-        prefix_count = {} # 非空标签：code -> count( ^code\d+$ )
-        numeric_max = 0   # 空标签共享：max of ^\d+$
-        numeric_count = 0 # 空标签共享：count of ^\d+$
-
-        # 扫一遍现有名字，统计
-        num_pat = re.compile(r'^(\d+)$')
-        def make_pat(code): return re.compile(rf'^{re.escape(code)}(\d+)$')
-
-        # 为减少正则编译，多收集规则里的非空 code
-        nonempty_codes = [ (r.get("code") or "").strip() for r in rules if (r.get("code") or "").strip() ]
-        nonempty_codes = list(dict.fromkeys(nonempty_codes))  # 去重保持顺序
-        code_pats = { c: make_pat(c) for c in nonempty_codes }
-
-        for nm in existing:
-            m_num = num_pat.match(nm)
-            if m_num:
-                n = int(m_num.group(1))
-                numeric_max = max(numeric_max, n)
-                numeric_count += 1
-                continue
-            # 尝试匹配各前缀
-            for code, pat in code_pats.items():
-                m = pat.match(nm)
-                if m:
-                    n = int(m.group(1))
-                    prefix_max[code] = max(prefix_max.get(code, 0), n)
-                    prefix_count[code] = prefix_count.get(code, 0) + 1
-                    break
-
-        # 先处理“非空标签”的规则：各自补齐到 qty
-        for r in rules:
-            code = (r.get("code") or "").strip()
-            qty  = int(r.get("qty") or 1)
-            if qty < 1:
+        marker = _port_rules_marker(cur, template_id)
+        plan = _prepare_port_plan(_load_port_rules(cur, template_id))
+        inserted = _reconcile_devices(cur, template_id, plan, [device_id], marker)
+        conn.commit()
+        return inserted
+
+
+# -------- 端口对账（模板级批量） --------
+
+RECONCILE_CHUNK = 500       # 每批处理的设备数
+PORT_INSERT_BATCH = 1000    # 多值 INSERT 每批行数
+
+
+def _port_rules_marker(cur, template_id: int):
+    """读取模板当前的端口规则标记 (port_rev, 校验和)；须在读取规则之前取，避免漏掉并发变更。"""
+    cur.execute(f"""
+        SELECT dt.port_rev AS rev,
+               ({_PORT_RULES_SUM_SQL.format(template_id="dt.id")}) AS rules_sum
+        FROM device_template dt
+        WHERE dt.id=%s
+    """, (template_id,))
+    row = cur.fetchone() or {}
+    return row.get("rev"), row.get("rules_sum")
+
+
+def _load_port_rules(cur, template_id: int):
+    cur.execute("""
+        SELECT id, code, qty, naming_rule, port_type_id, max_links
+        FROM port_template
+        WHERE template_id=%s
+        ORDER BY sort_order, id
+    """, (template_id,))
+    return cur.fetchall() or []
+
+
+def port_rule_of(rule: dict) -> Optional[NamingRule]:
+    """
+    端口规则行 → 编译后的命名规则（带缓存）。
+    未填 naming_rule 时等价于 “标签{1..qty}”；qty < 1 返回 None。
+    """
+    code = (rule.get("code") or "").strip()
+    if rule.get("naming_rule"):
+        return compile_rule(rule["naming_rule"], code=code)
+    qty = int(rule.get("qty") or 1)
+    if qty < 1:
+        return None
+    return compile_rule(f"{escape_literal(code)}{{1..{qty}}}")
+
+
+def _prepare_port_plan(rules):
+    """
+    编译模板的全部规则，返回 ([(规则行, NamingRule), ...], RuleMatcher)。
+    标签与 naming_rule 都为空的规则按旧约定合并为一条纯数字序列 1..sum(qty)。
+    """
+    compiled, empty_qty = [], 0
+    for r in rules:
+        if not (r.get("code") or "").strip() and not r.get("naming_rule"):
+            empty_qty += int(r.get("qty") or 1)
+            continue
+        rule = port_rule_of(r)
+        if rule is not None:
+            compiled.append((r, rule))
+    if empty_qty > 0:
+        compiled.append(({"id": None, "port_type_id": None, "max_links": 1},
+                         compile_rule(f"{{1..{empty_qty}}}")))
+    return compiled, RuleMatcher([rule for _, rule in compiled])
+
+
+def _device_port_names(cur, device_ids: List[int]):
+    """一批设备的现有端口名：{device_id: [name, ...]}（走 uk_port_device_name 覆盖索引）。"""
+    in_clause = ",".join(["%s"] * len(device_ids))
+    cur.execute(f"SELECT device_id, name FROM port WHERE device_id IN ({in_clause})", tuple(device_ids))
+    out = {}
+    for r in cur.fetchall() or []:
+        out.setdefault(r["device_id"], []).append(r["name"] or "")
+    return out
+
+
+def _plan_missing_ports(plan, names):
+    """
+    按编译后的规则与单台设备的现有端口名计算缺口，返回待插入的
+    [(name, port_type_id, port_template_id, max_links), ...]
+    """
+    compiled, matcher = plan
+    present = [set() for _ in compiled]
+    for nm in names:
+        for pos, idx in matcher.match(nm):
+            present[pos].add(idx)
+
+    taken = set(names)
+    rows = []
+    for pos, (r, rule) in enumerate(compiled):
+        have = present[pos]
+        if len(have) >= rule.size:
+            continue  # 该规则已齐全，无需展开名字
+        ml = r.get("max_links") or 1
+        for i, nm in enumerate(rule.names()):
+            if i in have or nm in taken:
                 continue
-            if code:
-                have = prefix_count.get(code, 0)
-                need = max(0, qty - have)
-                if need == 0:
-                    continue
-                start = prefix_max.get(code, 0) + 1
-                ptype = r.get("port_type_id")
-                ml = r.get("max_links") or 1
-                # 补 need 个
-                for i in range(need):
-                    nm = f"{code}{start+i}"
-                    # 极端保障：同事务内避重
-                    while nm in used_names:
-                        start += 1
-                        nm = f"{code}{start+i}"
-                    # 插入端口时：
-                    if ptype:
-                        cur.execute(
-                        "INSERT INTO port (device_id, name, port_type_id, port_template_id, max_links) VALUES (%s, %s, %s, %s, %s)",
-                        (device_id, nm, ptype, r["id"], ml)
-                        )
-                    else:
-                        cur.execute(
-                        "INSERT INTO port (device_id, name, port_template_id, max_links) VALUES (%s, %s, %s, %s)",
-                        (device_id, nm, r["id"], ml)
-                        )
+            taken.add(nm)
+            rows.append((nm, r.get("port_type_id"), r["id"], ml))
+    return rows
 
-                    used_names.add(nm)
-                # 更新统计缓存
-                prefix_count[code] = have + need
-                prefix_max[code] = start + need - 1
-
-        # 再处理“空标签”的规则：共享纯数字序列，按总量补齐到 sum(qty)
-        total_empty_qty = sum(int(r.get("qty") or 1) for r in rules if not (r.get("code") or "").strip())
-        need_empty = max(0, total_empty_qty - numeric_count)
-        if need_empty > 0:
-            start = numeric_max + 1
-            for i in range(need_empty):
-                nm = f"{start+i}"
-                while nm in used_names:
-                    start += 1
-                    nm = f"{start+i}"
-                cur.execute(
-                    "INSERT INTO port (device_id, name, max_links) VALUES (%s, %s, %s)",
-                    (device_id, nm, 1)
-                )
-                used_names.add(nm)
 
-        conn.commit()
-          
+def _insert_ports(cur, rows, batch_size: int = PORT_INSERT_BATCH):
+    """
+    rows: [(device_id, name, port_type_id, port_template_id, max_links), ...]
+    分批多值 INSERT（同时写入自然排序键）；名称已存在（并发补齐）时跳过。
+    """
+    sql = """
+        INSERT INTO port (device_id, name, port_type_id, port_template_id, max_links, sort_key)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE id=id
+    """
+    for i in range(0, len(rows), batch_size):
+        cur.executemany(sql, [(*r, sort_key(r[1])) for r in rows[i:i + batch_size]])
+    if rows:
+        device_ids = sorted({r[0] for r in rows})
+        _fill_root_paths(cur, device_ids)
+        bump_project_rev_for_devices(cur, device_ids)
+
+
+# ===== 端口树：物化路径 =====
+# port.path = 从根到自身的 id（10 位补零）以 / 连接，如 0000000012/0000000345；
+# 按 (device_id, path) 排序即为任意深度的先序遍历，父端口总在其子端口之前。
+# port.sort_key = 自然排序键；子端口为“父端口 sort_key + 空格 + 自身键”，
+# 列表按 (device_id, sort_key) 排序既是自然序，也保持父端口紧邻其子端口之前。
+PATH_SEG_WIDTH = 10
+BREAKOUT_MAX_FANOUT = 256
+
+
+def _fill_root_paths(cur, device_ids: List[int]):
+    """为新插入的根端口补路径（path 为空且无父端口）。"""
+    in_clause = ",".join(["%s"] * len(device_ids))
+    cur.execute(f"""
+        UPDATE port SET path=LPAD(id, {PATH_SEG_WIDTH}, '0')
+        WHERE device_id IN ({in_clause}) AND parent_port_id IS NULL AND path IS NULL
+    """, tuple(device_ids))
+
+
+def _fill_child_paths(cur, device_id: int, parent_ids: List[int]):
+    """为一批父端口下新插入的子端口补路径（父路径 + / + 自身 id），并在排序键前拼上父端口的键。"""
+    in_clause = ",".join(["%s"] * len(parent_ids))
+    cur.execute(f"""
+        UPDATE port c
+        JOIN port p ON p.id = c.parent_port_id
+        SET c.path = CONCAT(p.path, '/', LPAD(c.id, {PATH_SEG_WIDTH}, '0')),
+            c.sort_key = LEFT(CONCAT(COALESCE(p.sort_key, ''), ' ', c.sort_key), {SORT_KEY_MAX})
+        WHERE c.device_id=%s AND c.parent_port_id IN ({in_clause}) AND c.path IS NULL
+    """, (device_id, *parent_ids))
+
+
+def _create_child_ports(cur, device_id: int, parents, names_by_parent: Dict[int, List[str]],
+                        max_links: int = 1) -> int:
+    """
+    在同一设备下批量创建子端口（调用方负责事务）：
+      1) 一次取出设备现有端口名做冲突检查（含本批内部重名）
+      2) 多值 INSERT 子端口（端口类型、启用状态随父端口）
+      3) INSERT ... SELECT 继承父端口属性值（新子端口此时 path 仍为空，借此限定范围）
+      4) 补物化路径
+    返回新建子端口数。
+    """
+    cur.execute("SELECT name FROM port WHERE device_id=%s", (device_id,))
+    taken = {r["name"] for r in cur.fetchall() or []}
+
+    rows = []
+    for p in parents:
+        for nm in names_by_parent.get(p["id"], ()):
+            if nm in taken:
+                raise ValueError(f"端口名已存在：{nm}")
+            taken.add(nm)
+            rows.append((device_id, nm, p["id"], p.get("port_type_id"), p.get("is_active", 1), max_links,
+                         sort_key(nm)))
+    if not rows:
+        return 0
+
+    sql = """
+        INSERT INTO port (device_id, name, parent_port_id, port_type_id, is_active, max_links, sort_key)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
+    for i in range(0, len(rows), PORT_INSERT_BATCH):
+        cur.executemany(sql, rows[i:i + PORT_INSERT_BATCH])
+
+    parent_ids = [p["id"] for p in parents]
+    in_clause = ",".join(["%s"] * len(parent_ids))
+    cur.execute(f"""
+        INSERT INTO port_attr_value (port_id, attribute_id, option_id, value_text)
+        SELECT c.id, v.attribute_id, v.option_id, v.value_text
+        FROM port c
+        JOIN port_attr_value v ON v.port_id = c.parent_port_id
+        WHERE c.device_id=%s AND c.parent_port_id IN ({in_clause}) AND c.path IS NULL
+    """, (device_id, *parent_ids))
+    _fill_child_paths(cur, device_id, parent_ids)
+    bump_project_rev_for_devices(cur, [device_id])
+    return len(rows)
+
+
+def breakout_ports(device_id: int, port_ids: List[int], fanout: int = None,
+                   naming_rule: str = None, max_links: int = 1) -> Dict[str, int]:
+    """
+    批量拆分端口（如 QSFP → 4×25G），支持对子端口继续拆分，层级不限。
+      - port_ids：要拆分的父端口（须属于该设备）
+      - naming_rule：子端口命名规则，可用 {parent} 代入父端口名；
+                     默认 {parent}:{1..fanout}
+      - fanout：每个父端口拆出的子端口数；与 naming_rule 同时给出时须与规则数量一致
+    整批在一个事务中完成，任一名称冲突则全部回滚。
+    返回 {"parents": 父端口数, "created": 新建子端口数}
+    """
+    port_ids = sorted({int(x) for x in port_ids or []})
+    if not port_ids:
+        raise ValueError("请选择要拆分的端口")
+    if not 1 <= int(max_links or 1) <= PORT_MAX_LINKS:
+        raise ValueError(f"最大连接数需在 1~{PORT_MAX_LINKS} 之间")
+    if not naming_rule:
+        if not fanout or fanout < 1:
+            raise ValueError("拆分数量必须大于 0")
+        naming_rule = f"{{parent}}:{{1..{int(fanout)}}}"
+
+    with get_conn() as conn, conn.cursor() as cur:
+        in_clause = ",".join(["%s"] * len(port_ids))
+        cur.execute(f"""
+            SELECT id, name, port_type_id, is_active, path
+            FROM port
+            WHERE device_id=%s AND id IN ({in_clause})
+        """, (device_id, *port_ids))
+        parents = cur.fetchall() or []
+        if len(parents) != len(port_ids):
+            raise ValueError("部分端口不存在或不属于该设备")
+
+        names_by_parent = {}
+        for p in parents:
+            rule = compile_rule(naming_rule, parent=p["name"])
+            if fanout and rule.size != fanout:
+                raise ValueError(f"命名规则生成 {rule.size} 个名称，与拆分数量 {fanout} 不一致")
+            if rule.size > BREAKOUT_MAX_FANOUT:
+                raise ValueError(f"单个端口最多拆分 {BREAKOUT_MAX_FANOUT} 个")
+            names_by_parent[p["id"]] = list(rule.names())
+
+        conn.begin()
+        try:
+            created = _create_child_ports(cur, device_id, parents, names_by_parent, max_links or 1)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return {"parents": len(parents), "created": created}
+
+
+def _reconcile_devices(cur, template_id: int, plan, device_ids: List[int], marker) -> int:
+    """对一批设备读取端口名 → 解析并计算缺口 → 批量插入 → 记录同步标记，返回新增端口数。"""
+    rows = []
+    if plan[0]:
+        names_by_dev = _device_port_names(cur, device_ids)
+        for did in device_ids:
+            for name, ptype, rule_id, ml in _plan_missing_ports(plan, names_by_dev.get(did, ())):
+                rows.append((did, name, ptype, rule_id, ml))
+        _insert_ports(cur, rows)
+
+    rev, rules_sum = marker
+    in_clause = ",".join(["%s"] * len(device_ids))
+    cur.execute(
+        f"UPDATE device SET port_sync_rev=%s, port_sync_sum=%s WHERE template_id=%s AND id IN ({in_clause})",
+        (rev, rules_sum, template_id, *device_ids),
+    )
+    return len(rows)
+
+
+def reconcile_template_ports(template_id: int, chunk_size: int = RECONCILE_CHUNK,
+                             progress=None, force: bool = False):
+    """
+    模板级端口对账：把模板端口规则的变化同步到该模板下的设备。
+      - 默认只处理同步标记过期的设备；force=True 时全部设备重新对账（如手工删过端口）
+      - 按设备主键分批（keyset），每批一次查询端口名 + 多值 INSERT 补齐，批间提交
+      - progress(done, total, inserted)：每批完成后回调，用于汇报进度
+    规则与 _ensure_ports_for_device 完全一致（只补缺口，不删除、不改名）。
+    返回 {"devices": 处理的设备数, "inserted": 新增端口数}
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        marker = _port_rules_marker(cur, template_id)
+        plan = _prepare_port_plan(_load_port_rules(cur, template_id))
+
+        stale_sql = "" if force else " AND NOT (port_sync_rev <=> %s AND port_sync_sum <=> %s)"
+        stale_args = () if force else marker
+        cur.execute(
+            "SELECT COUNT(*) AS c FROM device WHERE template_id=%s" + stale_sql,
+            (template_id, *stale_args),
+        )
+        total = int((cur.fetchone() or {}).get("c", 0))
+
+        done, inserted, last_id = 0, 0, 0
+        while done < total:
+            cur.execute(
+                "SELECT id FROM device WHERE template_id=%s AND id > %s" + stale_sql
+                + " ORDER BY id LIMIT %s",
+                (template_id, last_id, *stale_args, chunk_size),
+            )
+            ids = [r["id"] for r in (cur.fetchall() or [])]
+            if not ids:
+                break
+            inserted += _reconcile_devices(cur, template_id, plan, ids, marker)
+            conn.commit()
+            done += len(ids)
+            last_id = ids[-1]
+            if progress:
+                progress(done, total, inserted)
+
+    return {"devices": done, "inserted": inserted}
+
+
+SORT_KEY_CHUNK = 500   # 排序键回填：每批设备数
+
+
+def _write_sort_keys(cur, table: str, keys: Dict[int, str]):
+    """CASE 拼一条 UPDATE 批量写排序键；table 只取 device / port。"""
+    if not keys:
+        return
+    ids = list(keys)
+    cases = " ".join(["WHEN %s THEN %s"] * len(ids))
+    args = [x for i in ids for x in (i, keys[i])]
+    in_clause = ",".join(["%s"] * len(ids))
+    cur.execute(f"UPDATE {table} SET sort_key = CASE id {cases} END WHERE id IN ({in_clause})",
+                (*args, *ids))
+
+
+def refresh_sort_keys(project_id: int = None, chunk_size: int = SORT_KEY_CHUNK, progress=None) -> Dict[str, int]:
+    """
+    重算 device.sort_key / port.sort_key（存量数据一次性回填，或排序键规则调整后使用）。
+      - 按设备主键分批（keyset），每批一次读出设备及其全部端口
+      - 端口按 path 排序读取，父端口先于子端口，子端口键 = 父端口键 + 空格 + 自身键
+      - 只回写有变化的行，批间提交
+    返回 {"devices": 更新的设备数, "ports": 更新的端口数}
+    """
+    where, args = ("AND project_id=%s", (project_id,)) if project_id is not None else ("", ())
+    dev_fixed = port_fixed = 0
+    last_id = 0
+    with get_conn() as conn, conn.cursor() as cur:
+        while True:
+            cur.execute(
+                f"SELECT id, name, sort_key FROM device WHERE id > %s {where} ORDER BY id LIMIT %s",
+                (last_id, *args, chunk_size),
+            )
+            devices = cur.fetchall() or []
+            if not devices:
+                break
+            last_id = devices[-1]["id"]
+            dev_keys = {}
+            for d in devices:
+                key = sort_key(d["name"])
+                if key != d["sort_key"]:
+                    dev_keys[d["id"]] = key
+
+            in_clause = ",".join(["%s"] * len(devices))
+            cur.execute(f"""
+                SELECT id, name, parent_port_id, sort_key
+                FROM port
+                WHERE device_id IN ({in_clause})
+                ORDER BY device_id, path, id
+            """, tuple(d["id"] for d in devices))
+            computed: Dict[int, str] = {}
+            port_keys: Dict[int, str] = {}
+            for p in cur.fetchall() or []:
+                key = sort_key(p["name"])
+                parent_key = computed.get(p["parent_port_id"]) if p["parent_port_id"] else None
+                if parent_key is not None:
+                    key = f"{parent_key} {key}"[:SORT_KEY_MAX]
+                computed[p["id"]] = key
+                if key != p["sort_key"]:
+                    port_keys[p["id"]] = key
+
+            _write_sort_keys(cur, "device", dev_keys)
+            items = list(port_keys.items())
+            for i in range(0, len(items), PORT_INSERT_BATCH):
+                _write_sort_keys(cur, "port", dict(items[i:i + PORT_INSERT_BATCH]))
+            conn.commit()
+            dev_fixed += len(dev_keys)
+            port_fixed += len(port_keys)
+            if progress:
+                progress(last_id, dev_fixed, port_fixed)
+    return {"devices": dev_fixed, "ports": port_fixed}
+
 # === port_template CRUD ===
 
+@cached("port_template")
 def list_port_templates(template_id: int):
     with get_conn() as conn, conn.cursor() as cur:
         # 带出 port_type_id 与类型名，方便 UI 展示
@@ -844,23 +1286,67 @@ def list_port_templates(template_id: int):
         """, (template_id,))
         return cur.fetchall()
 
+PORT_RULE_MAX = 4096    # 单条端口规则生成的端口数上限（保存后端口补齐在请求内同步执行）
+PORT_MAX_LINKS = 2      # link 表按 (project_id, a_port_id) / (project_id, b_port_id) 唯一，一个端口最多 2 条连线
+
+
 def create_port_template(template_id: int, code: str, name: str,
                          qty: int = 1, naming_rule: str = None,
                          sort_order: int = 0, port_type_id: int = None,
                          max_links: int = 1):
+    if not 1 <= int(max_links or 1) <= PORT_MAX_LINKS:
+        raise ValueError(f"最大连接数需在 1~{PORT_MAX_LINKS} 之间")
+    size = compile_rule(naming_rule, code=code).size if naming_rule else int(qty or 0)
+    if size > PORT_RULE_MAX:
+        raise ValueError(f"单条端口规则最多生成 {PORT_RULE_MAX} 个端口（当前 {size} 个）")
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute("""
             INSERT INTO port_template (template_id, code, name, port_type_id, qty, naming_rule, sort_order, max_links)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """, (template_id, code, name, port_type_id, qty, naming_rule, sort_order, max_links))
-        return cur.lastrowid
+        new_id = cur.lastrowid
+        # 规则版本号 +1：设备上的同步标记随之过期
+        cur.execute("UPDATE device_template SET port_rev=port_rev+1 WHERE id=%s", (template_id,))
+        invalidate("port_template", "template", cur=cur)
+        return new_id
 
 def delete_port_template(pt_id: int):
     with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE device_template dt
+            JOIN port_template pt ON pt.template_id = dt.id
+            SET dt.port_rev = dt.port_rev + 1
+            WHERE pt.id=%s
+        """, (pt_id,))
         cur.execute("DELETE FROM port_template WHERE id=%s", (pt_id,))
+        invalidate("port_template", "template", cur=cur)
         return True
 
 
+PREVIEW_LIMIT = 12  # 每条规则预览的端口名数量上限
+
+
+def build_ports_preview(rules, limit: int = PREVIEW_LIMIT):
+    """
+    端口规则预览树：{端口类型: {属性: [端口名, ...]}}
+    直接由编译后的命名规则按序号取首尾若干个，不展开全量名单。
+    """
+    ports_tree = {}
+    for r in rules:
+        ptype = r.get("port_type_name") or "未分类"
+        attr = r.get("name") or "（未命名属性）"  # 模板规则中的“属性”字段
+        try:
+            rule = port_rule_of(r)
+        except ValueError as e:
+            names = [f"（命名规则无效：{e}）"]
+        else:
+            if rule is None:  # 容错：qty < 1
+                continue
+            names = rule.preview(limit)
+        ports_tree.setdefault(ptype, {}).setdefault(attr, []).extend(names)
+    return ports_tree
+
+
 def _has_option_hierarchy(attribute_id: int) -> bool:
     """判断该枚举属性是否存在父子层级（有非空 parent_id 的选项）"""
     with get_conn() as conn, conn.cursor() as cur:
@@ -886,7 +1372,7 @@ def list_device_ports_with_type(device_id: int):
     FROM port p
     LEFT JOIN port_type pt ON pt.id = p.port_type_id
     WHERE p.device_id=%s
-    ORDER BY p.id
+    ORDER BY p.sort_key, p.id
     """
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, (device_id,))
@@ -899,6 +1385,7 @@ def _option_name_map(attribute_id: int) -> Dict[int, str]:
         mapping[op["id"]] = op["name"]
     return mapping
 
+@read_only
 def get_device_preview_data(device_id: int):
     """
     预览页数据（树状）：
@@ -909,7 +1396,7 @@ def get_device_preview_data(device_id: int):
     - 端口（按模板端口规则三层展示）：
         * 第一层：端口类型（port_type.name，空则“未分类”）
         * 第二层：属性（port_template.name）
-        * 第三层：按规则生成的“标签+序号”（code1..codeN）
+        * 第三层：按命名规则生成的端口名（大规则只列首尾）
           —— 这里按规则预览，不依赖已生成实例
     """
     device = get_device(device_id)
@@ -977,23 +1464,8 @@ def get_device_preview_data(device_id: int):
             cascaded_items.append({"name": attr_display_name, "path": path})
 
 
-    # ===== 端口：按“模板规则”三层（端口类型 -> 属性 -> 标签+序号） =====
-    rules = list_port_templates(template_id)  # 需返回 id, code, name(属性), qty, port_type_name
-    ports_tree = {}  # {ptype: { attr_name: [ 'PW1','PW2',... ] } }
-    for r in rules:
-        ptype = r.get("port_type_name") or "未分类"
-        attr  = r.get("name") or "（未命名属性）"   # 模板规则中的“属性”字段
-        code  = (r.get("code") or "").strip()
-        qty   = int(r.get("qty") or 1)
-        if qty < 1:  # 容错
-            continue
-        # 第三层：生成 代码+序号，单个也从 1 开始
-        if code:
-            names = [ f"{code}{i}" for i in range(1, qty+1) ]
-        else:
-            # 若标签允许为空，按纯数字预览
-            names = [ f"{i}" for i in range(1, qty+1) ]
-        ports_tree.setdefault(ptype, {}).setdefault(attr, []).extend(names)
+    # ===== 端口：按“模板规则”三层（端口类型 -> 属性 -> 端口名） =====
+    ports_tree = build_ports_preview(list_port_templates(template_id))
 
     return {
         "device": {
@@ -1014,29 +1486,157 @@ def list_devices_by_project(project_id: int):
            dt.name AS template_name, dt.device_type
     FROM device d
     LEFT JOIN device_template dt ON dt.id = d.template_id
-    WHERE d.project_id=%s
-    ORDER BY d.id DESC
+    WHERE d.project_id=%s AND d.deleted_at IS NULL
+    ORDER BY d.sort_key, d.id
     """
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, (project_id,))
         return cur.fetchall()
 
 def create_device_in_project(project_id: int, template_id: int, name: str, model_code: str):
-    sql = "INSERT INTO device (project_id, template_id, name, model_code) VALUES (%s, %s, %s, %s)"
+    sql = ("INSERT INTO device (project_id, template_id, name, model_code, sort_key) "
+           "VALUES (%s, %s, %s, %s, %s)")
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(sql, (project_id, template_id, name, model_code))
-        return cur.lastrowid
+        cur.execute(sql, (project_id, template_id, name, model_code, sort_key(name)))
+        device_id = cur.lastrowid
+        bump_project_rev(cur, project_id)
+    _ensure_ports_for_device(template_id, device_id)
+    return device_id
+
+
+DUPLICATE_MAX = 1000    # 单次复制设备上限
+DUPLICATE_CHUNK = 200   # 每批处理的新设备数（控制 IN 列表与单条语句的行数）
 
 
+def _duplicate_names(src_name: str, count: int, pattern: str = None) -> List[str]:
+    """
+    按命名规则生成副本名：规则可用变量 {name}（源设备名），默认 “{name}-{1..N}”。
+    规则展开数量不少于 count 时取前 count 个。
+    """
+    if pattern is None or not pattern.strip():
+        pattern = "{name}-{1..%d}" % count
+    rule = compile_rule(pattern.strip(), name=src_name)
+    if len(rule) < count:
+        raise ValueError(f"命名规则只能生成 {len(rule)} 个名称，少于复制数量 {count}")
+    return list(rule.names(0, count))
+
+
+def duplicate_device(device_id: int, count: int, pattern: str = None) -> List[int]:
+    """
+    在同一项目内把设备复制 count 份（同一事务）：
+      - 设备多值 INSERT
+      - 端口、设备属性值、端口属性值各一条 INSERT ... SELECT（源行 × 新设备）
+      - 子端口的父端口按 (设备, 端口名) 唯一键换成新设备上的同名端口，再逐层补物化路径
+    连线不复制。返回新设备 id（按名称顺序）。
+    """
+    count = int(count or 0)
+    if not 1 <= count <= DUPLICATE_MAX:
+        raise ValueError(f"复制数量需在 1~{DUPLICATE_MAX} 之间")
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT * FROM device WHERE id=%s AND deleted_at IS NULL", (device_id,))
+        src = cur.fetchone()
+        if not src:
+            raise ValueError("设备不存在")
+        names = _duplicate_names(src["name"], count, pattern)
+        if len(set(names)) != len(names):
+            raise ValueError("命名规则生成了重复的名称")
+
+        # 名称冲突：唯一键 (project_id, name) 含待清理的软删除设备
+        in_clause = ",".join(["%s"] * len(names))
+        cur.execute(f"SELECT name FROM device WHERE project_id=%s AND name IN ({in_clause}) LIMIT 5",
+                    (src["project_id"], *names))
+        taken = [r["name"] for r in cur.fetchall() or []]
+        if taken:
+            raise ValueError("设备名已存在：" + "、".join(taken))
+
+        conn.begin()
+        try:
+            new_ids: List[int] = []
+            for i in range(0, len(names), DUPLICATE_CHUNK):
+                chunk = names[i:i + DUPLICATE_CHUNK]
+                cur.executemany(
+                    """
+                    INSERT INTO device (project_id, template_id, name, model_code, created_by,
+                                        port_sync_rev, port_sync_sum, sort_key)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    [(src["project_id"], src["template_id"], nm, src["model_code"], src["created_by"],
+                      src["port_sync_rev"], src["port_sync_sum"], sort_key(nm)) for nm in chunk],
+                )
+                in_clause = ",".join(["%s"] * len(chunk))
+                cur.execute(f"SELECT id, name FROM device WHERE project_id=%s AND name IN ({in_clause})",
+                            (src["project_id"], *chunk))
+                by_name = {r["name"]: r["id"] for r in cur.fetchall() or []}
+                ids = [by_name[nm] for nm in chunk]
+                _copy_device_contents(cur, device_id, ids)
+                new_ids.extend(ids)
+            bump_project_rev(cur, src["project_id"])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return new_ids
+
+
+def _copy_device_contents(cur, src_id: int, new_ids: List[int]):
+    """把源设备的端口树与属性值复制到一批新设备（调用方负责事务）。"""
+    in_clause = ",".join(["%s"] * len(new_ids))
+    cur.execute(f"""
+        INSERT INTO port (device_id, name, port_template_id, port_type_id, index_no,
+                          is_active, max_links, sort_key)
+        SELECT d.id, p.name, p.port_template_id, p.port_type_id, p.index_no,
+               p.is_active, p.max_links, p.sort_key
+        FROM port p
+        JOIN device d ON d.id IN ({in_clause})
+        WHERE p.device_id=%s
+    """, (*new_ids, src_id))
+    # 父端口：源端口的父端口名 → 新设备上的同名端口
+    cur.execute(f"""
+        UPDATE port n
+        JOIN port o ON o.device_id=%s AND o.name = n.name
+        JOIN port op ON op.id = o.parent_port_id
+        JOIN port np ON np.device_id = n.device_id AND np.name = op.name
+        SET n.parent_port_id = np.id
+        WHERE n.device_id IN ({in_clause})
+    """, (src_id, *new_ids))
+    _fill_root_paths(cur, new_ids)
+    while True:
+        cur.execute(f"""
+            UPDATE port c
+            JOIN port p ON p.id = c.parent_port_id
+            SET c.path = CONCAT(p.path, '/', LPAD(c.id, {PATH_SEG_WIDTH}, '0'))
+            WHERE c.device_id IN ({in_clause}) AND c.path IS NULL AND p.path IS NOT NULL
+        """, tuple(new_ids))
+        if not cur.rowcount:
+            break
+
+    cur.execute(f"""
+        INSERT INTO device_attr_value (device_id, attribute_id, option_id, value_text)
+        SELECT d.id, v.attribute_id, v.option_id, v.value_text
+        FROM device_attr_value v
+        JOIN device d ON d.id IN ({in_clause})
+        WHERE v.device_id=%s
+    """, (*new_ids, src_id))
+    cur.execute(f"""
+        INSERT INTO port_attr_value (port_id, attribute_id, option_id, value_text)
+        SELECT n.id, v.attribute_id, v.option_id, v.value_text
+        FROM port o
+        JOIN port_attr_value v ON v.port_id = o.id
+        JOIN port n ON n.device_id IN ({in_clause}) AND n.name = o.name
+        WHERE o.device_id=%s
+    """, (*new_ids, src_id))
+
+
+@read_only
 def search_devices_in_project(project_id: int, keyword: str):
     kw = f"%{(keyword or '').strip()}%"
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute("""
           SELECT id, name, model_code
           FROM device
-          WHERE project_id=%s
+          WHERE project_id=%s AND deleted_at IS NULL
             AND (name LIKE %s OR model_code LIKE %s)
-          ORDER BY id DESC
+          ORDER BY sort_key, id
         """, (project_id, kw, kw))
         return cur.fetchall()
 
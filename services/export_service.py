@@ -0,0 +1,93 @@
+# services/export_service.py
+"""
+线缆清册导出：生成 XLSX（无 openpyxl 时回退 CSV）。
+页面同步导出选中行，全量导出走后台任务（export_cables_job），两者共用同一套生成逻辑。
+行为 CableRow（元组），标签与组合列直接取自读模型：
+  FROM/TO = A_LABEL / B_LABEL，TO/FROM = B_LABEL / A_LABEL，标签 = <项目>-<设备>-<端口>
+"""
+import csv
+import time
+from io import BytesIO, StringIO
+from typing import Any, Dict, Iterable, List, Optional
+
+from metrics import EXPORT_BYTES, EXPORT_SECONDS
+
+from services.job_service import JobFile
+from services.cable_view_service import CableRow
+from services.link_service import fetch_cables_by_ids, iter_all_cables
+from services.project_service import get_project
+
+CABLE_HEADERS = [
+    "A_PROJECT", "A_DEVICE", "PORT_TYPE", "A_PORT", "A_LABEL", "FROM/TO",
+    "B_PROJECT", "B_DEVICE", "PORT_TYPE", "B_PORT", "B_LABEL", "TO/FROM",
+    "PRINTED", "LINK_ID",
+]
+
+
+def _cable_line(project_name: str, r: CableRow) -> List[Any]:
+    return [
+        project_name,
+        r.a_device_name,
+        r.a_port_type_name or "",
+        r.a_port_name,
+        r.a_label,
+        r.from_to,
+        project_name,
+        r.b_device_name,
+        r.b_port_type_name or "",
+        r.b_port_name,
+        r.b_label,
+        r.to_from,
+        "YES" if r.printed else "NO",
+        r.link_id,
+    ]
+
+
+def build_cables_file(project: Dict[str, Any], link_ids: Optional[List[int]] = None) -> JobFile:
+    """
+    link_ids 为空导出全部（流式逐行读取、逐行写出，不整表驻留），否则导出选中；
+    优先 XLSX（write_only），缺少 openpyxl 时回退 CSV。
+    """
+    pid, name = project["id"], project["name"]
+    t0 = time.perf_counter()
+    rows = fetch_cables_by_ids(pid, link_ids) if link_ids else iter_all_cables(pid)
+    f = _write_cables_file(name, rows)
+
+    fmt, scope = f.name.rsplit(".", 1)[-1], ("selected" if link_ids else "all")
+    EXPORT_SECONDS.observe(time.perf_counter() - t0, fmt, scope)
+    EXPORT_BYTES.observe(len(f.data), fmt, scope)
+    return f
+
+
+def _write_cables_file(name: str, rows: Iterable[CableRow]) -> JobFile:
+    try:
+        from openpyxl import Workbook  # 仅当环境有依赖时走 xlsx
+    except ImportError:
+        Workbook = None
+
+    if Workbook is not None:
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Cables")
+        ws.append(CABLE_HEADERS)
+        for r in rows:
+            ws.append(_cable_line(name, r))
+        bio = BytesIO()
+        wb.save(bio)
+        return JobFile(f"{name}_cables.xlsx",
+                       "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                       bio.getvalue())
+
+    sio = StringIO()
+    writer = csv.writer(sio)
+    writer.writerow(CABLE_HEADERS)
+    for r in rows:
+        writer.writerow(_cable_line(name, r))
+    return JobFile(f"{name}_cables.csv", "text/csv; charset=utf-8", sio.getvalue().encode("utf-8-sig"))
+
+
+def export_cables_job(project_id: int) -> JobFile:
+    """后台任务：导出项目全部线缆。"""
+    project = get_project(project_id)
+    if not project:
+        raise ValueError("项目不存在")
+    return build_cables_file(project)
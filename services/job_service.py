@@ -0,0 +1,268 @@
+# services/job_service.py
+"""
+后台任务：job 表记录状态，本机线程池执行（单机部署，无需消息队列）。
+
+  - submit_job(kind, fn, *args, project_id=None, **kwargs)：写入 job 表后交给线程池，立即返回任务 id
+  - 任务函数若声明了 progress 参数，会收到进度回调：progress(**计数)；
+    回调节流写库，同时检查取消标记，已请求取消则抛出 JobCancelled 结束任务
+  - 返回 JobFile 时把内容落盘到 JOB_RESULT_DIR，可经 /jobs/<id>/download 下载；其余返回值以 JSON 存入 result
+  - 任务行记录执行进程 owner（"主机名:pid"），该进程有未结束任务时每 JOB_HEARTBEAT_SECONDS 秒刷新 heartbeat_at
+  - 遗留任务收尾（init_jobs 启动时及心跳线程每轮）：只把执行进程已不在（同机 pid 不存在）
+    或心跳超过 JOB_STALE_SECONDS 秒的 PENDING/RUNNING 标记为失败，多 worker 下不误伤其他进程的任务；
+    任务结束时只从 RUNNING 改状态，已被判失败的任务不会再被改回 DONE
+  - init_jobs 同时清理过期任务及其文件
+线程池只执行本进程提交的任务；状态都在库里，查询与取消不依赖进程。
+"""
+import inspect
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from config import Config
+from db import get_conn
+
+JOB_PROGRESS_INTERVAL = 0.5   # 进度写库的最小间隔（秒）
+
+_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_EXECUTOR_LOCK = threading.Lock()
+_HEARTBEAT_PID = [None]
+_HOST = socket.gethostname()
+
+
+class JobFile(NamedTuple):
+    """任务产出的文件（如导出）。"""
+    name: str
+    mimetype: str
+    data: bytes
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _owner() -> str:
+    """当前进程标识（fork 出的 worker 各不相同，故每次现取 pid）。"""
+    return f"{_HOST}:{os.getpid()}"
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=Config.JOB_WORKERS, thread_name_prefix="job")
+        if _HEARTBEAT_PID[0] != os.getpid():
+            _HEARTBEAT_PID[0] = os.getpid()
+            threading.Thread(target=_heartbeat_loop, name="job-heartbeat", daemon=True).start()
+        return _EXECUTOR
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(Config.JOB_HEARTBEAT_SECONDS)
+        try:
+            with get_conn() as conn, conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE job SET heartbeat_at=NOW() WHERE owner=%s AND status IN ('PENDING','RUNNING')",
+                    (_owner(),),
+                )
+            _fail_orphans()
+        except Exception:
+            pass
+
+
+def _owner_gone(owner: Optional[str]) -> bool:
+    """同机进程可直接判断是否还在；本进程 pid 出现在旧任务上说明是被复用的 pid。"""
+    host, _, pid = (owner or "").rpartition(":")
+    if host != _HOST or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+def _fail_orphans(startup: bool = False) -> int:
+    """把执行进程已退出或心跳过期的 PENDING/RUNNING 任务标记为失败，返回条数。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id, owner, heartbeat_at < NOW() - INTERVAL %s SECOND AS stale
+            FROM job WHERE status IN ('PENDING','RUNNING')
+        """, (Config.JOB_STALE_SECONDS,))
+        me = _owner()
+        ids = [r["id"] for r in cur.fetchall() or []
+               if (r["stale"] is None or r["stale"]) or (_owner_gone(r["owner"]) and (startup or r["owner"] != me))]
+        if not ids:
+            return 0
+        cur.execute(
+            f"""
+            UPDATE job SET status='FAILED', error='执行进程已退出，任务中断', finished_at=NOW()
+            WHERE status IN ('PENDING','RUNNING') AND id IN ({','.join(['%s'] * len(ids))})
+            """,
+            tuple(ids),
+        )
+        return cur.rowcount
+
+
+def _set(job_id: str, sql: str, params=(), status: str = None):
+    """更新任务行；给定 status 时仅在当前状态一致时更新（返回受影响行数）。"""
+    where, args = "id=%s", (*params, job_id)
+    if status is not None:
+        where, args = "id=%s AND status=%s", (*args, status)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(f"UPDATE job SET {sql} WHERE {where}", args)
+        return cur.rowcount
+
+
+def _cancel_requested(job_id: str) -> bool:
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT cancel_requested FROM job WHERE id=%s", (job_id,))
+        row = cur.fetchone()
+        return bool(row and row["cancel_requested"])
+
+
+def _save_file(job_id: str, f: JobFile) -> str:
+    os.makedirs(Config.JOB_RESULT_DIR, exist_ok=True)
+    path = os.path.join(Config.JOB_RESULT_DIR, f"{job_id}.bin")
+    with open(path, "wb") as fp:
+        fp.write(f.data)
+    return path
+
+
+def _run(job_id: str, fn: Callable, args, kwargs):
+    # 排队期间被取消：不再执行
+    if not _set(job_id, "status='RUNNING', started_at=NOW(), heartbeat_at=NOW()", (), status="PENDING") \
+            or _cancel_requested(job_id):
+        _set(job_id, "status='CANCELLED', finished_at=NOW()", (), status="RUNNING")
+        return
+
+    last = [0.0]
+
+    def progress(**counts):
+        now = time.monotonic()
+        if now - last[0] < JOB_PROGRESS_INTERVAL:
+            return
+        last[0] = now
+        _set(job_id, "progress=%s", (json.dumps(counts, ensure_ascii=False, default=str),))
+        if _cancel_requested(job_id):
+            raise JobCancelled()
+
+    if "progress" in inspect.signature(fn).parameters:
+        kwargs = {**kwargs, "progress": progress}
+    try:
+        result = fn(*args, **kwargs)
+        if isinstance(result, JobFile):
+            path = _save_file(job_id, result)
+            _set(job_id, "status='DONE', result_path=%s, result_name=%s, result_mime=%s, finished_at=NOW()",
+                 (path, result.name, result.mimetype), status="RUNNING")
+        else:
+            _set(job_id, "status='DONE', result=%s, finished_at=NOW()",
+                 (json.dumps(result, ensure_ascii=False, default=str),), status="RUNNING")
+    except JobCancelled:
+        _set(job_id, "status='CANCELLED', finished_at=NOW()", (), status="RUNNING")
+    except Exception as e:
+        _set(job_id, "status='FAILED', error=%s, finished_at=NOW()", (str(e)[:1000],), status="RUNNING")
+
+
+def submit_job(kind: str, fn: Callable, *args, project_id: int = None, **kwargs) -> str:
+    """登记任务并交给线程池执行 fn(*args, **kwargs)，返回任务 id。"""
+    job_id = uuid.uuid4().hex[:16]
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO job (id, kind, project_id, status, owner, heartbeat_at, created_at)
+            VALUES (%s, %s, %s, 'PENDING', %s, NOW(), NOW())
+            """,
+            (job_id, kind, project_id, _owner()),
+        )
+    _executor().submit(_run, job_id, fn, args, kwargs)
+    return job_id
+
+
+def _decode(row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if not row:
+        return None
+    for key in ("progress", "result"):
+        row[key] = json.loads(row[key]) if row.get(key) else None
+    row["has_file"] = bool(row.pop("result_path", None))
+    row["cancel_requested"] = bool(row.get("cancel_requested"))
+    return row
+
+
+_JOB_COLUMNS = """
+    id, kind, project_id, status, progress, result, error, result_path, result_name,
+    cancel_requested, created_at, started_at, finished_at
+"""
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT {_JOB_COLUMNS} FROM job WHERE id=%s", (job_id,))
+        return _decode(cur.fetchone())
+
+
+def list_jobs(kind: str = None, project_id: int = None, limit: int = 50) -> List[Dict[str, Any]]:
+    where, params = ["1=1"], []
+    if kind:
+        where.append("kind=%s")
+        params.append(kind)
+    if project_id is not None:
+        where.append("project_id=%s")
+        params.append(project_id)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"SELECT {_JOB_COLUMNS} FROM job WHERE {' AND '.join(where)} ORDER BY created_at DESC LIMIT %s",
+            (*params, int(limit)),
+        )
+        return [_decode(r) for r in cur.fetchall() or []]
+
+
+def cancel_job(job_id: str) -> bool:
+    """请求取消：排队中的任务直接取消；运行中的任务在下次汇报进度时结束。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "UPDATE job SET cancel_requested=1 WHERE id=%s AND status IN ('PENDING','RUNNING')",
+            (job_id,),
+        )
+        return cur.rowcount > 0
+
+
+def get_job_file(job_id: str) -> Optional[Dict[str, Any]]:
+    """任务产出文件：{"path", "name", "mimetype"}；没有文件或文件已清理返回 None。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT result_path, result_name, result_mime FROM job WHERE id=%s AND status='DONE'",
+                    (job_id,))
+        row = cur.fetchone()
+    if not row or not row["result_path"] or not os.path.exists(row["result_path"]):
+        return None
+    return {"path": row["result_path"], "name": row["result_name"], "mimetype": row["result_mime"]}
+
+
+def init_jobs(app):
+    """应用启动时调用：收尾已退出进程遗留的任务（其他存活 worker 的任务不动），清理过期任务与文件。"""
+    try:
+        _fail_orphans(startup=True)
+        with get_conn() as conn, conn.cursor() as cur:
+            cur.execute(
+                "SELECT id, result_path FROM job WHERE created_at < NOW() - INTERVAL %s DAY",
+                (Config.JOB_KEEP_DAYS,),
+            )
+            old = cur.fetchall() or []
+            for r in old:
+                if r["result_path"] and os.path.exists(r["result_path"]):
+                    os.remove(r["result_path"])
+            if old:
+                cur.execute(f"DELETE FROM job WHERE id IN ({','.join(['%s'] * len(old))})",
+                            tuple(r["id"] for r in old))
+    except Exception as e:
+        # 数据库不可用时不阻止应用启动
+        app.logger.warning("job init skipped: %s", e)
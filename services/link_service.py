@@ -1,53 +1,168 @@
 # services/link_service.py
-from typing import Any, Dict, List, Set
+import uuid
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Sequence, Set, Tuple
 
-from db import get_conn  # 数据库连接工具
+import pymysql
+
+from db import get_conn, iter_rows, read_only, stream_rows  # 数据库连接工具
+from services.naming_rule import natural_key
+from services.project_service import bump_project_rev
+from services.cable_view_service import CABLE_COLUMNS, CableRow, sync_links, sync_plan, sync_ports
 
 
 # ================== 工具函数 ==================
 
 def _is_port_occupied(project_id: int, port_id: int) -> bool:
-    """判断端口在该项目下是否已被占用。"""
+    """判断端口在该项目下是否已有连接（读 port.link_count，不再统计 link 表）。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT p.link_count
+            FROM port p
+            JOIN device d ON d.id = p.device_id
+            WHERE p.id=%s AND d.project_id=%s AND d.deleted_at IS NULL
+            """,
+            (port_id, project_id),
+        )
+        row = cur.fetchone()
+        return bool(row and int(row["link_count"] or 0) > 0)
+
+
+def _is_port_full(project_id: int, port_id: int) -> bool:
+    """判断端口的已连接数是否达到 max_links。"""
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(
             """
-            SELECT COUNT(*) AS c
-            FROM link
-            WHERE project_id=%s AND status='CONNECTED'
-              AND (a_port_id=%s OR b_port_id=%s)
+            SELECT p.link_count, p.max_links
+            FROM port p
+            JOIN device d ON d.id = p.device_id
+            WHERE p.id=%s AND d.project_id=%s AND d.deleted_at IS NULL
+            """,
+            (port_id, project_id),
+        )
+        row = cur.fetchone()
+        if not row:
+            return True
+        return _row_full(row)
+
+
+def _row_full(row: Dict[str, Any]) -> bool:
+    """端口行自带 link_count / max_links 时直接判断是否已满。"""
+    return int(row.get("link_count") or 0) >= int(row.get("max_links") or 1)
+
+
+# ================== 连接计数（port.link_count） ==================
+# link_count 只统计 CONNECTED 连线，与连线增删在同一事务内维护；
+# 端口被删除时 link 随外键级联删除，需先用 release_far_ends 给对端减数。
+
+def _take_capacity(cur, port_ids: List[int]):
+    """
+    为一批端口各占用一个连接名额（原子条件更新），任一端口已满或所在设备已删除则抛错。
+    联表读设备行会加共享锁，与 delete_device 的软删除互斥，避免给待清理的端口建连。
+    """
+    placeholders = ",".join(["%s"] * len(port_ids))
+    cur.execute(
+        f"""
+        UPDATE port p JOIN device d ON d.id = p.device_id
+        SET p.link_count = p.link_count + 1
+        WHERE p.id IN ({placeholders}) AND p.link_count < p.max_links AND d.deleted_at IS NULL
+        """,
+        tuple(port_ids),
+    )
+    if cur.rowcount != len(set(port_ids)):
+        raise ValueError("端口连接数已达上限")
+
+
+def _release_capacity(cur, port_ids: List[int]):
+    placeholders = ",".join(["%s"] * len(port_ids))
+    cur.execute(
+        f"UPDATE port SET link_count=GREATEST(link_count-1, 0) WHERE id IN ({placeholders})",
+        tuple(port_ids),
+    )
+
+
+def release_far_ends(cur, port_ids: List[int]):
+    """
+    删除端口前调用：这些端口上的 CONNECTED 连线会被级联删除，
+    按对端分组一次性扣减对端端口的 link_count。
+    """
+    if not port_ids:
+        return
+    placeholders = ",".join(["%s"] * len(port_ids))
+    cur.execute(
+        f"""
+        UPDATE port p
+        JOIN (
+            SELECT far_id, COUNT(*) AS c
+            FROM (
+                SELECT b_port_id AS far_id FROM link
+                WHERE status='CONNECTED' AND a_port_id IN ({placeholders})
+                UNION ALL
+                SELECT a_port_id FROM link
+                WHERE status='CONNECTED' AND b_port_id IN ({placeholders})
+            ) x
+            GROUP BY far_id
+        ) y ON y.far_id = p.id
+        SET p.link_count = GREATEST(p.link_count - y.c, 0)
+        """,
+        tuple(port_ids) + tuple(port_ids),
+    )
+
+
+def recount_link_counts(project_id: int = None) -> int:
+    """修复任务：按 link 表集合化重算 port.link_count，返回修正的端口数。"""
+    where, params = "", ()
+    if project_id is not None:
+        where, params = "AND p.device_id IN (SELECT id FROM device WHERE project_id=%s)", (project_id,)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            f"""
+            UPDATE port p
+            LEFT JOIN (
+                SELECT port_id, COUNT(*) AS c
+                FROM (
+                    SELECT a_port_id AS port_id FROM link WHERE status='CONNECTED'
+                    UNION ALL
+                    SELECT b_port_id FROM link WHERE status='CONNECTED'
+                ) x
+                GROUP BY port_id
+            ) y ON y.port_id = p.id
+            SET p.link_count = COALESCE(y.c, 0)
+            WHERE p.link_count <> COALESCE(y.c, 0) {where}
             """,
-            (project_id, port_id, port_id),
+            params,
         )
-        c = (cur.fetchone() or {}).get("c", 0)
-        return int(c) > 0
+        fixed = int(cur.rowcount or 0)
+        conn.commit()
+        return fixed
 
 
 # ================== 端口基础操作 ==================
 
+@read_only
 def list_ports_for_device(project_id: int, device_id: int) -> List[Dict[str, Any]]:
     """返回设备下所有端口及其占用/属性信息，供前端分组折叠。"""
     sql = """
         SELECT p.id AS port_id, p.name, p.port_type_id, p.is_active,
+               p.link_count, p.max_links,
                pt.name AS attr_name, t.name AS port_type_name
         FROM port p
         LEFT JOIN port_template pt ON pt.id = p.port_template_id
         LEFT JOIN port_type t ON t.id = p.port_type_id
         JOIN device d ON d.id = p.device_id
-        WHERE d.project_id=%s AND d.id=%s
-        ORDER BY t.name, pt.name, p.index_no, p.id
+        WHERE d.project_id=%s AND d.id=%s AND d.deleted_at IS NULL
+        ORDER BY t.name, pt.name, p.sort_key, p.id
     """
 
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, (project_id, device_id))
         rows = cur.fetchall() or []
 
-    items: List[Dict[str, Any]] = []
-    for r in rows:
-        pid = int(r["port_id"])
-        items.append({**r, "occupied": _is_port_occupied(project_id, pid)})
-    return items
+    return [{**r, "occupied": _row_full(r)} for r in rows]
 
 
+@read_only
 def find_matching_ports(project_id: int, src_port_id: int, target_device_id: int) -> List[Dict[str, Any]]:
     """给定源端口和目标设备，返回可连接的目标端口列表。"""
     with get_conn() as conn, conn.cursor() as cur:
@@ -76,60 +191,14 @@ def find_matching_ports(project_id: int, src_port_id: int, target_device_id: int
             LEFT JOIN port_template pt ON pt.id = p.port_template_id
             LEFT JOIN port_type t ON t.id = p.port_type_id
             JOIN device d ON d.id = p.device_id
-            WHERE d.project_id=%s AND d.id=%s AND p.is_active=1
+            WHERE d.project_id=%s AND d.id=%s AND d.deleted_at IS NULL AND p.is_active=1
                   AND p.port_type_id=%s AND COALESCE(pt.name,'')=COALESCE(%s,'')
-            ORDER BY p.index_no, p.id
+                  AND p.link_count < p.max_links
+            ORDER BY p.sort_key, p.id
             """,
             (project_id, target_device_id, src["port_type_id"], src.get("attr_name")),
         )
-        rows = cur.fetchall() or []
-
-    result: List[Dict[str, Any]] = []
-    for r in rows:
-        pid = int(r["port_id"])
-        if _is_port_occupied(project_id, pid):
-            continue
-        result.append(r)
-    return result
-
-
-def update_port_active(project_id: int, port_id: int, is_active: bool) -> bool:
-    """切换端口开关状态。若端口已连线且要关闭则报错。"""
-    if not is_active and _is_port_occupied(project_id, port_id):
-        raise ValueError("端口已连线，无法关闭")
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            "UPDATE port SET is_active=%s WHERE id=%s",
-            (1 if is_active else 0, port_id),
-        )
-        conn.commit()
-        return cur.rowcount > 0
-
-
-            SELECT p.max_links,
-                   (
-                     SELECT COUNT(*) FROM link
-                     WHERE project_id=%s AND status='CONNECTED'
-                       AND (a_port_id=%s OR b_port_id=%s)
-                   ) AS c
-            FROM port p
-            WHERE p.id=%s
-            """,
-            (project_id, port_id, port_id, port_id),
-        )
-        row = cur.fetchone()
-        if not row:
-            return True
-        return int(row.get("c", 0)) >= int(row.get("max_links") or 1)
-
-    result: List[Dict[str, Any]] = []
-    for r in rows:
-        pid = int(r["port_id"])
-        if _is_port_occupied(project_id, pid):
-            continue
-        result.append(r)
-    return result
-
+        return cur.fetchall() or []
 
 
 def update_port_active(project_id: int, port_id: int, is_active: bool) -> bool:
@@ -141,11 +210,14 @@ def update_port_active(project_id: int, port_id: int, is_active: bool) -> bool:
             "UPDATE port SET is_active=%s WHERE id=%s",
             (1 if is_active else 0, port_id),
         )
+        changed = cur.rowcount > 0
+        bump_project_rev(cur, project_id, topology=False)
         conn.commit()
-        return cur.rowcount > 0
+        return changed
 
 # ================== 单设备端口列表 ==================
 
+@read_only
 def list_ports_with_links(project_id: int, device_id: int) -> List[Dict[str, Any]]:
     """返回设备的所有端口及其连接信息。"""
     with get_conn() as conn, conn.cursor() as cur:
@@ -157,8 +229,8 @@ def list_ports_with_links(project_id: int, device_id: int) -> List[Dict[str, Any
             LEFT JOIN port_template pt ON pt.id = p.port_template_id
             LEFT JOIN port_type tpt ON tpt.id = p.port_type_id
             JOIN device d ON d.id = p.device_id
-            WHERE d.project_id=%s AND d.id=%s AND p.is_active=1
-            ORDER BY p.id ASC
+            WHERE d.project_id=%s AND d.id=%s AND d.deleted_at IS NULL AND p.is_active=1
+            ORDER BY p.sort_key, p.id
             """,
             (project_id, device_id),
         )
@@ -168,8 +240,9 @@ def list_ports_with_links(project_id: int, device_id: int) -> List[Dict[str, Any
 
         port_ids = [int(p["port_id"]) for p in ports]
         placeholders = ",".join(["%s"] * len(port_ids))
-        cur.execute(
-            f"""
+        # A 端、B 端各查一段再 UNION ALL，分别走 uk_link_a_port / uk_link_b_port；
+        # 第二段排除 A 端也在本设备上的连线（已由第一段取到）
+        select = """
             SELECT l.id AS link_id, l.a_port_id, l.b_port_id,
                    da.id AS a_device_id, da.name AS a_device_name, la.name AS a_port_name,
                    db.id AS b_device_id, db.name AS b_device_name, lb.name AS b_port_name
@@ -179,9 +252,14 @@ def list_ports_with_links(project_id: int, device_id: int) -> List[Dict[str, Any
             JOIN port lb ON lb.id = l.b_port_id
             JOIN device db ON db.id = l.b_device_id
             WHERE l.project_id=%s AND l.status='CONNECTED'
-              AND (l.a_port_id IN ({placeholders}) OR l.b_port_id IN ({placeholders}))
+        """
+        cur.execute(
+            f"""
+            {select} AND l.a_port_id IN ({placeholders})
+            UNION ALL
+            {select} AND l.b_port_id IN ({placeholders}) AND l.a_port_id NOT IN ({placeholders})
             """,
-            [project_id] + port_ids + port_ids,
+            [project_id] + port_ids + [project_id] + port_ids + port_ids,
         )
         link_rows = cur.fetchall() or []
 
@@ -215,6 +293,7 @@ def list_ports_with_links(project_id: int, device_id: int) -> List[Dict[str, Any
 
 # ================== 候选端口 ==================
 
+@read_only
 def find_candidates(project_id: int, device_a_id: int, device_b_id: int) -> Dict[str, List[Dict[str, Any]]]:
     """查找两台设备可配对的候选端口。"""
     if device_a_id == device_b_id:
@@ -224,12 +303,13 @@ def find_candidates(project_id: int, device_a_id: int, device_b_id: int) -> Dict
         cur.execute(
             """
             SELECT p.id AS port_id, p.name, p.port_type_id, p.is_active,
+                   p.link_count, p.max_links,
                    pt.name AS attr_name, tpt.name AS port_type_name
             FROM port p
             LEFT JOIN port_template pt ON pt.id = p.port_template_id
             LEFT JOIN port_type tpt ON tpt.id = p.port_type_id
             JOIN device d ON d.id = p.device_id
-            WHERE d.project_id=%s AND d.id=%s AND p.is_active=1
+            WHERE d.project_id=%s AND d.id=%s AND d.deleted_at IS NULL AND p.is_active=1
             """,
             (project_id, device_a_id),
         )
@@ -238,23 +318,20 @@ def find_candidates(project_id: int, device_a_id: int, device_b_id: int) -> Dict
         cur.execute(
             """
             SELECT p.id AS port_id, p.name, p.port_type_id, p.is_active,
+                   p.link_count, p.max_links,
                    pt.name AS attr_name, tpt.name AS port_type_name
             FROM port p
             LEFT JOIN port_template pt ON pt.id = p.port_template_id
             LEFT JOIN port_type tpt ON tpt.id = p.port_type_id
             JOIN device d ON d.id = p.device_id
-            WHERE d.project_id=%s AND d.id=%s AND p.is_active=1
+            WHERE d.project_id=%s AND d.id=%s AND d.deleted_at IS NULL AND p.is_active=1
             """,
             (project_id, device_b_id),
         )
         right_rows = cur.fetchall() or []
 
     def enrich(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        out: List[Dict[str, Any]] = []
-        for r in rows:
-            pid = int(r["port_id"])
-            out.append({**r, "occupied": _is_port_occupied(project_id, pid)})
-        return out
+        return [{**r, "occupied": _row_full(r)} for r in rows]
 
     left = enrich(left_rows)
     right = enrich(right_rows)
@@ -292,10 +369,13 @@ def create_link(project_id: int, a_port_id: int, b_port_id: int, status: str = "
         cur.execute(
             """
             SELECT p.id AS port_id, p.name, p.port_type_id, p.is_active, pt.name AS rule_attr_name,
-                   d.id AS device_id, d.project_id
+                   p.link_count, p.max_links,
+                   d.id AS device_id, d.project_id,
+                   EXISTS(SELECT 1 FROM link l WHERE l.project_id=d.project_id AND l.a_port_id=p.id) AS a_used,
+                   EXISTS(SELECT 1 FROM link l WHERE l.project_id=d.project_id AND l.b_port_id=p.id) AS b_used
             FROM port p
             LEFT JOIN port_template pt ON pt.id = p.port_template_id
-            JOIN device d ON d.id = p.device_id
+            JOIN device d ON d.id = p.device_id AND d.deleted_at IS NULL
             WHERE p.id=%s
             """,
             (a_port_id,),
@@ -304,10 +384,13 @@ def create_link(project_id: int, a_port_id: int, b_port_id: int, status: str = "
         cur.execute(
             """
             SELECT p.id AS port_id, p.name, p.port_type_id, p.is_active, pt.name AS rule_attr_name,
-                   d.id AS device_id, d.project_id
+                   p.link_count, p.max_links,
+                   d.id AS device_id, d.project_id,
+                   EXISTS(SELECT 1 FROM link l WHERE l.project_id=d.project_id AND l.a_port_id=p.id) AS a_used,
+                   EXISTS(SELECT 1 FROM link l WHERE l.project_id=d.project_id AND l.b_port_id=p.id) AS b_used
             FROM port p
             LEFT JOIN port_template pt ON pt.id = p.port_template_id
-            JOIN device d ON d.id = p.device_id
+            JOIN device d ON d.id = p.device_id AND d.deleted_at IS NULL
             WHERE p.id=%s
             """,
             (b_port_id,),
@@ -326,33 +409,512 @@ def create_link(project_id: int, a_port_id: int, b_port_id: int, status: str = "
         raise ValueError("端口类型不匹配")
     if (a.get("rule_attr_name") or "") != (b.get("rule_attr_name") or ""):
         raise ValueError("端口属性不匹配")
-    if _is_port_occupied(project_id, a_port_id) or _is_port_occupied(project_id, b_port_id):
+    if status == "CONNECTED" and (_row_full(a) or _row_full(b)):
         raise ValueError("端口连接数已达上限")
+    # link 两端各有唯一键：已作过 A 端的端口只能再作 B 端，必要时对调方向
+    ends = _orient(a, b)
+    if ends is None:
+        raise ValueError("端口连接方向已被占用（每个端口最多作一次 A 端、一次 B 端）")
+    a, b = ends
+    a_port_id, b_port_id = int(a["port_id"]), int(b["port_id"])
 
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            """
-            INSERT INTO link (project_id, a_port_id, b_port_id, a_device_id, b_device_id, status, created_at)
-            VALUES (%s,%s,%s,
-                    (SELECT device_id FROM port WHERE id=%s),
-                    (SELECT device_id FROM port WHERE id=%s),
-                    %s, NOW())
-            """,
-            (project_id, a_port_id, b_port_id, a_port_id, b_port_id, status),
-        )
-        conn.commit()
-        return int(cur.lastrowid)
+        conn.begin()
+        try:
+            # 计数与连线同一事务：条件更新保证并发下不超过 max_links
+            if status == "CONNECTED":
+                _take_capacity(cur, [a_port_id, b_port_id])
+            cur.execute(
+                """
+                INSERT INTO link (project_id, a_port_id, b_port_id, a_device_id, b_device_id, status, created_at)
+                VALUES (%s,%s,%s,%s,%s,%s, NOW())
+                """,
+                (project_id, a_port_id, b_port_id, a["device_id"], b["device_id"], status),
+            )
+            link_id = int(cur.lastrowid)
+            sync_links(cur, [link_id])
+            bump_project_rev(cur, project_id, topology=(status == "CONNECTED"))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return link_id
 
 
 def delete_link(project_id: int, link_id: int) -> bool:
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("DELETE FROM link WHERE id=%s AND project_id=%s", (link_id, project_id))
+        conn.begin()
+        try:
+            cur.execute(
+                "SELECT a_port_id, b_port_id, status FROM link WHERE id=%s AND project_id=%s FOR UPDATE",
+                (link_id, project_id),
+            )
+            row = cur.fetchone()
+            if not row:
+                conn.rollback()
+                return False
+            cur.execute("DELETE FROM link WHERE id=%s", (link_id,))
+            if row["status"] == "CONNECTED":
+                _release_capacity(cur, [row["a_port_id"], row["b_port_id"]])
+            bump_project_rev(cur, project_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return True
+
+
+# ================== 批量连线 / 自动配对 ==================
+
+LINK_INSERT_BATCH = 1000
+
+
+def _load_ports_for_links(cur, port_ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+    """一次取出建连校验所需的端口信息：{port_id: row}"""
+    ids = sorted(set(port_ids))
+    placeholders = ",".join(["%s"] * len(ids))
+    cur.execute(
+        f"""
+        SELECT p.id AS port_id, p.name, p.device_id, p.port_type_id, p.is_active,
+               p.link_count, p.max_links, COALESCE(pt.name, '') AS attr_name, d.project_id
+        FROM port p
+        JOIN device d ON d.id = p.device_id AND d.deleted_at IS NULL
+        LEFT JOIN port_template pt ON pt.id = p.port_template_id
+        WHERE p.id IN ({placeholders})
+        """,
+        tuple(ids),
+    )
+    return {int(r["port_id"]): r for r in cur.fetchall() or []}
+
+
+def create_links_bulk(project_id: int, pairs: Sequence[Tuple[int, int]], status: str = "CONNECTED",
+                      plan_batch: str = None) -> int:
+    """
+    批量建连（同一事务）：
+      - 端口信息一次查询，逐对做与 create_link 相同的校验
+      - CONNECTED：连接计数按端口汇总后一条条件 UPDATE 占用，任一端口超限整体回滚
+        PLANNED：不占计数，以 plan_batch 标记同一批规划
+      - 连线多值 INSERT
+    返回新建连线数。
+    """
+    pairs = [(int(a), int(b)) for a, b in pairs]
+    if not pairs:
+        return 0
+    with get_conn() as conn, conn.cursor() as cur:
+        ports = _load_ports_for_links(cur, [x for pair in pairs for x in pair])
+        rows = []
+        for a_id, b_id in pairs:
+            a, b = ports.get(a_id), ports.get(b_id)
+            label = f"{a_id}↔{b_id}"
+            if not a or not b:
+                raise ValueError(f"端口不存在：{label}")
+            if a_id == b_id or int(a["device_id"]) == int(b["device_id"]):
+                raise ValueError(f"不能连接同一台设备上的端口：{label}")
+            if int(a["project_id"]) != project_id or int(b["project_id"]) != project_id:
+                raise ValueError(f"项目不匹配：{label}")
+            if not a["is_active"] or not b["is_active"]:
+                raise ValueError(f"端口已关闭，不能连线：{label}")
+            if int(a["port_type_id"] or 0) != int(b["port_type_id"] or 0) or a["attr_name"] != b["attr_name"]:
+                raise ValueError(f"端口类型或属性不匹配：{label}")
+            rows.append((project_id, a_id, b_id, a["device_id"], b["device_id"], status, plan_batch))
+
+        conn.begin()
+        try:
+            if status == "CONNECTED":
+                need = Counter(x for pair in pairs for x in pair)
+                items = list(need.items())
+                for i in range(0, len(items), LINK_INSERT_BATCH):
+                    chunk = items[i:i + LINK_INSERT_BATCH]
+                    derived = " UNION ALL ".join(["SELECT %s AS id, %s AS n"] * len(chunk))
+                    cur.execute(
+                        f"""
+                        UPDATE port p
+                        JOIN ({derived}) x ON x.id = p.id
+                        JOIN device d ON d.id = p.device_id
+                        SET p.link_count = p.link_count + x.n
+                        WHERE p.link_count + x.n <= p.max_links AND d.deleted_at IS NULL
+                        """,
+                        tuple(v for kv in chunk for v in kv),
+                    )
+                    if cur.rowcount != len(chunk):
+                        raise ValueError("部分端口连接数已达上限")
+            sql = """
+                INSERT INTO link (project_id, a_port_id, b_port_id, a_device_id, b_device_id, status, plan_batch, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, NOW())
+            """
+            for i in range(0, len(rows), LINK_INSERT_BATCH):
+                cur.executemany(sql, rows[i:i + LINK_INSERT_BATCH])
+                if status == "CONNECTED":
+                    sync_ports(cur, project_id, [r[1] for r in rows[i:i + LINK_INSERT_BATCH]])
+            bump_project_rev(cur, project_id, topology=(status == "CONNECTED"))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(rows)
+
+
+def _load_free_ports(cur, project_id: int, device_ids: Sequence[int]) -> List[Dict[str, Any]]:
+    """
+    设备上仍有余量的启用端口（已被 PLANNED 连线预留的名额也扣除），
+    带上剩余容量及该端口是否已做过 A 端 / B 端
+    （link 表按 (project_id, a_port_id) / (project_id, b_port_id) 唯一）。
+    """
+    placeholders = ",".join(["%s"] * len(device_ids))
+    cur.execute(
+        f"""
+        SELECT p.id AS port_id, p.name, p.device_id, p.port_type_id,
+               COALESCE(pt.name, '') AS attr_name, t.name AS port_type_name,
+               p.max_links - p.link_count
+                 - (SELECT COUNT(*) FROM link l
+                    WHERE l.project_id=%s AND l.status='PLANNED' AND l.a_port_id=p.id)
+                 - (SELECT COUNT(*) FROM link l
+                    WHERE l.project_id=%s AND l.status='PLANNED' AND l.b_port_id=p.id) AS free,
+               EXISTS(SELECT 1 FROM link l WHERE l.project_id=%s AND l.a_port_id=p.id) AS a_used,
+               EXISTS(SELECT 1 FROM link l WHERE l.project_id=%s AND l.b_port_id=p.id) AS b_used
+        FROM port p
+        JOIN device d ON d.id = p.device_id
+        LEFT JOIN port_template pt ON pt.id = p.port_template_id
+        LEFT JOIN port_type t ON t.id = p.port_type_id
+        WHERE d.project_id=%s AND d.deleted_at IS NULL AND p.device_id IN ({placeholders})
+          AND p.is_active=1 AND p.link_count < p.max_links
+        HAVING free > 0
+        """,
+        (project_id, project_id, project_id, project_id, project_id, *device_ids),
+    )
+    return cur.fetchall() or []
+
+
+def _slots(ports: List[Dict[str, Any]]):
+    """按剩余容量轮转展开：第一轮每个端口一次，第二轮容量 ≥2 的再来一次……"""
+    out, r = [], 0
+    while True:
+        layer = [p for p in ports if int(p["free"]) > r]
+        if not layer:
+            return out
+        out.extend(layer)
+        r += 1
+
+
+def _orient(x: Dict[str, Any], y: Dict[str, Any]):
+    """选择连线方向：优先 x 作 A 端；两个方向都被唯一键占用时返回 None。"""
+    if not x["a_used"] and not y["b_used"]:
+        return x, y
+    if not y["a_used"] and not x["b_used"]:
+        return y, x
+    return None
+
+
+def _roles(p: Dict[str, Any]):
+    """端口还能承担的新连线角色（A/B 端各受唯一键约束最多一次）及可用名额数。"""
+    roles = ("" if p["a_used"] else "A") + ("" if p["b_used"] else "B")
+    return roles, min(int(p["free"]), len(roles))
+
+
+def _split_roles(ports: List[Dict[str, Any]], first: str, n_first: int):
+    """
+    按角色展开端口：名额 = 可用角色数的端口两种角色都用；只剩 1 个名额却两种角色都可用的端口（“可选”端口）
+    按自然顺序前 n_first 个取 first 角色，其余取另一角色。返回 (A 列表, B 列表)，各自保持端口顺序。
+    """
+    a_list, b_list, flex = [], [], 0
+    for p in ports:
+        roles, cap = _roles(p)
+        if cap == len(roles):
+            use = roles
+        elif cap:
+            use = first if flex < n_first else roles.replace(first, "")
+            flex += 1
+        else:
+            use = ""
+        if "A" in use: a_list.append(p)
+        if "B" in use: b_list.append(p)
+    return a_list, b_list
+
+
+def _untangle(m: List[Tuple[Dict[str, Any], Dict[str, Any]]], banned: Set[Tuple[int, int]]):
+    """
+    m 为 [(源端口, 目标端口), ...]；把落在 banned 中的配对与下一条配对交换目标端。
+    banned 本身是一个匹配（每个端口至多出现一次），交换后两条新配对都不可能再落入 banned，
+    因此 len(m) ≥ 2 时一遍即可全部消除。
+    """
+    for i in range(len(m)):
+        if (m[i][0]["port_id"], m[i][1]["port_id"]) in banned:
+            k = (i + 1) % len(m)
+            m[i], m[k] = (m[i][0], m[k][1]), (m[k][0], m[i][1])
+
+
+def assign_port_pairs(sources: List[Dict[str, Any]], targets: List[Dict[str, Any]],
+                      target_order: Dict[int, int] = None) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """
+    在 (port_type_id, 属性名) 相同的组内求最大配对：
+      - 每条新连线占用一端的 A 角色和另一端的 B 角色（uk_link_a_port / uk_link_b_port），
+        端口总连线数不超过剩余容量；组内任意两端口都兼容（完全二部图）
+      - 因此连线分两类：源 A → 目标 B、目标 A → 源 B，各自的上限是两侧对应角色数的较小值；
+        只剩 1 个名额的端口在两类间取舍，枚举源侧取 A 的个数、目标侧取对应最优值即得最大总数
+      - 同一对端口不重复配对：两类配对撞车时在同类内交换对端消除；
+        只有两侧都仅剩同一对端口时才少配一条（此时确实只能连一条）
+      - 两侧均按自然顺序（目标侧先按 target_order 的设备顺序）取用端口
+    返回 [(A 端口行, B 端口行), ...]（已定向）。
+    """
+    target_order = target_order or {}
+    groups = {}
+    for p in sources: groups.setdefault((p["port_type_id"], p["attr_name"]), ([], []))[0].append(p)
+    for p in targets:
+        key = (p["port_type_id"], p["attr_name"])
+        if key in groups: groups[key][1].append(p)
+    pairs = []
+    for key in sorted(groups, key=lambda k: (k[0] or 0, k[1])):
+        src, dst = groups[key]
+        src = sorted(src, key=lambda p: natural_key(p["name"]))
+        dst = sorted(dst, key=lambda p: (target_order.get(p["device_id"], 0), natural_key(p["name"])))
+
+        def counts(ports):
+            fixed_a = fixed_b = flex = 0
+            for p in ports:
+                roles, cap = _roles(p)
+                if cap == len(roles):
+                    fixed_a += "A" in roles; fixed_b += "B" in roles
+                elif cap:
+                    flex += 1
+            return fixed_a, fixed_b, flex
+
+        sa, sb, fs = counts(src)
+        ta, tb, ft = counts(dst)
+        # i = 可选源端口中取 A 的个数，j = 可选目标端口中取 B 的个数；total 对 j 是分段线性的，只需看拐点
+        best = (-1, 0, 0)
+        for i in range(fs, -1, -1):
+            for j in {0, ft, min(ft, max(0, sa + i - tb)), min(ft, max(0, ft + ta - sb - fs + i))}:
+                total = min(sa + i, tb + j) + min(sb + fs - i, ta + ft - j)
+                if total > best[0]:
+                    best = (total, i, j)
+        _, i, j = best
+        src_a, src_b = _split_roles(src, "A", i)
+        dst_a, dst_b = _split_roles(dst, "B", j)
+
+        fwd = list(zip(src_a, dst_b))   # 源作 A 端
+        rev = list(zip(src_b, dst_a))   # 目标作 A 端
+        banned = {(x["port_id"], y["port_id"]) for x, y in rev}
+        if len(fwd) >= 2:
+            _untangle(fwd, banned)
+        elif len(rev) >= 2:
+            _untangle(rev, {(x["port_id"], y["port_id"]) for x, y in fwd})
+        elif fwd and rev and (fwd[0][0]["port_id"], fwd[0][1]["port_id"]) in banned:
+            # 各只有一条且撞车：换用同角色的下一个端口，没有可换的就只连一条
+            if len(dst_b) > 1: fwd = [(src_a[0], dst_b[1])]
+            elif len(src_a) > 1: fwd = [(src_a[1], dst_b[0])]
+            elif len(dst_a) > 1: rev = [(src_b[0], dst_a[1])]
+            elif len(src_b) > 1: rev = [(src_b[1], dst_a[0])]
+            else: rev = []
+
+        pos = {p["port_id"]: n for n, p in enumerate(src)}
+        tpos = {p["port_id"]: n for n, p in enumerate(dst)}
+        group = [(x, y, x, y) for x, y in fwd] + [(x, y, y, x) for x, y in rev]
+        group.sort(key=lambda t: (pos[t[0]["port_id"]], tpos[t[1]["port_id"]]))
+        pairs.extend((a, b) for _, _, a, b in group)
+    return pairs
+
+
+def plan_auto_pairs(project_id: int, device_id: int, target_device_ids: Sequence[int]) -> Dict[str, Any]:
+    """
+    自动配对预览：设备 A 的空闲端口 → 一台或多台目标设备的兼容空闲端口。
+    返回 {"pairs": [...], "groups": [{port_type_name, attr_name, left_free, right_free, paired}]}
+    """
+    target_device_ids = [int(t) for t in target_device_ids if int(t) != int(device_id)]
+    if not target_device_ids:
+        raise ValueError("请选择目标设备")
+    with get_conn() as conn, conn.cursor() as cur:
+        sources = _load_free_ports(cur, project_id, [device_id])
+        targets = _load_free_ports(cur, project_id, target_device_ids)
+        placeholders = ",".join(["%s"] * (len(target_device_ids) + 1))
+        cur.execute(f"SELECT id, name FROM device WHERE id IN ({placeholders}) AND deleted_at IS NULL",
+                    (device_id, *target_device_ids))
+        dev_names = {r["id"]: r["name"] for r in cur.fetchall() or []}
+
+    order = {d: i for i, d in enumerate(target_device_ids)}
+    pairs = assign_port_pairs(sources, targets, order)
+
+    stats: Dict[Tuple, Dict[str, Any]] = {}
+    for side, rows in (("left_free", sources), ("right_free", targets)):
+        for p in rows:
+            g = stats.setdefault((p["port_type_id"], p["attr_name"]), {
+                "port_type_name": p.get("port_type_name") or "未分类",
+                "attr_name": p["attr_name"] or "（未命名属性）",
+                "left_free": 0, "right_free": 0, "paired": 0,
+            })
+            g[side] += int(p["free"])
+    out = []
+    for a, b in pairs:
+        stats[(a["port_type_id"], a["attr_name"])]["paired"] += 1
+        out.append({
+            "a_port_id": a["port_id"], "a_port_name": a["name"],
+            "a_device_id": a["device_id"], "a_device_name": dev_names.get(a["device_id"]),
+            "b_port_id": b["port_id"], "b_port_name": b["name"],
+            "b_device_id": b["device_id"], "b_device_name": dev_names.get(b["device_id"]),
+            "port_type_name": a.get("port_type_name") or "未分类",
+            "attr_name": a["attr_name"],
+        })
+    return {"pairs": out, "groups": list(stats.values())}
+
+
+# ================== 批量端口分配规划 ==================
+
+def plan_port_allocation(project_id: int, source_device_ids: Sequence[int], target_device_ids: Sequence[int],
+                         commit: bool = False) -> Dict[str, Any]:
+    """
+    机群端口分配规划：为一批源设备（如服务器）的每个空闲端口，在一批目标设备（如 leaf 交换机）上找兼容空闲端口。
+      - 两侧空闲容量各一次批量查询，在内存中求解
+      - 兼容 = (port_type_id, 规则名称) 相同；目标端口按设备内自然顺序取用
+      - 贪心 + 均衡：优先本源设备尚未用过的目标设备（多网卡分散到不同交换机），
+        其次已分配最少、剩余最多的目标设备
+    commit=True 时以 PLANNED 状态写入 link（同一 plan_batch），之后可用 promote_plan 一次转为 CONNECTED。
+    返回 {"plan_batch", "pairs": [...], "unassigned": [...], "load": [{device_id, device_name, assigned, remaining}]}
+    """
+    source_ids = [int(x) for x in source_device_ids]
+    target_ids = [int(x) for x in target_device_ids if int(x) not in source_ids]
+    if not source_ids or not target_ids:
+        raise ValueError("请选择源设备与目标设备")
+
+    with get_conn() as conn, conn.cursor() as cur:
+        sources = _load_free_ports(cur, project_id, source_ids)
+        targets = _load_free_ports(cur, project_id, target_ids)
+        ids = source_ids + target_ids
+        placeholders = ",".join(["%s"] * len(ids))
+        cur.execute(f"SELECT id, name FROM device WHERE project_id=%s AND id IN ({placeholders}) AND deleted_at IS NULL",
+                    (project_id, *ids))
+        dev_names = {r["id"]: r["name"] for r in cur.fetchall() or []}
+
+    # 目标侧：{兼容键: {设备: [端口名额...]}}，名额按自然顺序、容量轮转展开
+    pools: Dict[Tuple, Dict[int, List[Dict[str, Any]]]] = {}
+    by_dev: Dict[Tuple, Dict[int, List[Dict[str, Any]]]] = {}
+    for p in targets:
+        by_dev.setdefault((p["port_type_id"], p["attr_name"]), {}).setdefault(p["device_id"], []).append(p)
+    for key, devs in by_dev.items():
+        pools[key] = {d: list(reversed(_slots(sorted(ps, key=lambda p: natural_key(p["name"])))))
+                      for d, ps in devs.items()}
+
+    assigned = Counter()
+    used_by_source: Dict[int, Set[int]] = {}
+    pairs, unassigned = [], []
+    seen = set()
+    src_order = {d: i for i, d in enumerate(source_ids)}
+    sources = sorted(sources, key=lambda p: (src_order.get(p["device_id"], 0), natural_key(p["name"])))
+    for x in _slots(sources):
+        pool = pools.get((x["port_type_id"], x["attr_name"])) or {}
+        used = used_by_source.setdefault(x["device_id"], set())
+        placed = False
+        for d in sorted((d for d, slots in pool.items() if slots),
+                        key=lambda d: (d in used, assigned[d], -len(pool[d]))):
+            slots = pool[d]
+            # 从末尾（自然顺序最前）取第一个可定向且未与 x 配过的名额
+            for k in range(len(slots) - 1, -1, -1):
+                y = slots[k]
+                if (x["port_id"], y["port_id"]) in seen:
+                    continue
+                o = _orient(x, y)
+                if o is None:
+                    continue
+                a, b = o
+                a["a_used"] = b["b_used"] = 1
+                seen.add((x["port_id"], y["port_id"]))
+                pairs.append((a, b))
+                del slots[k]
+                assigned[d] += 1
+                used.add(d)
+                placed = True
+                break
+            if placed:
+                break
+        if not placed:
+            unassigned.append({"port_id": x["port_id"], "port_name": x["name"], "device_id": x["device_id"],
+                               "device_name": dev_names.get(x["device_id"]),
+                               "port_type_name": x.get("port_type_name") or "未分类", "attr_name": x["attr_name"]})
+
+    plan_batch = None
+    if commit and pairs:
+        plan_batch = uuid.uuid4().hex[:16]
+        create_links_bulk(project_id, [(a["port_id"], b["port_id"]) for a, b in pairs],
+                          status="PLANNED", plan_batch=plan_batch)
+
+    remaining = Counter()
+    for devs in pools.values():
+        for d, slots in devs.items():
+            remaining[d] += len(slots)
+    return {
+        "plan_batch": plan_batch,
+        "pairs": [{
+            "a_port_id": a["port_id"], "a_port_name": a["name"],
+            "a_device_id": a["device_id"], "a_device_name": dev_names.get(a["device_id"]),
+            "b_port_id": b["port_id"], "b_port_name": b["name"],
+            "b_device_id": b["device_id"], "b_device_name": dev_names.get(b["device_id"]),
+            "port_type_name": a.get("port_type_name") or "未分类", "attr_name": a["attr_name"],
+        } for a, b in pairs],
+        "unassigned": unassigned,
+        "load": [{"device_id": d, "device_name": dev_names.get(d),
+                  "assigned": assigned[d], "remaining": remaining[d]} for d in target_ids],
+    }
+
+
+def promote_plan(project_id: int, plan_batch: str) -> int:
+    """把一批 PLANNED 连线转为 CONNECTED：按端口汇总一次占用连接数，再一条 UPDATE 改状态。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        conn.begin()
+        try:
+            planned = """
+                SELECT a_port_id AS port_id FROM link
+                WHERE project_id=%s AND plan_batch=%s AND status='PLANNED'
+                UNION ALL
+                SELECT b_port_id FROM link
+                WHERE project_id=%s AND plan_batch=%s AND status='PLANNED'
+            """
+            args = (project_id, plan_batch, project_id, plan_batch)
+            cur.execute(f"SELECT COUNT(DISTINCT port_id) AS c FROM ({planned}) x", args)
+            n_ports = int(cur.fetchone()["c"] or 0)
+            if not n_ports:
+                conn.rollback()
+                return 0
+            cur.execute(
+                f"""
+                UPDATE port p
+                JOIN (SELECT port_id, COUNT(*) AS n FROM ({planned}) x GROUP BY port_id) y ON y.port_id = p.id
+                JOIN device d ON d.id = p.device_id
+                SET p.link_count = p.link_count + y.n
+                WHERE p.link_count + y.n <= p.max_links AND p.is_active = 1 AND d.deleted_at IS NULL
+                """,
+                args,
+            )
+            if cur.rowcount != n_ports:
+                raise ValueError("部分端口已停用、已删除或连接数已达上限，无法转为已连接")
+            cur.execute(
+                "UPDATE link SET status='CONNECTED' WHERE project_id=%s AND plan_batch=%s AND status='PLANNED'",
+                (project_id, plan_batch),
+            )
+            promoted = int(cur.rowcount or 0)
+            sync_plan(cur, project_id, plan_batch)
+            bump_project_rev(cur, project_id)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return promoted
+
+
+def discard_plan(project_id: int, plan_batch: str) -> int:
+    """删除一批尚未转正的 PLANNED 连线。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(
+            "DELETE FROM link WHERE project_id=%s AND plan_batch=%s AND status='PLANNED'",
+            (project_id, plan_batch),
+        )
+        n = int(cur.rowcount or 0)
+        if n:
+            bump_project_rev(cur, project_id, topology=False)   # PLANNED 不在拓扑内
         conn.commit()
-        return cur.rowcount > 0
+        return n
 
 
 # ================== 查询 ==================
 
+@read_only
 def list_links_in_project(project_id: int) -> List[Dict[str, Any]]:
     """返回项目中已建立的连接列表。"""
     with get_conn() as conn, conn.cursor() as cur:
@@ -376,110 +938,88 @@ def list_links_in_project(project_id: int) -> List[Dict[str, Any]]:
         return cur.fetchall() or []
 
 
+@read_only
 def list_cables_paginated(project_id: int, page: int = 1, page_size: int = 50) -> Dict[str, Any]:
-    """分页返回线缆清册。"""
+    """分页返回线缆清册（读 cable_view，按 (project_id, sort_key) 索引分页）；items 为 CableRow。"""
     page = max(1, int(page or 1))
     page_size = max(1, min(int(page_size or 50), 200))
     offset = (page - 1) * page_size
 
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            "SELECT COUNT(*) AS c FROM link WHERE project_id=%s AND status='CONNECTED'",
-            (project_id,),
-        )
-        total = (cur.fetchone() or {}).get("c", 0)
+    with get_conn() as conn, conn.cursor(pymysql.cursors.Cursor) as cur:
+        cur.execute("SELECT COUNT(*) FROM cable_view WHERE project_id=%s", (project_id,))
+        total = cur.fetchone()[0]
 
         cur.execute(
-            """
-            SELECT l.id AS link_id, l.status, l.printed, l.printed_at,
-                   da.id AS a_device_id, da.name AS a_device_name,
-                   pa.id AS a_port_id, pa.name AS a_port_name,
-                   ta.id AS a_port_type_id, ta.name AS a_port_type_name,
-                   db.id AS b_device_id, db.name AS b_device_name,
-                   pb.id AS b_port_id, pb.name AS b_port_name,
-                   tb.id AS b_port_type_id, tb.name AS b_port_type_name
-            FROM link l
-            JOIN port pa ON pa.id = l.a_port_id
-            JOIN device da ON da.id = l.a_device_id
-            LEFT JOIN port_type ta ON ta.id = pa.port_type_id
-            JOIN port pb ON pb.id = l.b_port_id
-            JOIN device db ON db.id = l.b_device_id
-            LEFT JOIN port_type tb ON tb.id = pb.port_type_id
-            WHERE l.project_id=%s AND l.status='CONNECTED'
-            ORDER BY da.name ASC, ta.name ASC, pa.name ASC
+            f"""
+            SELECT {CABLE_COLUMNS}
+            FROM cable_view
+            WHERE project_id=%s
+            ORDER BY sort_key, link_id
             LIMIT %s OFFSET %s
             """,
             (project_id, page_size, offset),
         )
-        rows = cur.fetchall() or []
-
-    items: List[Dict[str, Any]] = []
-    for r in rows:
-        items.append({**r, "a_dir": "", "b_dir": ""})
+        items = list(iter_rows(cur, CableRow))
     return {"total": int(total or 0), "page": page, "page_size": page_size, "items": items}
 
 
-def fetch_cables_by_ids(project_id: int, link_ids: List[int]) -> List[Dict[str, Any]]:
+@read_only
+def fetch_cables_by_ids(project_id: int, link_ids: List[int]) -> List[CableRow]:
     if not link_ids:
         return []
     placeholders = ",".join(["%s"] * len(link_ids))
-    with get_conn() as conn, conn.cursor() as cur:
+    with get_conn() as conn, conn.cursor(pymysql.cursors.Cursor) as cur:
         cur.execute(
             f"""
-            SELECT l.id AS link_id, l.status, l.printed, l.printed_at,
-                   da.name AS a_device_name, pa.name AS a_port_name, ta.name AS a_port_type_name,
-                   db.name AS b_device_name, pb.name AS b_port_name, tb.name AS b_port_type_name
-            FROM link l
-            JOIN port pa ON pa.id = l.a_port_id
-            JOIN device da ON da.id = l.a_device_id
-            LEFT JOIN port_type ta ON ta.id = pa.port_type_id
-            JOIN port pb ON pb.id = l.b_port_id
-            JOIN device db ON db.id = l.b_device_id
-            LEFT JOIN port_type tb ON tb.id = pb.port_type_id
-            WHERE l.project_id=%s AND l.status='CONNECTED' AND l.id IN ({placeholders})
+            SELECT {CABLE_COLUMNS}
+            FROM cable_view
+            WHERE project_id=%s AND link_id IN ({placeholders})
+            ORDER BY sort_key, link_id
             """,
             [project_id] + link_ids,
         )
-        rows = cur.fetchall() or []
-    for r in rows:
-        r["a_dir"] = ""
-        r["b_dir"] = ""
-    return rows
+        return list(iter_rows(cur, CableRow))
 
 
-def fetch_all_cables(project_id: int) -> List[Dict[str, Any]]:
-    with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT l.id AS link_id, l.status, l.printed, l.printed_at,
-                   da.name AS a_device_name, pa.name AS a_port_name, ta.name AS a_port_type_name,
-                   db.name AS b_device_name, pb.name AS b_port_name, tb.name AS b_port_type_name
-            FROM link l
-            JOIN port pa ON pa.id = l.a_port_id
-            JOIN device da ON da.id = l.a_device_id
-            LEFT JOIN port_type ta ON ta.id = pa.port_type_id
-            JOIN port pb ON pb.id = l.b_port_id
-            JOIN device db ON db.id = l.b_device_id
-            LEFT JOIN port_type tb ON tb.id = pb.port_type_id
-            WHERE l.project_id=%s AND l.status='CONNECTED'
-            ORDER BY da.name ASC, ta.name ASC, pa.name ASC
-            """,
-            (project_id,),
-        )
-        rows = cur.fetchall() or []
-    for r in rows:
-        r["a_dir"] = ""
-        r["b_dir"] = ""
-    return rows
+@read_only
+def iter_all_cables(project_id: int) -> Iterator[CableRow]:
+    """项目全部线缆，按清册顺序流式产出（无缓冲游标，供全量导出逐行消费）。"""
+    return stream_rows(
+        f"""
+        SELECT {CABLE_COLUMNS}
+        FROM cable_view
+        WHERE project_id=%s
+        ORDER BY sort_key, link_id
+        """,
+        (project_id,),
+        row=CableRow,
+    )
 
 
 def mark_links_printed(project_id: int, link_ids: List[int]) -> int:
     if not link_ids:
         return 0
+    placeholders = ",".join(["%s"] * len(link_ids))
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute(
-            f"UPDATE link SET printed=1, printed_at=NOW() WHERE project_id=%s AND id IN ({','.join(['%s']*len(link_ids))})",
-            [project_id] + link_ids,
-        )
-        conn.commit()
-        return int(cur.rowcount or 0)
+        conn.begin()
+        try:
+            cur.execute(
+                f"UPDATE link SET printed=1, printed_at=NOW() WHERE project_id=%s AND id IN ({placeholders})",
+                [project_id] + link_ids,
+            )
+            n = int(cur.rowcount or 0)
+            if n:
+                cur.execute(
+                    f"""
+                    UPDATE cable_view v JOIN link l ON l.id = v.link_id
+                    SET v.printed = l.printed, v.printed_at = l.printed_at
+                    WHERE v.project_id=%s AND v.link_id IN ({placeholders})
+                    """,
+                    [project_id] + link_ids,
+                )
+                bump_project_rev(cur, project_id, topology=False)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return n
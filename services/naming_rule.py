@@ -0,0 +1,296 @@
+# services/naming_rule.py
+"""
+端口命名规则（port_template.naming_rule）：
+
+  普通字符          原样输出；{{ 与 }} 表示字面量花括号
+  {1..48}           区间
+  {1..47..2}        带步长的区间；起点大于终点时倒序，如 {48..1}
+  {01..48}          起止写了前导 0 → 按该宽度补零（01, 02, …, 48）
+  {1..4,9,11..12}   多段，逗号分隔，按书写顺序展开
+  {slot=1..4}       命名区间，与不命名等价，名字只用于说明
+  {code}/{parent}   变量，由调用方传入（端口规则传 code，拆分端口传 parent）
+
+多个区间做笛卡尔积，靠右的变化最快：
+  GE{1..2}/0/{1..48} → GE1/0/1 … GE1/0/48, GE2/0/1 … GE2/0/48
+
+规则按 (文本, 变量) 编译一次并缓存；编译结果既能按序号直接生成名字（不展开全量），
+也能把已有名字解析回序号。多条规则可合并成一个 RuleMatcher，每个名字只做一次正则匹配。
+"""
+import re
+from functools import lru_cache
+from itertools import islice, product
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+_IDENT = re.compile(r"[A-Za-z_]\w*$")
+_NUM = re.compile(r"\d+$")
+
+
+class _Range:
+    """一个区间字段：若干段 (start, step, count)，按顺序拼接。"""
+    __slots__ = ("name", "segments", "width", "size", "_offsets")
+
+    def __init__(self, name: Optional[str], segments: List[Tuple[int, int, int]], width: int):
+        self.name = name
+        self.segments = segments
+        self.width = width
+        self._offsets = []
+        total = 0
+        for _, _, count in segments:
+            self._offsets.append(total)
+            total += count
+        self.size = total
+
+    def value_at(self, i: int) -> int:
+        for (start, step, count), off in zip(self.segments, self._offsets):
+            if i < off + count:
+                return start + (i - off) * step
+        raise IndexError(i)
+
+    def index_of(self, n: int) -> Optional[int]:
+        for (start, step, count), off in zip(self.segments, self._offsets):
+            d = n - start
+            if d % step == 0 and 0 <= d // step < count:
+                return off + d // step
+        return None
+
+    def text(self, n: int) -> str:
+        return str(n).zfill(self.width) if self.width else str(n)
+
+    def texts(self) -> List[str]:
+        return [self.text(self.value_at(i)) for i in range(self.size)]
+
+
+def _parse_range(name: Optional[str], spec: str, raw: str) -> _Range:
+    segments, width = [], 0
+    for item in spec.split(","):
+        bounds = [b.strip() for b in item.strip().split("..")]
+        if not 1 <= len(bounds) <= 3 or not all(_NUM.match(b) for b in bounds):
+            raise ValueError(f"无法识别的区间：{{{raw}}}")
+        for b in bounds[:2]:
+            if len(b) > 1 and b.startswith("0"):
+                width = max(width, len(b))
+        start = int(bounds[0])
+        stop = int(bounds[1]) if len(bounds) > 1 else start
+        step = int(bounds[2]) if len(bounds) > 2 else 1
+        if step < 1:
+            raise ValueError(f"步长必须大于 0：{{{raw}}}")
+        if stop < start:
+            step = -step
+        segments.append((start, step, abs(stop - start) // abs(step) + 1))
+    return _Range(name, segments, width)
+
+
+def _tokenize(text: str) -> List[Tuple[str, object]]:
+    """拆成 [("lit", str) | ("var", name) | ("range", _Range)]，相邻字面量合并。"""
+    parts: List[Tuple[str, object]] = []
+    buf: List[str] = []
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i]
+        if ch in "{}" and text.startswith(ch * 2, i):
+            buf.append(ch)
+            i += 2
+            continue
+        if ch == "}":
+            raise ValueError(f"多余的 '}}'（位置 {i + 1}）")
+        if ch != "{":
+            buf.append(ch)
+            i += 1
+            continue
+        end = text.find("}", i + 1)
+        if end < 0:
+            raise ValueError(f"'{{' 未闭合（位置 {i + 1}）")
+        raw = text[i + 1:end].strip()
+        if buf:
+            parts.append(("lit", "".join(buf)))
+            buf = []
+        if _IDENT.match(raw):
+            parts.append(("var", raw))
+        else:
+            name, _, spec = raw.rpartition("=")
+            name = name.strip() or None
+            if name is not None and not _IDENT.match(name):
+                raise ValueError(f"无效的区间名：{{{raw}}}")
+            parts.append(("range", _parse_range(name, spec, raw)))
+        i = end + 1
+    if buf:
+        parts.append(("lit", "".join(buf)))
+    return parts
+
+
+class NamingRule:
+    """编译后的命名规则（变量已代入）。"""
+
+    def __init__(self, text: str, parts: List[Tuple[str, object]]):
+        self.text = text
+        self._lits: List[str] = []            # 区间之间的字面量，长度 = 区间数 + 1
+        self._ranges: List[_Range] = []
+        lit: List[str] = []
+        for kind, val in parts:
+            if kind == "lit":
+                lit.append(val)
+            else:
+                if self._ranges and not lit:
+                    raise ValueError("相邻的两个区间之间需要分隔字符，否则无法解析")
+                self._lits.append("".join(lit))
+                self._ranges.append(val)
+                lit = []
+        self._lits.append("".join(lit))
+
+        size, strides = 1, []
+        for rg in reversed(self._ranges):
+            strides.append(size)
+            size *= rg.size
+        self._strides = strides[::-1]
+        self.size = size
+        self.prefix = self._lits[0]   # 固定前缀，可用于 SQL LIKE 预筛
+        self.pattern = "".join(
+            re.escape(lit) + (r"(\d+)" if k < len(self._ranges) else "")
+            for k, lit in enumerate(self._lits)
+        )
+        self._regex = re.compile(self.pattern)
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return f"NamingRule({self.text!r}, size={self.size})"
+
+    # ---- 生成 ----
+
+    def name_at(self, i: int) -> str:
+        """第 i 个名字（0 起），按混合进制直接定位，不展开全量。"""
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        out = [self._lits[0]]
+        for rg, stride, lit in zip(self._ranges, self._strides, self._lits[1:]):
+            k, i = divmod(i, stride)
+            out.append(rg.text(rg.value_at(k)))
+            out.append(lit)
+        return "".join(out)
+
+    def names(self, start: int = 0, stop: Optional[int] = None) -> Iterator[str]:
+        """按顺序生成 [start, stop) 区间的名字（生成器）。"""
+        stop = self.size if stop is None else min(stop, self.size)
+        if start >= stop:
+            return iter(())
+        if not self._ranges:
+            return iter((self._lits[0],))
+        lits = self._lits
+        combos = product(*[rg.texts() for rg in self._ranges])
+        gen = ("".join(x for pair in zip(lits, c) for x in pair) + lits[-1] for c in combos)
+        return islice(gen, start, stop)
+
+    def preview(self, limit: int = 12) -> List[str]:
+        """预览：数量不超过 limit 时全部列出，否则只列首尾各一半，中间以省略项代替。"""
+        if self.size <= limit:
+            return list(self.names())
+        half = max(1, limit // 2)
+        return (list(self.names(0, half))
+                + [f"…（共 {self.size} 个）"]
+                + [self.name_at(i) for i in range(self.size - half, self.size)])
+
+    # ---- 解析 ----
+
+    def index_from_texts(self, texts: Sequence[str]) -> Optional[int]:
+        """由各区间捕获到的数字文本计算序号；超出区间或补零位数不符返回 None。"""
+        flat = 0
+        for rg, stride, t in zip(self._ranges, self._strides, texts):
+            n = int(t)
+            if rg.text(n) != t:
+                return None
+            k = rg.index_of(n)
+            if k is None:
+                return None
+            flat += k * stride
+        return flat
+
+    def parse(self, name: str) -> Optional[int]:
+        """把名字解析回序号（0 起）；不属于本规则返回 None。"""
+        m = self._regex.fullmatch(name or "")
+        if not m:
+            return None
+        return self.index_from_texts(m.groups())
+
+
+class RuleMatcher:
+    """
+    多条规则合并成一个正则：同“形状”的规则共用一个分支，
+    每个名字只匹配一次，再用捕获到的数字判断落在哪些规则的哪个序号上。
+    """
+
+    def __init__(self, rules: Sequence[NamingRule]):
+        shapes: Dict[str, List[Tuple[int, NamingRule]]] = {}
+        for pos, rule in enumerate(rules):
+            shapes.setdefault(rule.pattern, []).append((pos, rule))
+        self._groups: Dict[int, Tuple[int, List[Tuple[int, NamingRule]]]] = {}
+        alts, g = [], 1
+        for pattern, members in shapes.items():
+            width = len(members[0][1]._ranges)
+            self._groups[g] = (width, members)
+            alts.append(f"({pattern})")
+            g += width + 1
+        self._regex = re.compile("|".join(alts)) if alts else None
+
+    def match(self, name: str) -> List[Tuple[int, int]]:
+        """返回 [(规则位置, 序号), ...]；不匹配任何规则时为空。"""
+        if self._regex is None:
+            return []
+        m = self._regex.fullmatch(name or "")
+        if not m:
+            return []
+        width, members = self._groups[m.lastindex]
+        texts = m.groups()[m.lastindex:m.lastindex + width]
+        out = []
+        for pos, rule in members:
+            idx = rule.index_from_texts(texts)
+            if idx is not None:
+                out.append((pos, idx))
+        return out
+
+
+@lru_cache(maxsize=1024)
+def _compile(text: str, params: Tuple[Tuple[str, str], ...]) -> NamingRule:
+    values = dict(params)
+    parts = []
+    for kind, val in _tokenize(text):
+        if kind == "var":
+            if val not in values:
+                raise ValueError(f"规则变量未提供：{{{val}}}")
+            parts.append(("lit", str(values[val])))
+        else:
+            parts.append((kind, val))
+    return NamingRule(text, parts)
+
+
+def compile_rule(text: str, **params) -> NamingRule:
+    """编译（带缓存）命名规则；params 为变量取值，如 code="GE"。"""
+    return _compile(text or "", tuple(sorted((k, str(v)) for k, v in params.items())))
+
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def natural_key(name: str) -> Tuple:
+    """自然排序键：数字段按数值比较，GE2 排在 GE10 之前。"""
+    parts = _DIGITS.split(name or "")
+    return tuple((0, int(p), "") if i % 2 else (1, 0, p) for i, p in enumerate(parts) if p)
+
+
+SORT_NUM_WIDTH = 10     # 排序键中数字段补零宽度
+SORT_KEY_MAX = 512      # 与 port.sort_key / device.sort_key 列宽一致
+
+
+def sort_key(name: str) -> str:
+    """
+    落库用的自然排序键：数字段去掉前导 0 后补零到固定宽度，按普通字符串比较即为自然序。
+      GE2 → GE0000000002，GE10 → GE0000000010
+    超宽数字原样保留（仍能比较，只是不再严格按数值）；结果截断到 SORT_KEY_MAX。
+    """
+    key = _DIGITS.sub(lambda m: (m.group(1).lstrip("0") or "0").zfill(SORT_NUM_WIDTH), name or "")
+    return key[:SORT_KEY_MAX]
+
+
+def escape_literal(text: str) -> str:
+    """把普通文本转成规则里的字面量（花括号加倍）。"""
+    return (text or "").replace("{", "{{").replace("}", "}}")
@@ -1,9 +1,11 @@
 # services/option_service.py
 from db import get_conn
+from cache import cached, invalidate
 
 # 作为“属性本体”的代理根节点的固定 code
 ROOT_CODE = "__root__"
 
+@cached("option")
 def list_options(attribute_id):
     sql = """SELECT id, attribute_id, name, code, parent_id, sort_order
              FROM attribute_option
@@ -37,6 +39,7 @@ def ensure_root_option(attribute_id, attr_name=None):
             cur.execute("""INSERT INTO attribute_option (attribute_id, name, code, parent_id, sort_order)
                            VALUES (%s, %s, %s, %s, %s)""",
                         (attribute_id, attr_name or f"属性{attribute_id}", ROOT_CODE, None, 0))
+            invalidate("option", cur=cur)
             cur.execute("SELECT * FROM attribute_option WHERE id=LAST_INSERT_ID()")
             return cur.fetchone()
 
@@ -62,6 +65,7 @@ def create_option(attribute_id, name, code=None, parent_id=None, sort_order=0):
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (attribute_id, name, code, parent_id, sort_order))
+            invalidate("option", cur=cur)
             return cur.lastrowid
 
 def update_option(opt_id, name, code, parent_id, sort_order):
@@ -85,12 +89,14 @@ def update_option(opt_id, name, code, parent_id, sort_order):
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(sql, (name, code, parent_id, sort_order, opt_id))
+            invalidate("option", cur=cur)
 
 def delete_option(opt_id):
     # 注意：ON DELETE CASCADE 会删除子树，谨慎
     with get_conn() as conn:
         with conn.cursor() as cur:
             cur.execute("DELETE FROM attribute_option WHERE id=%s", (opt_id,))
+            invalidate("option", cur=cur)
 
 def list_children(attribute_id, parent_id=None):
     from db import get_conn
@@ -1,6 +1,9 @@
 # services/port_type_service.py
 from db import get_conn
+from cache import cached, invalidate
+from services.cable_view_service import sync_port_type
 
+@cached("port_type")
 def list_port_types():
     sql = "SELECT id, code, name FROM port_type ORDER BY id DESC"
     with get_conn() as conn, conn.cursor() as cur:
@@ -19,6 +22,7 @@ def create_port_type(code: str, name: str):
     sql = "INSERT INTO port_type(code, name) VALUES (%s, %s)"
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, (code.strip(), name.strip()))
+        invalidate("port_type", cur=cur)
         return cur.lastrowid
 
 def update_port_type(pt_id: int, code: str, name: str):
@@ -27,6 +31,8 @@ def update_port_type(pt_id: int, code: str, name: str):
     sql = "UPDATE port_type SET code=%s, name=%s WHERE id=%s"
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, (code.strip(), name.strip(), pt_id))
+        sync_port_type(cur, pt_id)  # 清册读模型冗余了类型名
+        invalidate("port_type", "port_template", cur=cur)  # 端口规则列表带出了类型名
         return True
 
 def delete_port_type(pt_id: int):
@@ -35,4 +41,5 @@ def delete_port_type(pt_id: int):
     sql = "DELETE FROM port_type WHERE id=%s"
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute(sql, (pt_id,))
+        invalidate("port_type", "port_template", cur=cur)
         return True
@@ -1,14 +1,19 @@
 # services/project_service.py
+from cache import cached, invalidate
 from db import get_conn
+from services.cable_view_service import sync_project
+from services.job_service import submit_job
+from services.purge_service import purge_project
 
 def list_projects():
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("SELECT id, name, remark, created_at FROM project ORDER BY id DESC")
+        cur.execute("SELECT id, name, remark, created_at FROM project WHERE deleted_at IS NULL ORDER BY id DESC")
         return cur.fetchall()
 
+@cached("project")
 def get_project(pid: int):
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("SELECT id, name, remark, created_at FROM project WHERE id=%s", (pid,))
+        cur.execute("SELECT id, name, remark, created_at FROM project WHERE id=%s AND deleted_at IS NULL", (pid,))
         return cur.fetchone()
 
 def create_project(name: str, remark: str = None):
@@ -16,6 +21,7 @@ def create_project(name: str, remark: str = None):
         raise ValueError("项目名称必填")
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute("INSERT INTO project(name, remark) VALUES(%s,%s)", (name.strip(), remark))
+        invalidate("project", cur=cur)
         return cur.lastrowid
 
 def update_project(pid: int, name: str, remark: str = None):
@@ -23,9 +29,56 @@ def update_project(pid: int, name: str, remark: str = None):
         raise ValueError("项目名称必填")
     with get_conn() as conn, conn.cursor() as cur:
         cur.execute("UPDATE project SET name=%s, remark=%s WHERE id=%s", (name.strip(), remark, pid))
+        sync_project(cur, pid)  # 清册标签含项目名
+        invalidate("project", cur=cur)
         return True
 
-def delete_project(pid: int):
+def delete_project(pid: int) -> str:
+    """软删除项目（立即不可见），设备/端口/连线交给后台任务分批清理；返回清理任务 id。"""
     with get_conn() as conn, conn.cursor() as cur:
-        cur.execute("DELETE FROM project WHERE id=%s", (pid,))
-        return True
+        cur.execute("UPDATE project SET deleted_at=NOW() WHERE id=%s AND deleted_at IS NULL", (pid,))
+        if not cur.rowcount:
+            raise ValueError("项目不存在或已删除")
+        invalidate("project", cur=cur)
+    return submit_job("purge_project", purge_project, pid, project_id=pid)
+
+
+# ===== 项目版本号 =====
+# rev：项目内任何变化（连线、端口、设备、打印状态、改名…）+1，供看板等缓存判断是否过期；
+# topo_rev：只在拓扑变化（CONNECTED 连线、端口、设备增删 / 换模板）时 +1，供拓扑内存索引与冗余分析使用，
+#           避免打印、端口开关、改名等触发整图重建
+
+def get_project_rev(pid: int) -> int:
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT rev FROM project WHERE id=%s", (pid,))
+        row = cur.fetchone()
+        return int(row["rev"]) if row else 0
+
+
+def get_topology_rev(pid: int) -> int:
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT topo_rev FROM project WHERE id=%s", (pid,))
+        row = cur.fetchone()
+        return int(row["topo_rev"]) if row else 0
+
+
+def _rev_set(topology: bool) -> str:
+    return "p.rev = p.rev + 1, p.topo_rev = p.topo_rev + 1" if topology else "p.rev = p.rev + 1"
+
+
+def bump_project_rev(cur, pid: int, topology: bool = True):
+    """在调用方的事务/游标内把项目版本号 +1；topology=False 时拓扑版本号不变。"""
+    cur.execute(f"UPDATE project p SET {_rev_set(topology)} WHERE p.id=%s", (pid,))
+
+
+def bump_project_rev_for_devices(cur, device_ids, topology: bool = True):
+    """按设备找到所属项目并把版本号 +1（端口增删、设备变更时用）。"""
+    device_ids = list(device_ids)
+    if not device_ids:
+        return
+    in_clause = ",".join(["%s"] * len(device_ids))
+    cur.execute(f"""
+        UPDATE project p
+        JOIN (SELECT DISTINCT project_id FROM device WHERE id IN ({in_clause})) d ON d.project_id = p.id
+        SET {_rev_set(topology)}
+    """, tuple(device_ids))
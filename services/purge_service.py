@@ -0,0 +1,163 @@
+# services/purge_service.py
+"""
+软删除后的分批清理：
+  删除设备 / 项目时只打 deleted_at 标记（查询立即不可见），随后在后台按主键分批删除子表，
+  每批一条短事务（连接为 autocommit），批间休眠节流，避免一次级联删除长时间锁表。
+
+  项目：连线 → 按设备分段（端口属性值 → 端口 → 设备属性值 → 设备） → 看板缓存 → 项目
+  设备：连线在软删除时已同步删除（需扣减对端连接数），后台只清端口及属性值、设备本身；
+        清理前再兜底扣减并删除一次仍挂在其端口上的连线
+
+中途失败或进程重启后，可用 purge_all_deleted() / python -m tools.purge_deleted 续删。
+"""
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+from config import Config
+from db import get_conn
+
+PURGE_BATCH = Config.PURGE_BATCH_SIZE               # 每批删除行数
+PURGE_THROTTLE = Config.PURGE_THROTTLE_MS / 1000.0  # 批间休眠（秒）
+PURGE_DEVICE_CHUNK = 200                            # 项目清理时每段设备数
+
+
+def _in(ids: Sequence[int]) -> str:
+    return ",".join(["%s"] * len(ids))
+
+
+def _delete_batches(cur, table: str, select_sql: str, params: Sequence,
+                    counts: Dict[str, int], report: Callable):
+    """
+    反复 “取一批主键 → 按主键删除” 直到取空。
+    select_sql 只返回 id 列，不带 LIMIT；table 为受控表名。
+    """
+    while True:
+        cur.execute(f"{select_sql} LIMIT %s", (*params, PURGE_BATCH))
+        ids = [r["id"] for r in cur.fetchall() or []]
+        if not ids:
+            return
+        cur.execute(f"DELETE FROM {table} WHERE id IN ({_in(ids)})", tuple(ids))
+        counts[table] = counts.get(table, 0) + int(cur.rowcount or 0)
+        report()
+        if PURGE_THROTTLE:
+            time.sleep(PURGE_THROTTLE)
+
+
+def _purge_devices(cur, device_ids: List[int], counts: Dict[str, int], report: Callable):
+    """删除一批设备及其端口、属性值；端口按 id 倒序删，子端口先于父端口（免去 SET NULL 回写）。"""
+    inc = _in(device_ids)
+    _delete_batches(cur, "port_attr_value", f"""
+        SELECT v.id FROM port_attr_value v JOIN port p ON p.id = v.port_id
+        WHERE p.device_id IN ({inc})
+    """, device_ids, counts, report)
+    _delete_batches(cur, "port", f"SELECT id FROM port WHERE device_id IN ({inc}) ORDER BY id DESC",
+                    device_ids, counts, report)
+    _delete_batches(cur, "device_attr_value", f"SELECT id FROM device_attr_value WHERE device_id IN ({inc})",
+                    device_ids, counts, report)
+    cur.execute(f"DELETE FROM device WHERE id IN ({inc})", tuple(device_ids))
+    counts["device"] = counts.get("device", 0) + int(cur.rowcount or 0)
+    report()
+
+
+def purge_device(device_id: int, progress: Optional[Callable] = None) -> Dict[str, int]:
+    """清理一台已软删除的设备，返回各表删除行数。"""
+    counts: Dict[str, int] = {}
+    report = (lambda: progress(**counts)) if progress else (lambda: None)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM device WHERE id=%s AND deleted_at IS NOT NULL", (device_id,))
+        if not cur.fetchone():
+            raise ValueError("设备不存在或未标记删除")
+        _release_device_links(conn, cur, device_id, counts)
+        _purge_devices(cur, [device_id], counts, report)
+    return counts
+
+
+def _release_device_links(conn, cur, device_id: int, counts: Dict[str, int]):
+    """
+    兜底：软删除后仍挂在设备端口上的连线（正常情况下没有），先扣减对端连接数再删除，
+    否则删端口时连线随外键级联删除，对端 link_count 永久偏高。
+    """
+    from services.link_service import release_far_ends
+
+    cur.execute("SELECT id FROM port WHERE device_id=%s", (device_id,))
+    port_ids = [r["id"] for r in cur.fetchall() or []]
+    for i in range(0, len(port_ids), PURGE_BATCH):
+        chunk = port_ids[i:i + PURGE_BATCH]
+        inc = _in(chunk)
+        conn.begin()
+        try:
+            release_far_ends(cur, chunk)
+            for col in ("a_port_id", "b_port_id"):
+                cur.execute(f"DELETE FROM link WHERE {col} IN ({inc})", tuple(chunk))
+                counts["link"] = counts.get("link", 0) + int(cur.rowcount or 0)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def purge_project(project_id: int, progress: Optional[Callable] = None) -> Dict[str, int]:
+    """清理一个已软删除的项目，返回各表删除行数。"""
+    counts: Dict[str, int] = {}
+    report = (lambda: progress(**counts)) if progress else (lambda: None)
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id FROM project WHERE id=%s AND deleted_at IS NOT NULL", (project_id,))
+        if not cur.fetchone():
+            raise ValueError("项目不存在或未标记删除")
+
+        # 连线先删（cable_view 随外键级联，逐批 1:1），端口删除时就不再级联连线
+        _delete_batches(cur, "link", "SELECT id FROM link WHERE project_id=%s", (project_id,), counts, report)
+
+        last_id = 0
+        while True:
+            cur.execute(
+                "SELECT id FROM device WHERE project_id=%s AND id > %s ORDER BY id LIMIT %s",
+                (project_id, last_id, PURGE_DEVICE_CHUNK),
+            )
+            ids = [r["id"] for r in cur.fetchall() or []]
+            if not ids:
+                break
+            last_id = ids[-1]
+            _purge_devices(cur, ids, counts, report)
+
+        cur.execute("DELETE FROM project_summary WHERE project_id=%s", (project_id,))
+        cur.execute("DELETE FROM project WHERE id=%s", (project_id,))
+        counts["project"] = int(cur.rowcount or 0)
+        report()
+    return counts
+
+
+def purge_all_deleted(progress: Optional[Callable] = None) -> Dict[str, int]:
+    """
+    续删所有已软删除但尚未清理完的项目与设备。
+    拷贝中的项目（state='CLONING'）跳过；没有任何进行中的 clone_project 任务时，
+    它们是拷贝进程中途退出的残留，一并清理。
+    """
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT id FROM project
+            WHERE deleted_at IS NOT NULL
+              AND (state <> 'CLONING'
+                   OR NOT EXISTS (SELECT 1 FROM job WHERE kind='clone_project' AND status IN ('PENDING', 'RUNNING')))
+            ORDER BY id
+        """)
+        project_ids = [r["id"] for r in cur.fetchall() or []]
+        cur.execute("""
+            SELECT d.id FROM device d JOIN project p ON p.id = d.project_id
+            WHERE d.deleted_at IS NOT NULL AND p.deleted_at IS NULL
+            ORDER BY d.id
+        """)
+        device_ids = [r["id"] for r in cur.fetchall() or []]
+
+    done = {"projects": 0, "devices": 0}
+    for pid in project_ids:
+        purge_project(pid)
+        done["projects"] += 1
+        if progress:
+            progress(**done)
+    for did in device_ids:
+        purge_device(did)
+        done["devices"] += 1
+        if progress:
+            progress(**done)
+    return done
@@ -1,6 +1,8 @@
 from db import get_conn  # 引入数据库连接函数
+from cache import cached, invalidate  # 参考数据缓存
 
 # 列出所有设备模板
+@cached("template")
 def list_templates():
     with get_conn() as conn:  # 获取数据库连接
         with conn.cursor() as cur:  # 创建游标对象
@@ -86,6 +88,7 @@ def create_template(name, device_type, version=1, is_locked=0):
     with get_conn() as conn:  # 获取数据库连接
         with conn.cursor() as cur:  # 创建游标对象
             cur.execute(sql, (name, device_type, int(version or 1), int(is_locked or 0)))  # 执行插入操作
+            invalidate("template", cur=cur)  # 失效模板缓存
             return cur.lastrowid  # 返回新插入记录的ID
 
 # 根据模板ID删除指定设备模板
@@ -94,8 +97,10 @@ def delete_template(template_id):
     with get_conn() as conn:  # 获取数据库连接
         with conn.cursor() as cur:  # 创建游标对象
             cur.execute("DELETE FROM device_template WHERE id=%s", (template_id,))  # 执行删除操作
+            invalidate("template", "port_template", cur=cur)  # 失效模板及其端口规则缓存
 
 # 根据模板ID获取指定设备模板的详细信息
+@cached("template")
 def get_template(template_id):
     with get_conn() as conn:  # 获取数据库连接
         with conn.cursor() as cur:  # 创建游标对象
@@ -110,3 +115,4 @@ def update_template(template_id, name, device_type, version, is_locked):
     with get_conn() as conn:  # 获取数据库连接
         with conn.cursor() as cur:  # 创建游标对象
             cur.execute(sql, (name, device_type, int(version or 1), int(is_locked or 0), template_id))  # 执行更新操作
+            invalidate("template", cur=cur)  # 失效模板缓存
@@ -0,0 +1,417 @@
+# services/topology_service.py
+"""
+项目拓扑内存索引：
+  - 端口映射为连续整数节点，连线（CONNECTED）按 CSR 存成邻接数组：
+        offsets[n] .. offsets[n+1] 为节点 n 的边，adj[i] 为对端节点，adj_link[i] 为 link.id
+  - 配线架（Config.PATCH_PANEL_TYPES）内前后端口按名称前缀配对（Config.PASS_THROUGH_PAIRS，
+    如 F12 ↔ R12），作为“直通”边单独存放：passthru[n] 为配对节点，无则 -1
+  - 按项目缓存，project.topo_rev（只随连线 / 端口 / 设备增删变化）变化即重建；一次电路追踪只需读一次版本号、一次端口名
+"""
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+import pymysql
+
+from db import get_conn, iter_rows
+from services.project_service import get_topology_rev
+
+TRACE_MAX_HOPS = 1024  # 防御：异常数据成环时的步数上限
+
+
+class ProjectGraph:
+    __slots__ = ("project_id", "rev", "node_of", "port_ids", "device_ids",
+                 "offsets", "adj", "adj_link", "passthru", "panel_devices", "device_types")
+
+    def __init__(self, project_id: int, rev: int):
+        self.project_id = project_id
+        self.rev = rev
+        self.node_of: Dict[int, int] = {}   # port.id → 节点号
+        self.port_ids = array("q")          # 节点号 → port.id
+        self.device_ids = array("q")        # 节点号 → device.id
+        self.offsets = array("l", [0])
+        self.adj = array("l")
+        self.adj_link = array("q")
+        self.passthru = array("l")
+        self.panel_devices = set()
+        self.device_types: Dict[int, str] = {}   # device.id → 设备类型（含无端口的设备）
+
+    @property
+    def size(self) -> int:
+        return len(self.port_ids)
+
+    def degree(self, n: int) -> int:
+        return self.offsets[n + 1] - self.offsets[n]
+
+    def _walk(self, start: int, step: str, seen: set):
+        """
+        从 start 出发交替走“直通 / 连线”，直到走不下去。
+        返回 ([(节点, 边类型, link_id), ...], 结束原因)
+        """
+        out = []
+        cur = start
+        for _ in range(TRACE_MAX_HOPS):
+            if step == "pass":
+                nxt, link_id = self.passthru[cur], None
+                if nxt < 0:
+                    return out, "end"
+            else:
+                lo, hi = self.offsets[cur], self.offsets[cur + 1]
+                if lo == hi:
+                    return out, "end"
+                if hi - lo > 1:
+                    return out, "branch"   # 多连接端口：电路在此分叉，不做猜测
+                nxt, link_id = self.adj[lo], self.adj_link[lo]
+            if nxt in seen:
+                return out, "loop"
+            seen.add(nxt)
+            out.append((nxt, step, link_id))
+            cur = nxt
+            step = "link" if step == "pass" else "pass"
+        return out, "limit"
+
+    def trace(self, port_id: int) -> Optional[Dict[str, Any]]:
+        """
+        端到端电路：从端口向两侧各走到头（连线 → 配线架直通 → 连线 …）。
+        返回 {"ports": [port_id...], "edges": [{"kind","link_id"}...], "ends": [左端原因, 右端原因]}，
+        edges[i] 连接 ports[i] 与 ports[i+1]。端口不在本项目时返回 None。
+        """
+        s = self.node_of.get(port_id)
+        if s is None:
+            return None
+        seen = {s}
+        right, right_end = self._walk(s, "link", seen)
+        left, left_end = self._walk(s, "pass", seen)
+
+        nodes = [n for n, _, _ in reversed(left)] + [s] + [n for n, _, _ in right]
+        edges = [{"kind": k, "link_id": l} for _, k, l in reversed(left)] + \
+                [{"kind": k, "link_id": l} for _, k, l in right]
+        return {
+            "ports": [self.port_ids[n] for n in nodes],
+            "edges": edges,
+            "ends": [left_end, right_end],
+        }
+
+
+def _pair_key(name: str) -> Optional[Tuple[int, str, bool]]:
+    """配线架端口名 → (配对规则序号, 去掉前缀后的编号, 是否前面板)。"""
+    for i, (front, rear) in enumerate(Config.PASS_THROUGH_PAIRS):
+        if name.startswith(front) and len(name) > len(front):
+            return i, name[len(front):], True
+        if name.startswith(rear) and len(name) > len(rear):
+            return i, name[len(rear):], False
+    return None
+
+
+def build_project_graph(project_id: int) -> ProjectGraph:
+    # 元组游标按列序解包，不为每行建 dict；端口与连线用无缓冲游标逐批读取，边直接存入数组
+    with get_conn() as conn, conn.cursor(pymysql.cursors.Cursor) as cur:
+        # 版本号先于数据读取：期间若有写入，下次访问会因版本号变化而重建
+        cur.execute("SELECT topo_rev FROM project WHERE id=%s", (project_id,))
+        row = cur.fetchone()
+        g = ProjectGraph(project_id, int(row[0]) if row else 0)
+
+        cur.execute("""
+            SELECT d.id, dt.device_type
+            FROM device d
+            LEFT JOIN device_template dt ON dt.id = d.template_id
+            WHERE d.project_id=%s AND d.deleted_at IS NULL
+        """, (project_id,))
+        g.device_types = {did: dtype or "" for did, dtype in cur.fetchall() or []}
+
+        panel_types = set(Config.PATCH_PANEL_TYPES)
+        pair_slots: Dict[Tuple[int, int, str], List[int]] = {}
+        with conn.cursor(pymysql.cursors.SSCursor) as scur:
+            scur.execute("""
+                SELECT p.id, p.name, p.device_id
+                FROM port p
+                JOIN device d ON d.id = p.device_id
+                WHERE d.project_id=%s AND d.deleted_at IS NULL
+                ORDER BY p.id
+            """, (project_id,))
+            for n, (port_id, name, device_id) in enumerate(iter_rows(scur)):
+                g.node_of[port_id] = n
+                g.port_ids.append(port_id)
+                g.device_ids.append(device_id)
+                if g.device_types.get(device_id) in panel_types:
+                    g.panel_devices.add(device_id)
+                    key = _pair_key(name or "")
+                    if key is not None:
+                        rule, num, is_front = key
+                        slot = pair_slots.setdefault((device_id, rule, num), [-1, -1])
+                        slot[0 if is_front else 1] = n
+
+        # 边暂存为三个平行数组（端点节点、link_id）
+        ea, eb, elink = array("l"), array("l"), array("q")
+        with conn.cursor(pymysql.cursors.SSCursor) as scur:
+            scur.execute("""
+                SELECT id, a_port_id, b_port_id
+                FROM link
+                WHERE project_id=%s AND status='CONNECTED'
+            """, (project_id,))
+            node_of = g.node_of
+            for lid, a_port, b_port in iter_rows(scur):
+                a, b = node_of.get(a_port), node_of.get(b_port)
+                if a is not None and b is not None:
+                    ea.append(a)
+                    eb.append(b)
+                    elink.append(lid)
+
+    n_ports = len(g.port_ids)
+    # 直通边
+    g.passthru = array("l", [-1]) * n_ports
+    for front, rear in pair_slots.values():
+        if front >= 0 and rear >= 0:
+            g.passthru[front] = rear
+            g.passthru[rear] = front
+
+    # CSR：先数度数，再前缀和，最后按游标回填
+    deg = array("l", [0]) * (n_ports + 1)
+    for a, b in zip(ea, eb):
+        deg[a + 1] += 1
+        deg[b + 1] += 1
+    for i in range(n_ports):
+        deg[i + 1] += deg[i]
+    g.offsets = deg
+    g.adj = array("l", [0]) * (2 * len(elink))
+    g.adj_link = array("q", [0]) * (2 * len(elink))
+    fill = array("l", deg[:-1]) if n_ports else array("l")
+    for a, b, lid in zip(ea, eb, elink):
+        for x, y in ((a, b), (b, a)):
+            i = fill[x]
+            g.adj[i], g.adj_link[i] = y, lid
+            fill[x] = i + 1
+    return g
+
+
+_GRAPHS: Dict[int, ProjectGraph] = {}
+_BUILD_LOCK = threading.Lock()
+
+
+def get_project_graph(project_id: int) -> ProjectGraph:
+    """取项目拓扑索引；缓存版本号与 project.topo_rev 一致时直接复用。"""
+    rev = get_topology_rev(project_id)
+    g = _GRAPHS.get(project_id)
+    if g is not None and g.rev == rev:
+        return g
+    with _BUILD_LOCK:
+        g = _GRAPHS.get(project_id)
+        if g is None or g.rev != rev:
+            g = build_project_graph(project_id)
+            _GRAPHS[project_id] = g
+    return g
+
+
+def trace_circuit(project_id: int, port_id: int) -> Optional[Dict[str, Any]]:
+    """
+    端到端电路追踪，返回
+      {"hops": [{port_id, port_name, device_id, device_name, is_panel}...],
+       "edges": [{kind: "link"|"pass", link_id}...], "ends": [...], "trace_us": 内存追踪耗时}
+    """
+    g = get_project_graph(project_id)
+    t0 = time.perf_counter()
+    res = g.trace(port_id)
+    trace_us = int((time.perf_counter() - t0) * 1_000_000)
+    if res is None:
+        return None
+
+    ids = res["ports"]
+    in_clause = ",".join(["%s"] * len(ids))
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT p.id AS port_id, p.name AS port_name, d.id AS device_id, d.name AS device_name
+            FROM port p
+            JOIN device d ON d.id = p.device_id
+            WHERE p.id IN ({in_clause})
+        """, tuple(ids))
+        by_id = {r["port_id"]: r for r in cur.fetchall() or []}
+
+    hops = []
+    for pid in ids:
+        r = by_id.get(pid) or {"port_id": pid, "port_name": None, "device_id": None, "device_name": None}
+        hops.append({**r, "is_panel": r.get("device_id") in g.panel_devices})
+    return {"hops": hops, "edges": res["edges"], "ends": res["ends"], "trace_us": trace_us}
+
+
+
+# ===== 冗余 / 单点故障分析（设备级） =====
+# 设备为节点、连线为边（同一对设备间的多条连线互为冗余，都不是桥）。
+# 迭代版 Tarjan：一次 DFS 求出割点（单点设备）、桥（单点链路）与连通分量，
+# 并记录子树规模，用于估算失去该设备/链路后被隔离的设备数。
+
+def _tarjan(n_nodes: int, offsets, adj, adj_edge):
+    """
+    迭代 Tarjan（CSR 输入，adj_edge 为边号，用来跳过进入边而不是父节点，从而正确处理平行边）。
+    返回 (comp, cut, bridges)：
+      comp[v]   连通分量编号（取该分量 DFS 根的节点号）
+      cut       {割点: 失去后与主体分离的设备数}
+      bridges   {边号: 断开后较小一侧的设备数}
+    """
+    disc = [-1] * n_nodes
+    low = [0] * n_nodes
+    size = [1] * n_nodes
+    comp = [-1] * n_nodes
+    cut: Dict[int, int] = {}
+    bridges: Dict[int, int] = {}
+    t = 0
+    for root in range(n_nodes):
+        if disc[root] >= 0:
+            continue
+        disc[root] = low[root] = t
+        t += 1
+        comp[root] = root
+        root_children: List[int] = []
+        comp_bridges: List[int] = []
+        # 栈元素：[节点, 进入边号, 下一条待看边的下标]
+        stack = [[root, -1, offsets[root]]]
+        while stack:
+            frame = stack[-1]
+            u, in_edge, i = frame
+            if i < offsets[u + 1]:
+                frame[2] = i + 1
+                e = adj_edge[i]
+                if e == in_edge:
+                    continue
+                v = adj[i]
+                if disc[v] < 0:
+                    disc[v] = low[v] = t
+                    t += 1
+                    comp[v] = root
+                    stack.append([v, e, offsets[v]])
+                elif disc[v] < low[u]:
+                    low[u] = disc[v]
+                continue
+            stack.pop()
+            if not stack:
+                break
+            p = stack[-1][0]
+            size[p] += size[u]
+            if low[u] < low[p]:
+                low[p] = low[u]
+            if low[u] > disc[p]:
+                bridges[in_edge] = size[u]
+                comp_bridges.append(in_edge)
+            if p == root:
+                root_children.append(size[u])
+            elif low[u] >= disc[p]:
+                cut[p] = cut.get(p, 0) + size[u]
+        if len(root_children) > 1:
+            # 根为割点：保留最大的一支，其余各支视为被隔离
+            cut[root] = sum(root_children) - max(root_children)
+        total = size[root]
+        for e in comp_bridges:
+            bridges[e] = min(bridges[e], total - bridges[e])
+    return comp, cut, bridges
+
+
+def _device_graph(g: ProjectGraph):
+    """端口级 CSR → 设备级 CSR。返回 (设备 id 列表, offsets, adj, adj_edge, link_ids)。"""
+    dev_ids = sorted(g.device_types)
+    idx = {d: i for i, d in enumerate(dev_ids)}
+    edges = []
+    dev = g.device_ids
+    for n in range(g.size):
+        for i in range(g.offsets[n], g.offsets[n + 1]):
+            m = g.adj[i]
+            if n < m and dev[n] != dev[m]:
+                a, b = idx.get(dev[n]), idx.get(dev[m])
+                if a is not None and b is not None:
+                    edges.append((a, b, g.adj_link[i]))
+
+    n_nodes = len(dev_ids)
+    offsets = array("l", [0]) * (n_nodes + 1)
+    for a, b, _ in edges:
+        offsets[a + 1] += 1
+        offsets[b + 1] += 1
+    for i in range(n_nodes):
+        offsets[i + 1] += offsets[i]
+    adj = array("l", [0]) * (2 * len(edges))
+    adj_edge = array("l", [0]) * (2 * len(edges))
+    fill = array("l", offsets[:-1]) if n_nodes else array("l")
+    for k, (a, b, _) in enumerate(edges):
+        for x, y in ((a, b), (b, a)):
+            i = fill[x]
+            adj[i], adj_edge[i] = y, k
+            fill[x] = i + 1
+    return dev_ids, offsets, adj, adj_edge, [lid for _, _, lid in edges]
+
+
+_REDUNDANCY: Dict[int, Tuple[int, Dict[str, Any]]] = {}
+
+
+def _with_names(project_id: int, res: Dict[str, Any]) -> Dict[str, Any]:
+    """补上设备当前名称（名称不参与拓扑缓存失效，缓存结果本身不含名称）。"""
+    with get_conn() as conn, conn.cursor() as cur:
+        cur.execute("SELECT id, name FROM device WHERE project_id=%s", (project_id,))
+        names = {r["id"]: r["name"] for r in cur.fetchall() or []}
+    return {
+        **res,
+        "articulation_points": [{**r, "device_name": names.get(r["device_id"])}
+                                for r in res["articulation_points"]],
+        "bridges": [{**r, "a_device_name": names.get(r["a_device_id"]),
+                     "b_device_name": names.get(r["b_device_id"])} for r in res["bridges"]],
+    }
+
+
+def analyze_redundancy(project_id: int) -> Dict[str, Any]:
+    """
+    项目冗余分析（按 project.topo_rev 缓存；设备名称不参与失效，每次现取）：
+      {"rev", "devices", "links", "elapsed_ms",
+       "articulation_points": [{device_id, device_name, device_type, isolated}],
+       "bridges": [{link_id, a_device_*, b_device_*, isolated}],
+       "components": [{id, size, types: {类型: 数量}}],
+       "by_type": {类型: {"devices": n, "components": k}}}
+    """
+    g = get_project_graph(project_id)
+    cached = _REDUNDANCY.get(project_id)
+    if cached and cached[0] == g.rev:
+        return _with_names(project_id, cached[1])
+
+    t0 = time.perf_counter()
+    dev_ids, offsets, adj, adj_edge, link_ids = _device_graph(g)
+    comp, cut, bridges = _tarjan(len(dev_ids), offsets, adj, adj_edge)
+
+    components: Dict[int, Dict[str, Any]] = {}
+    by_type: Dict[str, Dict[str, Any]] = {}
+    for i, d in enumerate(dev_ids):
+        dtype = g.device_types.get(d) or "未分类"
+        c = components.setdefault(comp[i], {"id": len(components) + 1, "size": 0, "types": {}})
+        c["size"] += 1
+        c["types"][dtype] = c["types"].get(dtype, 0) + 1
+        bt = by_type.setdefault(dtype, {"devices": 0, "_comps": set()})
+        bt["devices"] += 1
+        bt["_comps"].add(comp[i])
+    for bt in by_type.values():
+        bt["components"] = len(bt.pop("_comps"))
+
+    def dev_info(i: int, prefix: str = ""):
+        d = dev_ids[i]
+        return {f"{prefix}device_id": d, f"{prefix}device_name": None,
+                f"{prefix}device_type": g.device_types.get(d) or ""}
+
+    aps = [{**dev_info(i), "isolated": n} for i, n in cut.items()]
+    aps.sort(key=lambda r: -r["isolated"])
+    ends: Dict[int, Tuple[int, int]] = {}
+    for u in range(len(dev_ids)):
+        for i in range(offsets[u], offsets[u + 1]):
+            e = adj_edge[i]
+            if e in bridges and e not in ends:
+                ends[e] = (u, adj[i])
+    brs = [{"link_id": link_ids[e], **dev_info(ends[e][0], "a_"), **dev_info(ends[e][1], "b_"),
+            "isolated": n} for e, n in bridges.items()]
+    brs.sort(key=lambda r: -r["isolated"])
+
+    res = {
+        "rev": g.rev,
+        "devices": len(dev_ids),
+        "links": len(link_ids),
+        "elapsed_ms": int((time.perf_counter() - t0) * 1000),
+        "articulation_points": aps,
+        "bridges": brs,
+        "components": sorted(components.values(), key=lambda c: -c["size"]),
+        "by_type": by_type,
+    }
+    _REDUNDANCY[project_id] = (g.rev, res)
+    return _with_names(project_id, res)
@@ -0,0 +1,166 @@
+"""
+开发 / 预发环境的 SQL 执行计划采集（EXPLAIN_CAPTURE=1 开启，生产勿开）。
+
+  - db 连接每执行一条 SQL 先归一化出指纹（字面量 → ?，IN 列表折叠），
+    同一指纹首次出现时在同一连接上先跑一次 EXPLAIN FORMAT=JSON（只解析不执行）
+  - 从计划中标出：全表扫描（access_type=ALL）、全索引扫描（index）、filesort、临时表，
+    并记下优化器估算成本；之后同指纹只累计次数与耗时
+  - 各进程结果写入 EXPLAIN_DIR/<pid>.json，用 python -m tools.explain_report 汇总排名
+只对 SELECT / UPDATE / DELETE / INSERT…SELECT 取计划。
+"""
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config import Config
+
+_LOCK = threading.Lock()
+_PLANS: Dict[str, Dict[str, Any]] = {}
+_LAST_FLUSH = [0.0]
+FLUSH_SECONDS = 5
+SAMPLE_MAX = 2000
+
+_STR = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUM = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+_EXPLAINABLE = re.compile(r"^\s*(select|update|delete|(insert|replace)\b.*\bselect)\b", re.I | re.S)
+
+
+def fingerprint(sql: str) -> str:
+    """去掉字面量、折叠 IN 列表与空白后的语句形状。"""
+    fp = _STR.sub("?", sql)
+    fp = _NUM.sub("?", fp)
+    fp = _IN_LIST.sub("(?+)", fp)
+    return _SPACE.sub(" ", fp).strip()
+
+
+def _walk(node, found: Dict[str, Any]):
+    if isinstance(node, dict):
+        t = node.get("table")
+        if isinstance(t, dict):
+            access = t.get("access_type")
+            if access in ("ALL", "index"):
+                found["scans"].append({
+                    "table": t.get("table_name"),
+                    "access": access,
+                    "key": t.get("key"),
+                    "rows": int(t.get("rows_examined_per_scan") or 0),
+                })
+        if node.get("using_filesort"):
+            found["filesort"] = True
+        if node.get("using_temporary_table"):
+            found["temporary"] = True
+        for v in node.values():
+            _walk(v, found)
+    elif isinstance(node, list):
+        for v in node:
+            _walk(v, found)
+
+
+def analyze(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """从 EXPLAIN FORMAT=JSON 结果提取问题项与成本。"""
+    found: Dict[str, Any] = {"scans": [], "filesort": False, "temporary": False}
+    _walk(plan, found)
+    try:
+        cost = float(plan["query_block"]["cost_info"]["query_cost"])
+    except (KeyError, TypeError, ValueError):
+        cost = None
+    flags = []
+    if any(s["access"] == "ALL" for s in found["scans"]):
+        flags.append("full_scan")
+    if any(s["access"] == "index" for s in found["scans"]):
+        flags.append("full_index_scan")
+    if found["filesort"]:
+        flags.append("filesort")
+    if found["temporary"]:
+        flags.append("temporary")
+    return {"flags": flags, "scans": found["scans"], "cost": cost}
+
+
+def capture(sql, run_raw) -> Optional[str]:
+    """
+    执行前调用：返回指纹（不可取计划的语句返回 None）。
+    指纹首次出现时用 run_raw(语句) 在执行该 SQL 的同一连接上取计划（返回结果行）。
+    """
+    if isinstance(sql, (bytes, bytearray)):
+        sql = sql.decode("utf-8", "replace")
+    if not _EXPLAINABLE.match(sql):
+        return None
+    fp = fingerprint(sql)
+    with _LOCK:
+        if fp in _PLANS:
+            return fp
+        rec = _PLANS[fp] = {"fingerprint": fp, "sample": sql[:SAMPLE_MAX], "calls": 0, "total_ms": 0.0,
+                            "flags": [], "scans": [], "cost": None, "error": None}
+    try:
+        rows = run_raw(f"EXPLAIN FORMAT=JSON {sql}")
+        rec.update(analyze(json.loads(rows[0][0])))
+    except Exception as e:
+        rec["error"] = str(e)[:300]
+    return fp
+
+
+def note(fp: str, seconds: float):
+    """执行后调用：累计次数与耗时，并按间隔落盘。"""
+    with _LOCK:
+        rec = _PLANS.get(fp)
+        if rec is None:
+            return
+        rec["calls"] += 1
+        rec["total_ms"] += seconds * 1000
+    flush()
+
+
+def flush(force: bool = False):
+    now = time.monotonic()
+    if not force and now - _LAST_FLUSH[0] < FLUSH_SECONDS:
+        return
+    _LAST_FLUSH[0] = now
+    with _LOCK:
+        data = [dict(r) for r in _PLANS.values()]
+    try:
+        os.makedirs(Config.EXPLAIN_DIR, exist_ok=True)
+        path = os.path.join(Config.EXPLAIN_DIR, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as fp:
+            json.dump(data, fp, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+    except OSError:
+        pass
+
+
+# ===== 报告 =====
+
+_WEIGHTS = {"full_scan": 3, "full_index_scan": 1, "filesort": 1, "temporary": 1}
+
+
+def load_report() -> list:
+    """汇总 EXPLAIN_DIR 下各进程结果，按严重程度 × 累计耗时排序。"""
+    merged: Dict[str, Dict[str, Any]] = {}
+    if os.path.isdir(Config.EXPLAIN_DIR):
+        for n in os.listdir(Config.EXPLAIN_DIR):
+            if not n.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(Config.EXPLAIN_DIR, n), encoding="utf-8") as fp:
+                    recs = json.load(fp)
+            except (OSError, ValueError):
+                continue
+            for r in recs:
+                cur = merged.get(r["fingerprint"])
+                if cur is None:
+                    merged[r["fingerprint"]] = dict(r)
+                else:
+                    cur["calls"] += r["calls"]
+                    cur["total_ms"] += r["total_ms"]
+    out = []
+    for r in merged.values():
+        r["severity"] = sum(_WEIGHTS.get(f, 0) for f in r["flags"])
+        r["rows_examined"] = sum(s["rows"] for s in r["scans"])
+        r["score"] = r["severity"] * max(r["total_ms"], 1.0)
+        out.append(r)
+    out.sort(key=lambda r: (-r["score"], -(r["cost"] or 0)))
+    return out
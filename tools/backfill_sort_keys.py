@@ -0,0 +1,23 @@
+# tools/backfill_sort_keys.py
+"""
+回填 / 重算 device.sort_key 与 port.sort_key（按设备分批，批间提交）。
+用法：python -m tools.backfill_sort_keys [project_id]
+"""
+import sys
+
+from services.device_service import refresh_sort_keys
+
+
+def main(argv):
+    project_id = int(argv[1]) if len(argv) > 1 else None
+
+    def progress(last_id, devices, ports):
+        print(f"  设备 id ≤ {last_id}：已更新设备 {devices}，端口 {ports}")
+
+    res = refresh_sort_keys(project_id, progress=progress)
+    scope = f"项目 {project_id}" if project_id is not None else "全部项目"
+    print(f"{scope}：更新 {res['devices']} 台设备、{res['ports']} 个端口的排序键")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,105 @@
+# tools/bench_rows.py
+"""
+对比清册导出的两种取行方式的耗时与内存峰值：
+  dict   ：DictCursor fetchall + 每行再复制一次补标签（改造前的写法）
+  tuple  ：元组游标 fetchall 映射为 CableRow（清册分页 / 打印）
+  stream ：无缓冲游标逐行映射为 CableRow、边读边写（全量导出）
+用法：python -m tools.bench_rows [行数，默认 1000000]        # 合成数据，不连库
+      python -m tools.bench_rows --project <project_id>     # 读真实 cable_view
+"""
+import sys
+import time
+import tracemalloc
+
+from services.cable_view_service import CABLE_COLUMNS, CableRow
+
+FIELDS = CableRow._fields
+
+
+def _synthetic(n: int):
+    """模拟驱动逐行解码出的元组（每行新建字符串对象）。"""
+    for i in range(n):
+        dev_a, dev_b, port = f"RACK{i // 480:04d}-SW{i // 48 % 10}", f"RACK{i // 480:04d}-ODF", f"GE1/0/{i % 48 + 1}"
+        yield (i + 1, i % 3 == 0, None,
+               i // 48 + 1, dev_a, 2 * i + 1, port, 1, "RJ45", f"P-{dev_a}-{port}",
+               i // 48 + 100000, dev_b, 2 * i + 2, f"F{i % 48 + 1}", 1, "RJ45", f"P-{dev_b}-F{i % 48 + 1}")
+
+
+def _line(r: CableRow):
+    return (r.a_device_name, r.a_port_type_name or "", r.a_port_name, r.a_label, r.from_to,
+            r.b_device_name, r.b_port_type_name or "", r.b_port_name, r.b_label, r.to_from,
+            "YES" if r.printed else "NO", r.link_id)
+
+
+def run_dict(rows):
+    fetched = [dict(zip(FIELDS, t)) for t in rows]        # DictCursor.fetchall()
+    labelled = []
+    for r in fetched:                                      # 旧 make_labels：逐行 dict(r) 再补列
+        r2 = dict(r)
+        r2.update({"from_to": f"{r['a_label']} / {r['b_label']}",
+                   "to_from": f"{r['b_label']} / {r['a_label']}"})
+        labelled.append(r2)
+    n = 0
+    for r in labelled:
+        n += len((r["a_device_name"], r["a_port_type_name"] or "", r["a_port_name"], r["a_label"], r["from_to"],
+                  r["b_device_name"], r["b_port_type_name"] or "", r["b_port_name"], r["b_label"], r["to_from"],
+                  "YES" if r["printed"] else "NO", r["link_id"]))
+    return n
+
+
+def run_tuple(rows):
+    fetched = list(map(CableRow._make, rows))
+    return sum(len(_line(r)) for r in fetched)
+
+
+def run_stream(rows):
+    return sum(len(_line(r)) for r in map(CableRow._make, rows))
+
+
+def _measure(name: str, fn, make_rows):
+    t0 = time.perf_counter()
+    fn(make_rows())
+    elapsed = time.perf_counter() - t0
+
+    tracemalloc.start()
+    fn(make_rows())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<7} {elapsed:8.2f} s   峰值 {peak / 1024 / 1024:10.2f} MiB")
+
+
+def _db_rows(project_id: int, streaming: bool):
+    import pymysql
+    from db import get_conn, iter_rows
+
+    def make():
+        conn = get_conn()
+        cur = conn.cursor(pymysql.cursors.SSCursor if streaming else pymysql.cursors.Cursor)
+        cur.execute(f"SELECT {CABLE_COLUMNS} FROM cable_view WHERE project_id=%s ORDER BY sort_key, link_id",
+                    (project_id,))
+
+        def gen():
+            try:
+                yield from iter_rows(cur)
+            finally:
+                conn.close()
+        return gen()
+    return make
+
+
+def main(argv):
+    if len(argv) > 2 and argv[1] == "--project":
+        project_id = int(argv[2])
+        print(f"项目 {project_id}，cable_view 实际数据")
+        _measure("dict", run_dict, _db_rows(project_id, False))
+        _measure("tuple", run_tuple, _db_rows(project_id, False))
+        _measure("stream", run_stream, _db_rows(project_id, True))
+        return
+    n = int(argv[1]) if len(argv) > 1 else 1_000_000
+    print(f"合成 {n} 行")
+    for name, fn in (("dict", run_dict), ("tuple", run_tuple), ("stream", run_stream)):
+        _measure(name, fn, lambda: _synthetic(n))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
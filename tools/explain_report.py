@@ -0,0 +1,43 @@
+# tools/explain_report.py
+"""
+汇总 EXPLAIN_CAPTURE 采集到的执行计划，按“严重程度 × 累计耗时”排名输出。
+严重程度：全表扫描 3，全索引扫描 / filesort / 临时表各 1。
+用法：python -m tools.explain_report [条数，默认 30] [--all] [--reset]
+      --all 连同没有问题项的语句一起列出；--reset 清空已采集的结果
+"""
+import shutil
+import sys
+
+from config import Config
+from sql_explain import load_report
+
+
+def main(argv):
+    if "--reset" in argv:
+        shutil.rmtree(Config.EXPLAIN_DIR, ignore_errors=True)
+        print(f"已清空 {Config.EXPLAIN_DIR}")
+        return
+    nums = [a for a in argv[1:] if a.isdigit()]
+    limit = int(nums[0]) if nums else 30
+    rows = load_report()
+    if "--all" not in argv:
+        rows = [r for r in rows if r["flags"]]
+    if not rows:
+        print(f"没有记录（确认 EXPLAIN_CAPTURE=1 且 {Config.EXPLAIN_DIR} 下有结果）")
+        return
+
+    for i, r in enumerate(rows[:limit], 1):
+        avg = r["total_ms"] / r["calls"] if r["calls"] else 0
+        cost = f"{r['cost']:.1f}" if r["cost"] is not None else "-"
+        print(f"#{i}  {', '.join(r['flags']) or '无问题'}  调用 {r['calls']}  累计 {r['total_ms']:.1f} ms  "
+              f"平均 {avg:.2f} ms  成本 {cost}  估算扫描 {r['rows_examined']} 行")
+        for s in r["scans"]:
+            print(f"     {s['access']:<5} {s['table']}  key={s['key'] or '-'}  rows={s['rows']}")
+        if r.get("error"):
+            print(f"     EXPLAIN 失败：{r['error']}")
+        print(f"     {r['fingerprint'][:400]}")
+        print()
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,281 @@
+# tools/loadtest.py
+"""
+连线工作流并发压测：N 个虚拟工程师各自循环回放一次完整会话
+  搜索设备 → 打开 A 设备端口（api_device_ports）→ 取 A/B 候选端口（api_candidates）
+  → 建立连接（api_make_link）→ 删除刚建的连接（api_delete_link，--keep 时保留）
+结束后输出：吞吐（会话 / 请求每秒）、各步骤延迟分位、错误率与冲突率
+（重复键 uk_link_a_port / uk_link_b_port、端口连接数已达上限），以及数据库连接数：
+  - 服务端 /metrics 的 eam_db_connections_opened_total / eam_db_queries_total 增量
+    （多 worker 部署需配置 METRICS_DIR，否则只反映抓到的那个进程）
+  - 本机 MySQL 的 Threads_connected 峰值与 Connections 增量（按本仓库 Config 连库，连不上则跳过）
+只用标准库发请求，每个虚拟用户一条 keep-alive 连接。
+用法：python -m tools.loadtest <project_id> [--url http://127.0.0.1:5000] [--users 10]
+                                [--duration 60] [--think 0] [--hot 0] [--keep] [--seed N]
+      --think 每步之间的停顿毫秒数；--hot N 只在前 N 台设备间连线（制造端口争用以观察冲突）
+"""
+import http.client
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+STEPS = ("search", "ports", "candidates", "make_link", "delete_link")
+_VALUE_OPTS = ("--url", "--users", "--duration", "--think", "--hot", "--seed")
+_METRIC_RE = re.compile(r'^(eam_db_connections_opened_total|eam_db_queries_total)\{role="([^"]*)"\} (\S+)$')
+
+
+def _opt(argv, name, default, cast=str):
+    if name in argv:
+        i = argv.index(name)
+        if i + 1 < len(argv):
+            return cast(argv[i + 1])
+    return default
+
+
+class _Client:
+    """单个虚拟用户的 HTTP 连接（断开后自动重连）。"""
+
+    def __init__(self, base: str):
+        u = urlsplit(base)
+        self.host, self.port = u.hostname, u.port or 80
+        self.prefix = u.path.rstrip("/")
+        self.conn = None
+
+    def request(self, method: str, path: str, form=None):
+        body = urlencode(form) if form is not None else None
+        headers = {"Content-Type": "application/x-www-form-urlencoded"} if form is not None else {}
+        for attempt in (0, 1):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, self.prefix + path, body=body, headers=headers)
+                resp = self.conn.getresponse()
+                return resp.status, resp.read()
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+class _Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)     # 步骤 → 耗时（秒）
+        self.outcome = defaultdict(Counter)  # 步骤 → ok / error / http_5xx / duplicate / capacity / skipped
+        self.sessions = 0
+
+    def add(self, step: str, seconds: float, outcome: str):
+        with self.lock:
+            self.latency[step].append(seconds)
+            self.outcome[step][outcome] += 1
+
+    def skip(self, step: str):
+        """两台设备间没有可配对的空闲端口，本次会话不建连。"""
+        with self.lock:
+            self.outcome[step]["skipped"] += 1
+
+
+def _classify(status: int, body: bytes):
+    """返回 (结果分类, 解析后的 JSON)。"""
+    if status >= 500:
+        return "http_5xx", None
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return "error", None
+    if data.get("ok"):
+        return "ok", data
+    err = str(data.get("err") or data.get("msg") or "")
+    if "Duplicate entry" in err or "uk_link_" in err:
+        return "duplicate", data
+    if "已达上限" in err:
+        return "capacity", data
+    return "error", data
+
+
+def _session(client: _Client, stats: _Stats, rnd: random.Random, pid: int, devices, args):
+    def call(step, method, path, form=None):
+        t0 = time.perf_counter()
+        try:
+            status, body = client.request(method, path, form)
+            outcome, data = _classify(status, body)
+        except (http.client.HTTPException, OSError):
+            outcome, data = "error", None
+        stats.add(step, time.perf_counter() - t0, outcome)
+        if args["think"]:
+            time.sleep(args["think"] / 1000.0)
+        return data if outcome == "ok" else None
+
+    a, b = rnd.sample(devices, 2)
+    name = a["name"]
+    start = rnd.randrange(max(1, len(name) - 2))
+    call("search", "GET", f"/projects/{pid}/api/search-devices?" + urlencode({"q": name[start:start + 3]}))
+    call("ports", "GET", f"/projects/{pid}/api/device/{a['id']}/ports")
+    cand = call("candidates", "GET", f"/projects/{pid}/api/candidates?" + urlencode({"a": a["id"], "b": b["id"]}))
+    if not cand:
+        return
+    left, right = cand["data"]["left"], cand["data"]["right"]
+    by_key = defaultdict(list)
+    for r in right:
+        by_key[(r["port_type_id"], r.get("attr_name") or "")].append(r)
+    pairs = [(L, by_key[(L["port_type_id"], L.get("attr_name") or "")]) for L in left]
+    pairs = [(L, rs) for L, rs in pairs if rs]
+    if not pairs:
+        stats.skip("make_link")
+        return
+    L, rs = rnd.choice(pairs)
+    made = call("make_link", "POST", f"/projects/{pid}/api/link",
+                {"a_port_id": L["port_id"], "b_port_id": rnd.choice(rs)["port_id"]})
+    if made and not args["keep"]:
+        call("delete_link", "POST", f"/projects/{pid}/api/link/{made['id']}/delete")
+
+
+def _worker(idx: int, base: str, pid: int, devices, args, stats: _Stats, deadline: float):
+    rnd = random.Random(args["seed"] + idx)
+    client = _Client(base)
+    while time.monotonic() < deadline:
+        _session(client, stats, rnd, pid, devices, args)
+        with stats.lock:
+            stats.sessions += 1
+
+
+def _scrape(base: str):
+    """服务端 /metrics 中按角色的开连接数与 SQL 条数；不可用时返回 None。"""
+    try:
+        status, body = _Client(base).request("GET", "/metrics")
+    except (http.client.HTTPException, OSError):
+        return None
+    if status != 200:
+        return None
+    out = Counter()
+    for line in body.decode("utf-8", "replace").splitlines():
+        m = _METRIC_RE.match(line)
+        if m:
+            out[(m.group(1), m.group(2))] += float(m.group(3))
+    return out
+
+
+class _MySQLWatch(threading.Thread):
+    """压测期间每秒读一次 Threads_connected，记录峰值与 Connections 增量。"""
+
+    def __init__(self):
+        super().__init__(name="loadtest-mysql", daemon=True)
+        self.stop_evt = threading.Event()
+        self.peak = 0
+        self.start_total = self.end_total = None
+        self.error = None
+
+    def _status(self, cur):
+        cur.execute("SHOW GLOBAL STATUS WHERE Variable_name IN ('Threads_connected', 'Connections')")
+        return {r["Variable_name"]: int(r["Value"]) for r in cur.fetchall()}
+
+    def run(self):
+        try:
+            from db import get_conn
+            with get_conn(readonly=False) as conn, conn.cursor() as cur:
+                s = self._status(cur)
+                self.start_total, self.peak = s["Connections"], s["Threads_connected"]
+                while not self.stop_evt.wait(1.0):
+                    s = self._status(cur)
+                    self.peak = max(self.peak, s["Threads_connected"])
+                s = self._status(cur)
+                self.end_total = s["Connections"]
+        except Exception as e:
+            self.error = str(e)
+
+
+def _pct(sorted_vals, p: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    return sorted_vals[min(len(sorted_vals) - 1, int(round(p / 100.0 * (len(sorted_vals) - 1))))]
+
+
+def main(argv):
+    positional = [a for i, a in enumerate(argv[1:], 1)
+                  if not a.startswith("--") and argv[i - 1] not in _VALUE_OPTS]
+    if not positional or not positional[0].isdigit():
+        print(__doc__)
+        return
+    pid = int(positional[0])
+    base = _opt(argv, "--url", "http://127.0.0.1:5000")
+    users = _opt(argv, "--users", 10, int)
+    duration = _opt(argv, "--duration", 60, float)
+    hot = _opt(argv, "--hot", 0, int)
+    args = {"think": _opt(argv, "--think", 0, float), "keep": "--keep" in argv, "seed": _opt(argv, "--seed", 1, int)}
+
+    try:
+        status, body = _Client(base).request("GET", f"/projects/{pid}/api/search-devices?q=")
+    except (http.client.HTTPException, OSError) as e:
+        print(f"无法访问 {base}：{e}")
+        return
+    devices = (json.loads(body).get("data") or []) if status == 200 else []
+    if hot:
+        devices = devices[:hot]
+    if len(devices) < 2:
+        print(f"项目 {pid} 可用设备不足 2 台（HTTP {status}）")
+        return
+
+    print(f"项目 {pid}：{len(devices)} 台设备，{users} 个并发用户，持续 {duration:g} s，目标 {base}")
+    stats = _Stats()
+    before = _scrape(base)
+    watch = _MySQLWatch()
+    watch.start()
+    t0 = time.monotonic()
+    deadline = t0 + duration
+    threads = [threading.Thread(target=_worker, args=(i, base, pid, devices, args, stats, deadline), daemon=True)
+               for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - t0
+    watch.stop_evt.set()
+    watch.join(5)
+    after = _scrape(base)
+
+    total = sum(sum(c.values()) - c["skipped"] for c in stats.outcome.values())
+    print(f"\n会话 {stats.sessions}（{stats.sessions / elapsed:.1f}/s），请求 {total}（{total / elapsed:.1f}/s）")
+    print(f"{'步骤':<12}{'次数':>7}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+          f"{'错误':>7}{'重复键':>7}{'满载':>7}{'跳过':>7}   (ms)")
+    for step in STEPS:
+        vals = sorted(stats.latency[step])
+        c = stats.outcome[step]
+        n = sum(c.values()) - c["skipped"]
+        if not n and not c["skipped"]:
+            continue
+        cols = "".join(f"{_pct(vals, p) * 1000:9.1f}" for p in (50, 90, 95, 99, 100))
+        print(f"{step:<12}{n:>7}{cols}{c['error'] + c['http_5xx']:>7}{c['duplicate']:>7}{c['capacity']:>7}{c['skipped']:>7}")
+
+    made = stats.outcome["make_link"]
+    attempts = made["ok"] + made["duplicate"] + made["capacity"] + made["error"] + made["http_5xx"]
+    errors = sum(c["error"] + c["http_5xx"] for c in stats.outcome.values())
+    if total:
+        print(f"\n错误率 {100.0 * errors / total:.2f}%", end="")
+    if attempts:
+        print(f"，建连冲突率 {100.0 * (made['duplicate'] + made['capacity']) / attempts:.2f}%"
+              f"（重复键 {made['duplicate']}，连接数已达上限 {made['capacity']}）", end="")
+    print()
+
+    if before is not None and after is not None:
+        for metric, label in (("eam_db_connections_opened_total", "应用新开连接"), ("eam_db_queries_total", "SQL 条数")):
+            roles = sorted({r for m, r in after if m == metric})
+            parts = [f"{r} {after[(metric, r)] - before[(metric, r)]:.0f}" for r in roles]
+            delta = sum(after[(metric, r)] - before[(metric, r)] for r in roles)
+            per_req = f"，每请求 {delta / total:.2f}" if total else ""
+            print(f"{label}：{'，'.join(parts) or '0'}{per_req}")
+    else:
+        print("服务端 /metrics 不可用，跳过应用侧连接统计")
+    if watch.error is None and watch.end_total is not None:
+        # 含本工具监视用的 1 条连接
+        print(f"MySQL：Threads_connected 峰值 {watch.peak}，Connections 增量 {watch.end_total - watch.start_total}")
+    else:
+        print(f"MySQL 状态不可用（{watch.error}），跳过")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,18 @@
+# tools/purge_deleted.py
+"""
+续删所有已软删除（deleted_at 非空）但尚未清理完的项目与设备（分批删除，批间节流；拷贝中的项目跳过）。
+用法：python -m tools.purge_deleted
+"""
+from services.purge_service import purge_all_deleted
+
+
+def main():
+    def progress(projects, devices):
+        print(f"  已清理项目 {projects} 个、设备 {devices} 台")
+
+    res = purge_all_deleted(progress=progress)
+    print(f"完成：项目 {res['projects']} 个、设备 {res['devices']} 台")
+
+
+if __name__ == "__main__":
+    main()
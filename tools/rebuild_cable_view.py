@@ -0,0 +1,19 @@
+# tools/rebuild_cable_view.py
+"""
+按 link 表重建线缆清册读模型 cable_view。
+用法：python -m tools.rebuild_cable_view [project_id]
+"""
+import sys
+
+from services.cable_view_service import rebuild_cable_view
+
+
+def main(argv):
+    project_id = int(argv[1]) if len(argv) > 1 else None
+    n = rebuild_cable_view(project_id)
+    scope = f"项目 {project_id}" if project_id is not None else "全部项目"
+    print(f"{scope}：重建 {n} 条线缆记录")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,19 @@
+# tools/repair_link_count.py
+"""
+按 link 表重算 port.link_count（集合化一条 UPDATE）。
+用法：python -m tools.repair_link_count [project_id]
+"""
+import sys
+
+from services.link_service import recount_link_counts
+
+
+def main(argv):
+    project_id = int(argv[1]) if len(argv) > 1 else None
+    fixed = recount_link_counts(project_id)
+    scope = f"项目 {project_id}" if project_id is not None else "全部项目"
+    print(f"{scope}：修正 {fixed} 个端口的连接计数")
+
+
+if __name__ == "__main__":
+    main(sys.argv)